@@ -0,0 +1,142 @@
+"""客户导出测试
+
+写入一批客户（默认 100 万行），分别以 CSV、NDJSON（安装了 pyarrow 时还有
+Parquet）流式导出，报告每秒行数、输出大小和导出期间的内存增长；同时用一次
+取出全部 ORM 对象再序列化的方式导出作为对照。
+
+用法:
+    python benchmarks/customer_export.py --rows 1000000
+    python benchmarks/customer_export.py --rows 200000 --batch-size 500 --no-baseline
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import logging  # noqa: E402
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.customer_export import (  # noqa: E402
+    CUSTOMER_COLUMNS, ENCODERS, ExportUnavailable, customer_export_query, encode_stream, iter_batches
+)
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSSampler:
+    """在后台线程中定期读取 RSS，记录运行期间的峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def seed(rows: int) -> None:
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.commit()
+    for start in range(0, rows, 10000):
+        db.execute(Customer.__table__.insert(), [
+            {"full_name": f"Lead {i}", "email": f"lead{i}@example.com", "phone": f"+86 138{i:08d}",
+             "company": f"Company {i % 5000}, Ltd", "position": "Buyer", "status": "potential",
+             "notes": f"imported, batch {i // 10000}", "created_by": user.id}
+            for i in range(start, min(start + 10000, rows))
+        ])
+        db.commit()
+    db.close()
+
+
+def stream(fmt: str, batch_size: int) -> int:
+    stmt = customer_export_query()
+    encoder = ENCODERS[fmt](stmt.selected_columns)
+    return sum(len(chunk) for chunk in encode_stream(encoder, iter_batches(engine, stmt, batch_size)))
+
+
+def load_all() -> int:
+    """改动前的做法：一次取出全部 ORM 对象，在内存中拼出整个 CSV"""
+    db = SessionLocal()
+    output = io.StringIO()
+    writer = csv.writer(output)
+    names = [column.key for column in CUSTOMER_COLUMNS]
+    writer.writerow(names)
+    for customer in db.query(Customer).order_by(Customer.id).all():
+        writer.writerow([getattr(customer, name) for name in names])
+    db.close()
+    return len(output.getvalue().encode("utf-8"))
+
+
+def measure(rows: int, operation) -> dict:
+    with RSSSampler() as sampler:
+        started = time.perf_counter()
+        size = operation()
+        elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 1),
+        "rows_per_second": round(rows / elapsed),
+        "output_mb": round(size / 1024 / 1024, 1),
+        "rss_growth_mb": round((sampler.peak - sampler.baseline) / 1024 / 1024, 1),
+    }
+
+
+def main(args):
+    logging.disable(logging.INFO)
+    seed(args.rows)
+    results = {}
+    for fmt in ENCODERS:
+        try:
+            results[fmt] = measure(args.rows, lambda: stream(fmt, args.batch_size))
+        except ExportUnavailable as exc:
+            results[fmt] = {"skipped": str(exc)}
+    if args.baseline:
+        results["load_all_csv"] = measure(args.rows, load_all)
+    print(json.dumps({
+        "benchmark": "customer_export",
+        "config": {"rows": args.rows, "batch_size": args.batch_size},
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="客户行数")
+    parser.add_argument("--batch-size", type=int, default=2000, help="每批读取和编码的行数")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false", help="不测一次性加载的对照")
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""客户互动历史加载测试
+
+为一个客户写入一批互动记录（默认 10 万条），比较改动前一次读出全部记录的
+做法和“最近窗口 + 滚动摘要”的延迟和提示词大小。第一次加载要把较早的记录
+并入摘要，之后每次只处理新移出窗口的记录。
+
+用法:
+    python benchmarks/customer_history.py --interactions 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.customer import Customer, CustomerInteraction  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.customer_history import estimate_tokens, load_customer_history  # noqa: E402
+
+
+def seed(count: int) -> int:
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.commit()
+    customers = [
+        Customer(email=f"c{i}@example.com", full_name=f"Customer {i}", company="Acme", position="Buyer",
+                 status="active", created_by=user.id)
+        for i in range(10)
+    ]
+    db.add_all(customers)
+    db.commit()
+    customer_ids = [customer.id for customer in customers]
+    user_id = user.id
+    db.close()
+
+    base = datetime(2020, 1, 1)
+    with engine.begin() as connection:
+        for offset in range(0, count, 10000):
+            connection.execute(CustomerInteraction.__table__.insert(), [
+                {"customer_id": customer_ids[i % 10], "user_id": user_id, "interaction_type": "email",
+                 "content": f"跟进报价单 #{i}，客户确认交期和付款方式。" * 3, "created_at": base + timedelta(minutes=i)}
+                for i in range(offset, min(offset + 10000, count))
+            ])
+    return customer_ids[0]
+
+
+def load_all(db, customer_id: int) -> list:
+    """改动前的 _get_customer_history"""
+    interactions = db.query(CustomerInteraction)\
+        .filter(CustomerInteraction.customer_id == customer_id)\
+        .order_by(CustomerInteraction.created_at.desc())\
+        .all()
+    return [{"type": i.interaction_type, "content": i.content, "created_at": i.created_at.isoformat()} for i in interactions]
+
+
+def prompt_tokens(summary, recent) -> int:
+    return estimate_tokens(summary) + sum(estimate_tokens(item["content"]) for item in recent)
+
+
+def timed(rounds: int, operation) -> dict:
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(latencies), 2), "max_ms": round(max(latencies), 2)}
+
+
+def main(args):
+    customer_id = seed(args.interactions)
+    db = SessionLocal()
+    results = {}
+
+    history = load_all(db, customer_id)
+    results["load_all"] = timed(args.rounds, lambda: load_all(db, customer_id))
+    results["load_all"]["rows"] = len(history)
+    results["load_all"]["prompt_tokens"] = prompt_tokens(None, history)
+
+    start = time.perf_counter()
+    load_customer_history(db, customer_id)
+    results["windowed_first_call_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    history = load_customer_history(db, customer_id)
+    results["windowed"] = timed(args.rounds, lambda: load_customer_history(db, customer_id))
+    results["windowed"]["rows"] = len(history["recent"])
+    results["windowed"]["prompt_tokens"] = prompt_tokens(history["summary"], history["recent"])
+    db.close()
+
+    print(json.dumps({"interactions": args.interactions, "per_customer": args.interactions // 10, "results": results},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactions", type=int, default=100_000, help="互动记录总数（平均分给 10 个客户）")
+    parser.add_argument("--rounds", type=int, default=20, help="每种做法执行的次数")
+    main(parser.parse_args())
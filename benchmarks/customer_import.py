@@ -0,0 +1,125 @@
+"""客户批量导入测试
+
+生成一个合成的 CSV 文件（默认 100 万行，按比例混入无效邮箱和重复行），用
+CustomerImporter 以 64KB 一块的方式流式导入，报告每秒行数和内存峰值；同时用
+逐行“查询 + 插入 + 提交 + refresh”的方式（和 POST /api/customers/ 相同）导入
+一小部分作为对照。
+
+用法:
+    python benchmarks/customer_import.py --rows 1000000
+    python benchmarks/customer_import.py --rows 200000 --chunk-size 5000 --baseline-rows 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import logging  # noqa: E402
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表
+from merchant.web.models.base import SessionLocal, SyncSessionAdapter  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.customer_import import CustomerImporter  # noqa: E402
+
+READ_SIZE = 64 * 1024
+
+
+def generate(path: str, rows: int, error_ratio: float) -> None:
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("email,full_name,company,position,phone,notes\n")
+        for i in range(rows):
+            roll = rng.random()
+            if roll < error_ratio / 2:
+                email = f"broken-{i}"  # 无效邮箱
+            elif roll < error_ratio:
+                email = f"lead{max(i - 1, 0)}@example.com"  # 和上一行重复
+            else:
+                email = f"lead{i}@example.com"
+            f.write(f'{email},Lead {i},"Company {i % 5000}, Ltd",Buyer,+86 138{i:08d},"imported, batch {i // 10000}"\n')
+
+
+async def read_file(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def baseline(rows: int, user_id: int) -> float:
+    """逐行创建客户，和单个创建接口的数据库操作相同"""
+    db = SessionLocal()
+    started = time.perf_counter()
+    for i in range(rows):
+        email = f"single{i}@example.com"
+        if db.query(Customer).filter(Customer.email == email).first():
+            continue
+        customer = Customer(email=email, full_name=f"Single {i}", company="Acme", position="Buyer",
+                            status="potential", created_by=user_id)
+        db.add(customer)
+        db.commit()
+        db.refresh(customer)
+    elapsed = time.perf_counter() - started
+    db.close()
+    return rows / elapsed
+
+
+def main(args):
+    logging.disable(logging.INFO)
+    path = os.path.join(_tmpdir, "customers.csv")
+    generate(path, args.rows, args.error_ratio)
+
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+
+    importer = CustomerImporter(user_id, chunk_size=args.chunk_size, max_errors=100)
+    started = time.perf_counter()
+    report = asyncio.run(importer.run(SyncSessionAdapter(db), read_file(path), "csv"))
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    result = {
+        "benchmark": "customer_import",
+        "config": {
+            "rows": args.rows,
+            "chunk_size": args.chunk_size,
+            "error_ratio": args.error_ratio,
+            "file_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+        },
+        "bulk": {
+            "seconds": round(elapsed, 1),
+            "rows_per_second": round(args.rows / elapsed),
+            "inserted": report["inserted"],
+            "failed": report["failed"],
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+    if args.baseline_rows:
+        result["per_row"] = {"rows": args.baseline_rows, "rows_per_second": round(baseline(args.baseline_rows, user_id))}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="CSV 文件的行数")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每批写入的行数")
+    parser.add_argument("--error-ratio", type=float, default=0.01, help="无效和重复行的比例")
+    parser.add_argument("--baseline-rows", type=int, default=2000, help="逐行导入对照的行数，0 表示不测")
+    main(parser.parse_args())
@@ -0,0 +1,111 @@
+"""客户列表分页测试
+
+写入大量客户后，分别用 keyset 游标和 OFFSET 读取不同深度的一页，比较延迟。
+keyset 分页的延迟应该和深度无关，OFFSET 随深度线性增长。
+
+用法:
+    python benchmarks/customer_pages.py --rows 1000000
+    python benchmarks/customer_pages.py --rows 200000 --owners 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from sqlalchemy import insert, select, text  # noqa: E402
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表和索引
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.customer_listing import build_customer_page_query, split_page  # noqa: E402
+from merchant.web.utils.pagination import encode_cursor  # noqa: E402
+
+
+def seed(rows: int, owners: int) -> int:
+    """写入用户和客户，返回第一个用户的 id"""
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"email": f"owner{i}@example.com", "hashed_password": "x", "full_name": f"Owner {i}"} for i in range(owners)
+        ])
+        start = datetime(2020, 1, 1)
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "email": f"c{i}@example.com", "full_name": f"Customer {i}", "company": f"Company {i % 500}",
+                "position": "Buyer", "status": ("potential", "active", "lost")[i % 3], "created_by": i % owners + 1,
+                # 每秒几个客户，同一秒内靠 id 区分顺序
+                "created_at": start + timedelta(seconds=i // 4),
+            })
+            if len(batch) == 50_000:
+                connection.execute(insert(Customer), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(Customer), batch)
+        connection.execute(text("ANALYZE"))
+        return connection.execute(select(User.id).order_by(User.id)).scalar()
+
+
+def timed(fn, rounds: int) -> dict:
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(latencies), 3), "max_ms": round(max(latencies), 3)}
+
+
+def main(args):
+    started = time.perf_counter()
+    owner = seed(args.rows, args.owners)
+    seed_seconds = round(time.perf_counter() - started, 1)
+    owned = args.rows // args.owners
+    db = SessionLocal()
+    results = {}
+    for depth in [0, 1_000, 10_000, 100_000, owned // 2, owned - args.limit]:
+        if depth < 0 or depth >= owned or str(depth) in results:
+            continue
+        # 取出该深度前一行的排序键作为游标（不计时）
+        cursor = None
+        if depth:
+            previous = db.execute(
+                build_customer_page_query(0, created_by=owner).offset(depth - 1)
+            ).first()
+            cursor = encode_cursor(previous.created_key, previous.Customer.id)
+
+        def keyset():
+            split_page(db.execute(build_customer_page_query(args.limit, cursor=cursor, created_by=owner)).all(), args.limit)
+
+        def offset():
+            db.scalars(
+                select(Customer).where(Customer.created_by == owner)
+                .order_by(Customer.created_at.desc(), Customer.id.desc()).offset(depth).limit(args.limit)
+            ).all()
+
+        results[str(depth)] = {"keyset": timed(keyset, args.rounds), "offset": timed(offset, args.rounds)}
+        db.expunge_all()
+    db.close()
+    print(json.dumps({
+        "benchmark": "customer_pages",
+        "config": {"rows": args.rows, "owners": args.owners, "limit": args.limit, "seed_seconds": seed_seconds},
+        "results_by_depth": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="写入的客户数")
+    parser.add_argument("--owners", type=int, default=1, help="客户平均分给多少个用户")
+    parser.add_argument("--limit", type=int, default=50, help="每页客户数")
+    parser.add_argument("--rounds", type=int, default=20, help="每个深度测量的次数")
+    main(parser.parse_args())
@@ -0,0 +1,121 @@
+"""客户搜索延迟测试
+
+在临时 SQLite 数据库中生成一批客户（随机拼成的英文姓名和公司名，部分为
+中文），写入时由触发器建立全文和三字组索引，然后分别测量前缀查询、宽泛
+查询、拼写错误查询和按创建人过滤的 p50/p99 延迟，并和 LIKE '%x%' 全表
+扫描对比。
+
+用法:
+    python benchmarks/customer_search.py --customers 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表和搜索索引
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.customer_search import search_customers  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vor", "sel", "din", "qua", "bri", "zen", "tor", "mar", "lex", "hal", "pen"]
+SUFFIXES = ["Trading", "Industries", "Logistics", "Group", "Holdings", "Textiles", "Electronics", "Foods"]
+CHINESE_COMPANIES = ["华为技术", "远洋物流", "恒达纺织", "金星电子", "东方食品", "新华贸易"]
+CHINESE_NAMES = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨磊"]
+
+CASES = {
+    "prefix": ["Kalomi", "torbri", "华为", "Lexhal Group"],
+    "broad": ["trading", "group", "buyer"],
+    "typo": ["Kalomy Tradng", "Torbrri", "Zentor Logistcs"],
+    "no_match": ["xyzzyq"],
+}
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def seed(count: int, owners: int):
+    db = SessionLocal()
+    owner_ids = []
+    for i in range(owners):
+        user = User(email=f"owner{i}@example.com", hashed_password="x", full_name=f"Owner {i}")
+        db.add(user)
+        db.commit()
+        owner_ids.append(user.id)
+    db.close()
+
+    rng = random.Random(7)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, count, 10000):
+            rows = []
+            for i in range(offset, min(offset + 10000, count)):
+                chinese = rng.random() < 0.2
+                rows.append({
+                    "email": f"c{i}@example.com",
+                    "full_name": rng.choice(CHINESE_NAMES) if chinese else f"{word(rng)} {word(rng)}",
+                    "company": rng.choice(CHINESE_COMPANIES) if chinese else f"{word(rng)} {rng.choice(SUFFIXES)}",
+                    "position": "Buyer",
+                    "status": "potential",
+                    "notes": f"met at fair {i % 97}",
+                    "created_by": owner_ids[i % owners],
+                })
+            connection.execute(Customer.__table__.insert(), rows)
+    return owner_ids, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def timed(rounds: int, queries, operation) -> dict:
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            operation(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(latencies), 2), "p99_ms": round(percentile(latencies, 99), 2)}
+
+
+def main(args):
+    owner_ids, seed_seconds = seed(args.customers, args.owners)
+    db = SessionLocal()
+    results = {}
+    for name, queries in CASES.items():
+        results[name] = timed(args.rounds, queries, lambda q: search_customers(db, q))
+        results[name]["hits"] = {q: len(search_customers(db, q)) for q in queries}
+    results["prefix_by_owner"] = timed(args.rounds, CASES["prefix"], lambda q: search_customers(db, q, owner_id=owner_ids[0]))
+    # 对照组：没有索引时只能 LIKE 全表扫描，没有命中时要读完整张表
+    results["like_scan"] = timed(1, ["tradng"], lambda q: db.query(Customer).filter(
+        Customer.full_name.ilike(f"%{q}%") | Customer.company.ilike(f"%{q}%") | Customer.notes.ilike(f"%{q}%")
+    ).limit(20).all())
+    db.close()
+
+    print(json.dumps({
+        "customers": args.customers,
+        "index_build_sec": round(seed_seconds, 1),
+        "db_size_mb": round(os.path.getsize(f"{_tmpdir}/bench.db") / 1024 / 1024, 1),
+        "latency": results,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1_000_000, help="客户数")
+    parser.add_argument("--owners", type=int, default=20, help="创建客户的用户数")
+    parser.add_argument("--rounds", type=int, default=10, help="每个查询执行的次数")
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""同步/异步数据库模式的并发吞吐测试
+
+分别以 ASYNC_DATABASE=0 和 ASYNC_DATABASE=1 启动服务（独立进程，共用同一个
+SQLite 文件），用多个并发客户端请求客户列表、客户详情和 /api/auth/me，比较每秒
+请求数和延迟。异步模式需要安装 aiosqlite，没有安装时跳过。
+
+用法:
+    python benchmarks/db_modes.py --concurrency 32 --duration 10
+    python benchmarks/db_modes.py --modes async --customers 5000
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import httpx  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed(customers: int) -> str:
+    from merchant.web.main import app  # noqa: F401  创建数据表
+    logging.disable(logging.INFO)
+    from merchant.web.models.base import SessionLocal
+    from merchant.web.models.customer import Customer
+    from merchant.web.models.user import User
+    from merchant.web.utils.auth import create_access_token, get_password_hash
+
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password=get_password_hash("bench"), full_name="Bench")
+    db.add(user)
+    db.commit()
+    db.add_all(
+        Customer(
+            full_name=f"Customer {i}", email=f"customer{i}@example.com", company="Acme", position="Buyer",
+            status="potential", created_by=user.id,
+        )
+        for i in range(customers)
+    )
+    db.commit()
+    db.close()
+    return create_access_token(data={"sub": "bench@example.com"})
+
+
+def start_server(mode: str):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    env = {**os.environ, "ASYNC_DATABASE": "1" if mode == "async" else "0", "PYTHONPATH": os.path.join(ROOT, "src")}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "merchant.web.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(f"{base_url}/api", timeout=1)
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+async def run_load(base_url: str, token: str, concurrency: int, duration: float, customers: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = ["/api/customers/?limit=50", "/api/auth/me"] + [f"/api/customers/{i}" for i in range(1, min(customers, 50) + 1)]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal errors
+        index = offset
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += concurrency
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main(args):
+    token = seed(args.customers)
+    results = {}
+    for mode in args.modes:
+        if mode == "async" and importlib.util.find_spec("aiosqlite") is None:
+            results[mode] = {"skipped": "aiosqlite is not installed"}
+            continue
+        process, base_url = start_server(mode)
+        try:
+            results[mode] = asyncio.run(run_load(base_url, token, args.concurrency, args.duration, args.customers))
+        finally:
+            process.terminate()
+            process.wait()
+    print(json.dumps({
+        "benchmark": "db_modes",
+        "config": {"concurrency": args.concurrency, "duration_s": args.duration, "customers": args.customers},
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--concurrency", type=int, default=32, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的测试秒数")
+    parser.add_argument("--customers", type=int, default=1000, help="预先写入的客户数")
+    main(parser.parse_args())
@@ -0,0 +1,245 @@
+"""邮件路径性能测试
+
+启动本地 IMAP 测试服务器（tests/imap_server.py）并生成一批邮件，测量验证/绑定、
+收件箱列表、增量同步、正文解析和附件下载的延迟、传输字节数和内存峰值，结果以
+JSON 输出，可以用 --output 保存下来和之后的运行比较。
+
+用法:
+    python benchmarks/email_paths.py --messages 2000 --attachment-ratio 0.2 --output email_paths.json
+    python benchmarks/email_paths.py --latency 0.03  # 模拟 30ms 的网络往返
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from imap_server import IMAPTestServer, build_message  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSSampler:
+    """在后台线程中定期读取 RSS，记录一个测试项运行期间的峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def measure(server: IMAPTestServer, rounds: int, operation, setup=None) -> dict:
+    """执行 operation rounds 次，返回延迟、每次的传输字节数和内存峰值"""
+    latencies = []
+    bytes_sent = bytes_received = connections = 0
+    with RSSSampler() as sampler:
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            server.reset_stats()
+            start = time.perf_counter()
+            operation()
+            latencies.append((time.perf_counter() - start) * 1000)
+            stats = server.stats()
+            bytes_sent += stats["bytes_sent"]
+            bytes_received += stats["bytes_received"]
+            connections += stats["connections"]
+    return {
+        "rounds": rounds,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "bytes_from_server": bytes_sent // rounds,
+        "bytes_to_server": bytes_received // rounds,
+        "connections": round(connections / rounds, 2),
+        "peak_rss_mb": round(sampler.peak / 1024 / 1024, 1),
+        "rss_growth_mb": round((sampler.peak - sampler.baseline) / 1024 / 1024, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(args):
+    server = IMAPTestServer(
+        messages=args.messages,
+        body_size=args.body_size,
+        attachment_ratio=args.attachment_ratio,
+        attachment_size=args.attachment_size,
+        latency=args.latency,
+    ).start()
+    # 在导入应用之前设置，客户端才会信任测试服务器的自签名证书
+    os.environ["IMAP_SSL_CA_FILE"] = server.cert_path
+
+    from merchant.web.main import app  # noqa: F401  创建数据表
+    from merchant.web.models.base import SessionLocal
+    from merchant.web.models.email import EmailBinding
+    from merchant.web.models.user import User
+    from merchant.web.services.email_bind import adopt_sessions, verify_accounts
+    from merchant.web.services.email_sync import EmailSyncService
+    from merchant.web.utils.attachments import fetch_part_info, iter_attachment
+    from merchant.web.utils.email import fetch_inbox_emails, imap_pool, verify_imap_login
+    from merchant.web.utils.imap_pool import IMAPAccount
+    from merchant.web.utils.mime_parser import mime_parser
+
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.commit()
+    bindings = []
+    for index in range(max(args.bulk_accounts, 1)):
+        binding = EmailBinding(
+            user_id=user.id, email=f"buyer{index}@example.org", password="secret",
+            imap_server=server.host, imap_port=server.port,
+        )
+        db.add(binding)
+        bindings.append(binding)
+    db.commit()
+    binding = bindings[0]
+    service = EmailSyncService(db)
+
+    def verify():
+        ok, message, client = verify_imap_login(binding.email, binding.password, server.host, server.port)
+        if not ok:
+            raise RuntimeError(message)
+        client.logout()
+
+    def bulk_bind():
+        accounts = [IMAPAccount.from_binding(b) for b in bindings]
+        results = loop.run_until_complete(verify_accounts(accounts))
+        loop.run_until_complete(adopt_sessions([(b, client) for b, (_, _, client) in zip(bindings, results)]))
+
+    def initial_sync():
+        loop.run_until_complete(service.sync_folder(binding))
+
+    def deliver_and_flag():
+        server.deliver(build_message(server.mailbox.next_uid, rng))
+        first_uid = server.mailbox.uids()[0]
+        server.mailbox.set_flags(first_uid, [] if server.mailbox.messages[first_uid].flags else ["\\Seen"])
+
+    def ingest_setup():
+        service.purge(binding.id)
+        initial_sync()
+
+    attachment = next(
+        (uid for uid, message in server.mailbox.messages.items() if len(message.message.get_payload()) > 1),
+        None,
+    )
+
+    def download_attachment():
+        info = imap_pool.run(binding, lambda client: fetch_part_info(client, "INBOX", attachment, "2"))
+
+        async def consume():
+            async for _ in iter_attachment(binding, "INBOX", attachment, info):
+                pass
+
+        loop.run_until_complete(consume())
+
+    rng = random.Random(7)
+    results = {}
+    results["verify"] = measure(server, args.rounds, verify)
+    results["bulk_bind"] = measure(server, max(args.rounds // 5, 1), bulk_bind, setup=imap_pool.close_all)
+    results["fetch_inbox_cold"] = measure(server, args.rounds, lambda: fetch_inbox_emails(binding), setup=imap_pool.close_all)
+    results["fetch_inbox_warm"] = measure(server, args.rounds, lambda: fetch_inbox_emails(binding))
+    results["sync_initial"] = measure(server, args.rounds, initial_sync, setup=lambda: service.purge(binding.id))
+    results["sync_noop"] = measure(server, args.rounds, initial_sync)
+    results["sync_incremental"] = measure(server, args.rounds, initial_sync, setup=deliver_and_flag)
+    results["ingest_bodies"] = measure(
+        server, max(args.rounds // 5, 1),
+        lambda: loop.run_until_complete(service.ingest_bodies(binding)),
+        setup=ingest_setup,
+    )
+    if attachment is not None:
+        results["attachment_download"] = measure(server, max(args.rounds // 5, 1), download_attachment)
+
+    imap_pool.close_all()
+    mime_parser.shutdown()
+    db.close()
+    loop.close()
+    server.stop()
+
+    report = {
+        "benchmark": "email_paths",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "messages": args.messages,
+            "body_size": args.body_size,
+            "attachment_ratio": args.attachment_ratio,
+            "attachment_size": args.attachment_size,
+            "latency_ms": args.latency * 1000,
+            "rounds": args.rounds,
+            "bulk_accounts": args.bulk_accounts,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="服务器上的邮件数")
+    parser.add_argument("--body-size", type=int, default=2000, help="每封邮件正文的大致字节数")
+    parser.add_argument("--attachment-ratio", type=float, default=0.2, help="带附件的邮件比例")
+    parser.add_argument("--attachment-size", type=int, default=100_000, help="附件字节数")
+    parser.add_argument("--latency", type=float, default=0.0, help="服务器每个命令额外等待的秒数")
+    parser.add_argument("--rounds", type=int, default=20, help="每个测试项执行的次数")
+    parser.add_argument("--bulk-accounts", type=int, default=20, help="批量绑定的邮箱数")
+    parser.add_argument("--output", help="把 JSON 结果写入这个文件")
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+"""邮件全文搜索延迟测试
+
+在临时 SQLite 数据库中生成一批中英文混合的邮件（写入时由触发器建立
+FTS5 索引），然后测量几类查询的 p50/p99 延迟。
+
+用法:
+    python benchmarks/email_search.py --messages 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表和全文索引
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.email import EmailBinding, EmailMessage  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.services.email_search import search_messages  # noqa: E402
+
+CHINESE_WORDS = ["报价", "订单", "发票", "合同", "会议", "季度", "报告", "样品", "物流", "付款", "客户", "采购", "确认", "修改", "交期"]
+ENGLISH_WORDS = ["invoice", "order", "shipment", "quotation", "meeting", "contract", "sample", "payment", "delivery", "report"]
+QUERIES = ["报价单", "季度报告", "invoice", "ship", "付款 contract", "发票", "quotation sample"]
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    words = [rng.choice(CHINESE_WORDS) if rng.random() < 0.6 else rng.choice(ENGLISH_WORDS) for _ in range(length)]
+    return " ".join(words)
+
+
+def seed(count: int, bindings: int):
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+    db.add(user)
+    db.commit()
+    binding_ids = []
+    for i in range(bindings):
+        binding = EmailBinding(user_id=user.id, email=f"box{i}@example.com", password="x")
+        db.add(binding)
+        db.commit()
+        binding_ids.append(binding.id)
+    user_id = user.id
+    db.close()
+
+    rng = random.Random(7)
+    start_date = datetime(2023, 1, 1)
+    rows = [
+        {
+            "binding_id": binding_ids[i % bindings],
+            "folder": "INBOX",
+            "uid": i + 1,
+            "subject": sentence(rng, 4),
+            "from_addr": f"Sender {i % 500} <sender{i % 500}@example.com>",
+            "to_addrs": "buyer@example.org",
+            "date": start_date + timedelta(minutes=i * 7),
+            "body_text": sentence(rng, 80),
+        }
+        for i in range(count)
+    ]
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, count, 5000):
+            connection.execute(EmailMessage.__table__.insert(), rows[offset:offset + 5000])
+    return user_id, binding_ids, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main(args):
+    user_id, binding_ids, seed_seconds = seed(args.messages, args.bindings)
+    db = SessionLocal()
+    cases = {
+        "all": {},
+        "by_binding": {"binding_id": binding_ids[0]},
+        "by_sender": {"sender": "sender42@"},
+        "by_date": {"date_from": datetime(2023, 6, 1), "date_to": datetime(2023, 7, 1)},
+    }
+    results = {}
+    for name, filters in cases.items():
+        latencies = []
+        for _ in range(args.rounds):
+            for query in QUERIES:
+                start = time.perf_counter()
+                search_messages(db, user_id, query, limit=20, **filters)
+                latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    db.close()
+
+    print(json.dumps({
+        "messages": args.messages,
+        "index_build_sec": round(seed_seconds, 1),
+        "db_size_mb": round(os.path.getsize(f"{_tmpdir}/bench.db") / 1024 / 1024, 1),
+        "queries": QUERIES,
+        "latency": results,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000, help="邮件数")
+    parser.add_argument("--bindings", type=int, default=5, help="邮箱数")
+    parser.add_argument("--rounds", type=int, default=10, help="每个查询执行的次数")
+    main(parser.parse_args())
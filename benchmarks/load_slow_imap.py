@@ -0,0 +1,145 @@
+"""慢 IMAP 服务器下的负载测试
+
+启动一个接受连接但从不响应的 IMAP 服务器，让一批收件箱请求一直挂起，
+同时测量无关接口（/api 和 /api/auth/me）的延迟。IMAP 操作在线程池中
+执行时，这些接口的 p99 应该和没有收件箱负载时基本一致。
+
+用法:
+    python benchmarks/load_slow_imap.py --hanging 50 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# 必须在导入应用之前设置
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+os.environ.setdefault("IMAP_TIMEOUT", "20")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from merchant.web.main import app  # noqa: E402
+from merchant.web.models.base import SessionLocal  # noqa: E402
+from merchant.web.models.email import EmailBinding  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.utils.auth import create_access_token, get_password_hash  # noqa: E402
+
+
+def start_hanging_imap_server():
+    """接受连接但从不发送问候语的 IMAP 服务器"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1024)
+    connections = []
+
+    def accept_forever():
+        while True:
+            conn, _ = server.accept()
+            connections.append(conn)
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def start_app_server():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def seed(imap_port, bindings):
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password=get_password_hash("bench"), full_name="Bench")
+    db.add(user)
+    db.commit()
+    ids = []
+    for i in range(bindings):
+        binding = EmailBinding(
+            user_id=user.id,
+            email=f"slow{i}@example.com",
+            password="x",
+            imap_server="127.0.0.1",
+            imap_port=imap_port,
+        )
+        db.add(binding)
+        db.commit()
+        ids.append(binding.id)
+    token = create_access_token(data={"sub": user.email})
+    db.close()
+    return token, ids
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def measure(client, headers, count):
+    latencies = []
+    for i in range(count):
+        path = "/api" if i % 2 else "/api/auth/me"
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def main(args):
+    imap_port = start_hanging_imap_server()
+    token, binding_ids = seed(imap_port, args.hanging)
+    server, base_url = start_app_server()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        baseline = await measure(client, headers, args.requests)
+
+        hanging = [
+            asyncio.create_task(client.get(f"/api/email/inbox/{binding_id}", headers=headers))
+            for binding_id in binding_ids
+        ]
+        await asyncio.sleep(1)  # 等待收件箱请求进入 IMAP 连接阶段
+        under_load = await measure(client, headers, args.requests)
+        pending = sum(1 for task in hanging if not task.done())
+        for task in hanging:
+            task.cancel()
+
+    server.should_exit = True
+    result = {
+        "hanging_inbox_requests": args.hanging,
+        "still_pending_during_measurement": pending,
+        "baseline": baseline,
+        "with_hanging_inbox": under_load,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hanging", type=int, default=50, help="同时挂起的收件箱请求数")
+    parser.add_argument("--requests", type=int, default=500, help="测量的无关接口请求数")
+    asyncio.run(main(parser.parse_args()))
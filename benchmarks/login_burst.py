@@ -0,0 +1,132 @@
+"""登录洪峰下的接口延迟测试
+
+同时发起一批登录请求（每个都要做一次 bcrypt 验证），测量无关接口
+（/api 和 /api/auth/me）的延迟。bcrypt 在密码线程池中执行时，这些接口的
+p99 应该接近没有登录负载时；加 --inline 在事件循环中直接计算哈希作为对照。
+
+用法:
+    python benchmarks/login_burst.py --logins 50 --requests 200
+    python benchmarks/login_burst.py --logins 50 --requests 200 --inline
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# 必须在导入应用之前设置
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from merchant.web.main import app  # noqa: E402
+from merchant.web.models.base import SessionLocal  # noqa: E402
+from merchant.web.models.user import User  # noqa: E402
+from merchant.web.utils.auth import BCRYPT_ROUNDS, create_access_token, get_password_hash, password_hasher  # noqa: E402
+
+
+def start_app_server():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def seed():
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password=get_password_hash("bench"), full_name="Bench")
+    db.add(user)
+    db.commit()
+    token = create_access_token(data={"sub": user.email})
+    db.close()
+    return token
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies):
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def measure(client, headers, count):
+    latencies = []
+    for i in range(count):
+        path = "/api" if i % 2 else "/api/auth/me"
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return summarize(latencies)
+
+
+async def login(client):
+    start = time.perf_counter()
+    response = await client.post("/api/auth/token", data={"username": "bench@example.com", "password": "bench"})
+    return response.status_code, (time.perf_counter() - start) * 1000
+
+
+async def main(args):
+    if args.inline:
+        # 对照组：和改动前一样在事件循环中直接计算 bcrypt
+        async def inline(func, *func_args):
+            return func(*func_args)
+        password_hasher._run = inline
+
+    token = seed()
+    server, base_url = start_app_server()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        baseline = await measure(client, headers, args.requests)
+
+        logins = [asyncio.create_task(login(client)) for _ in range(args.logins)]
+        await asyncio.sleep(0.05)  # 等待登录请求到达服务器
+        under_load = await measure(client, headers, args.requests)
+        results = await asyncio.gather(*logins)
+
+    server.should_exit = True
+    statuses = {}
+    for status_code, _ in results:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+    print(json.dumps({
+        "mode": "inline" if args.inline else "executor",
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "concurrent_logins": args.logins,
+        "login_status": statuses,
+        "login_latency": summarize([latency for _, latency in results]),
+        "baseline": baseline,
+        "during_login_burst": under_load,
+        "password_hasher": password_hasher.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="同时发起的登录请求数")
+    parser.add_argument("--requests", type=int, default=200, help="测量的无关接口请求数")
+    parser.add_argument("--inline", action="store_true", help="在事件循环中直接计算 bcrypt（改动前的行为）")
+    asyncio.run(main(parser.parse_args()))
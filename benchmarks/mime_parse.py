@@ -0,0 +1,91 @@
+"""MIME 解析吞吐量测试
+
+生成一批混合了 GBK/UTF-8 编码头部、HTML 正文和附件的邮件，比较单线程
+解析和进程池解析的吞吐量（封/秒）。
+
+用法:
+    python benchmarks/mime_parse.py --messages 2000 --workers 4 --chunk-size 25
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from merchant.web.utils.mime_parser import MIMEParserPool, parse_message_chunk  # noqa: E402
+
+PARAGRAPH = "感谢您的询价，我们会尽快安排报价。Thank you for your inquiry, we will follow up shortly. "
+
+
+def build_message(index: int, rng: random.Random) -> bytes:
+    charset = rng.choice(["utf-8", "gbk"])
+    message = MIMEMultipart("mixed")
+    message["Subject"] = Header(f"订单确认 #{index} Order confirmation", charset).encode()
+    message["From"] = f"{Header('销售部', charset).encode()} <sales{index}@example.com>"
+    message["To"] = "buyer@example.org"
+    message["Date"] = "Wed, 17 Jul 2024 10:44:25 +0800"
+    message["Message-ID"] = f"<{index}@example.com>"
+
+    body = PARAGRAPH * rng.randint(5, 60)
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText(body, "plain", charset))
+    alternative.attach(MIMEText(f"<html><body><p>{body}</p></body></html>", "html", charset))
+    message.attach(alternative)
+
+    if rng.random() < 0.3:
+        attachment = MIMEApplication(rng.randbytes(rng.randint(20_000, 300_000)), _subtype="pdf")
+        attachment.add_header("Content-Disposition", "attachment", filename=(charset, "", f"报价单{index}.pdf"))
+        message.attach(attachment)
+    return message.as_bytes()
+
+
+def throughput(count: int, seconds: float) -> float:
+    return round(count / seconds, 1)
+
+
+def main(args):
+    rng = random.Random(42)
+    messages = [(uid, build_message(uid, rng)) for uid in range(1, args.messages + 1)]
+    total_bytes = sum(len(raw) for _, raw in messages)
+
+    start = time.perf_counter()
+    parse_message_chunk(messages)
+    single = time.perf_counter() - start
+
+    pool = MIMEParserPool(workers=args.workers, chunk_size=args.chunk_size)
+    try:
+        start = time.perf_counter()
+        pool.parse_many(messages[:args.chunk_size * args.workers + 1])
+        warmup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pool.parse_many(messages)
+        pooled = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+    print(json.dumps({
+        "messages": args.messages,
+        "total_mb": round(total_bytes / 1024 / 1024, 1),
+        "workers": args.workers,
+        "chunk_size": args.chunk_size,
+        "single_thread_msgs_per_sec": throughput(args.messages, single),
+        "process_pool_msgs_per_sec": throughput(args.messages, pooled),
+        "speedup": round(single / pooled, 2),
+        "pool_warmup_sec": round(warmup, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="邮件数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="解析进程数")
+    parser.add_argument("--chunk-size", type=int, default=25, help="每批发送给工作进程的邮件数")
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+"""潜在客户去重测试
+
+写入一批已有客户，再生成一批潜在客户（按比例混入邮箱相同、邮箱大小写不同、
+公司名和姓名有拼写差异的重复项），测量去重的延迟以及各类重复项的识别数。
+
+用法:
+    python benchmarks/prospect_dedup.py --customers 1000000 --prospects 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+os.environ.setdefault("TESTING", "1")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from merchant.web.main import app  # noqa: E402,F401  创建数据表和搜索索引
+from merchant.web.models.base import SessionLocal, engine  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.services.prospect_dedup import ProspectDeduplicator  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vor", "sel", "din", "qua", "bri", "zen", "tor", "mar", "lex", "hal", "pen"]
+SUFFIXES = ["Trading", "Industries", "Logistics", "Textiles", "Electronics", "Foods"]
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def typo(rng: random.Random, value: str) -> str:
+    index = rng.randrange(1, len(value) - 1)
+    return value[:index] + value[index + 1:]
+
+
+def seed(count: int, rng: random.Random) -> list:
+    customers = []
+    with engine.begin() as connection:
+        for offset in range(0, count, 10000):
+            rows = [
+                {"email": f"c{i}@example.com", "full_name": f"{word(rng)} {word(rng)}",
+                 "company": f"{word(rng)} {word(rng)} {rng.choice(SUFFIXES)} Ltd", "position": "Buyer", "status": "active"}
+                for i in range(offset, min(offset + 10000, count))
+            ]
+            connection.execute(Customer.__table__.insert(), rows)
+            customers.extend(rng.sample(rows, 10))
+    return customers
+
+
+def prospects(rng: random.Random, customers: list, count: int, duplicate_ratio: float) -> list:
+    result = []
+    for i in range(count):
+        roll = rng.random()
+        customer = rng.choice(customers)
+        if roll < duplicate_ratio / 3:
+            result.append({"email": customer["email"].upper(), "name": customer["full_name"], "company": customer["company"]})
+        elif roll < duplicate_ratio * 2 / 3:
+            result.append({"email": f"other{i}@example.org", "name": customer["full_name"],
+                           "company": typo(rng, customer["company"].replace(" Ltd", " Co., Ltd."))})
+        elif roll < duplicate_ratio:
+            result.append({"email": f"another{i}@example.org", "name": typo(rng, customer["full_name"]),
+                           "company": customer["company"]})
+        else:
+            result.append({"email": f"new{i}@example.net", "name": f"{word(rng)} {word(rng)}",
+                           "company": f"{word(rng)} {word(rng)} {rng.choice(SUFFIXES)}"})
+    return result
+
+
+def main(args):
+    rng = random.Random(7)
+    customers = seed(args.customers, rng)
+    db = SessionLocal()
+    dedup = ProspectDeduplicator(db)
+    latencies = []
+    reasons = Counter()
+    for _ in range(args.rounds):
+        batch = prospects(rng, customers, args.prospects, args.duplicate_ratio)
+        start = time.perf_counter()
+        fresh, duplicates = dedup.split(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        reasons.update(d["reason"] for d in duplicates)
+        reasons["new"] += len(fresh)
+    db.close()
+    print(json.dumps({
+        "customers": args.customers,
+        "prospects_per_batch": args.prospects,
+        "duplicate_ratio": args.duplicate_ratio,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "max_ms": round(max(latencies), 2),
+        "outcomes": dict(reasons),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1_000_000, help="已有客户数")
+    parser.add_argument("--prospects", type=int, default=50, help="每批潜在客户数")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="潜在客户中重复项的比例")
+    parser.add_argument("--rounds", type=int, default=10, help="去重的批数")
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""SQLite 连接参数的并发读写测试
+
+分别用 SQLite 默认设置（回滚日志）和调优后的设置（WAL、synchronous=NORMAL、
+busy_timeout 等，见 models/base.py）建库，多个写线程不断插入客户并提交，同时
+多个读线程分页读取客户列表，比较两种设置下的吞吐、延迟和 database is locked
+错误数。
+
+用法:
+    python benchmarks/sqlite_profile.py --writers 4 --readers 8 --duration 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix="merchant-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/app.db")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from merchant.web.models.base import Base, create_db_engine  # noqa: E402
+from merchant.web.models.customer import Customer  # noqa: E402
+from merchant.web.models.email import EmailBinding  # noqa: E402,F401  User 的关系需要
+from merchant.web.models.user import User  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return {"ops": 0, "errors": errors}
+    return {
+        "ops": len(latencies),
+        "ops_per_second": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+def run_profile(tuned: bool, args) -> dict:
+    path = os.path.join(_tmpdir, "tuned.db" if tuned else "default.db")
+    engine = create_db_engine(f"sqlite:///{path}", tune_sqlite=tuned)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        user = User(email="bench@example.com", hashed_password="x", full_name="Bench")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    deadline = time.perf_counter() + args.duration
+    results = {"write": ([], [0]), "read": ([], [0])}
+    counter = iter(range(10**9))
+    lock = threading.Lock()
+
+    def writer():
+        latencies, errors = results["write"]
+        while time.perf_counter() < deadline:
+            with lock:
+                index = next(counter)
+            start = time.perf_counter()
+            try:
+                with Session() as db:
+                    db.add(Customer(
+                        full_name=f"Customer {index}", email=f"c{index}@example.com", company="Acme",
+                        position="Buyer", status="potential", created_by=user_id,
+                    ))
+                    db.commit()
+            except OperationalError:
+                errors[0] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    def reader():
+        latencies, errors = results["read"]
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with Session() as db:
+                    db.scalars(select(Customer).order_by(Customer.id.desc()).limit(50)).all()
+                    db.scalar(select(func.count(Customer.id)))
+            except OperationalError:
+                errors[0] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return {name: summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in results.items()}
+
+
+def main(args):
+    report = {
+        "benchmark": "sqlite_profile",
+        "config": {"writers": args.writers, "readers": args.readers, "duration_s": args.duration},
+        "results": {
+            "default": run_profile(False, args),
+            "tuned": run_profile(True, args),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4, help="写线程数")
+    parser.add_argument("--readers", type=int, default=8, help="读线程数")
+    parser.add_argument("--duration", type=float, default=10, help="每种设置的测试秒数")
+    main(parser.parse_args())
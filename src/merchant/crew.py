@@ -1,7 +1,7 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai_tools import SerperDevTool
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 
 from .tools.google_trend_tool import GoogleTrendTool
@@ -149,14 +149,25 @@ class MerchantCrew:
             llm="deepseek/deepseek-chat"
         )
 
-    async def find_prospects(self, industry: str, region: str, target_count: int) -> List[Dict]:
+    async def find_prospects(
+        self,
+        industry: str,
+        region: str,
+        target_count: int,
+        exclude_companies: Optional[List[str]] = None
+    ) -> List[Dict]:
         """
-        寻找潜在客户
+        寻找潜在客户，exclude_companies 中的公司已经是客户，不再研究
         """
+        exclusions = ""
+        if exclude_companies:
+            exclusions = "以下公司已经在客户列表中，不要再包含：" + "、".join(exclude_companies)
+
         research_task = Task(
             description=f"""
             在{region}地区寻找{industry}行业的潜在客户。
             需要找到{target_count}个潜在客户。
+            {exclusions}
             对于每个客户，需要提供：
             1. 公司名称
             2. 联系人姓名
@@ -197,15 +208,20 @@ class MerchantCrew:
         self,
         customer_name: str,
         company: str,
-        history: List[Dict]
+        history: List[Dict],
+        summary: Optional[str] = None
     ) -> Dict:
         """
         生成客户互动内容
+
+        history 只包含最近的若干条记录，更早的记录以 summary 的形式提供
         """
         context = "\n".join([
             f"时间：{h['created_at']}\n类型：{h['type']}\n内容：{h['content']}\n"
             for h in history
         ])
+        if summary:
+            context = f"{summary}\n\n最近的互动：\n{context}"
 
         writing_task = Task(
             description=f"""
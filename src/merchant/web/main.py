@@ -1,20 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 import uvicorn
+import asyncio
+import os
 from .models.base import engine, Base
 from .models.user import User
-from .models.customer import Customer, CustomerInteraction
-from .models.email import EmailBinding
-from .routes import users, customers, auth, pages, email  # 从routes导入所有路由
+from .models.cache_version import CacheVersion
+from .models.login_throttle import LoginBucket
+from .models.customer import Customer, CustomerInteraction, ensure_customer_indexes
+from .models.email import EmailBinding, EmailMessage, EmailSyncState
+from .models.email_search import ensure_search_index
+from .models.customer_search import ensure_customer_search_index
+from .routes import users, customers, auth, pages, email, metrics  # 从routes导入所有路由
+from .services.db_maintenance import db_maintenance
+from .services.email_events import email_events
+from .services.email_watcher import email_watcher, WATCH_ENABLED
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    ensure_customer_indexes(connection)
+if engine.dialect.name == "sqlite":
+    # 邮件表和客户表早于全文索引创建时补建索引
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+        ensure_customer_search_index(connection)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动和停止后台邮箱监听和数据库维护"""
+    email_events.bind_loop(asyncio.get_running_loop())
+    background = not os.getenv("TESTING")
+    watching = WATCH_ENABLED and background
+    if watching:
+        email_watcher.start()
+    if background:
+        db_maintenance.start()
+    yield
+    if background:
+        db_maintenance.stop()
+    if watching:
+        email_watcher.stop()
 
 app = FastAPI(
     title="Merchant CRM",
     description="Customer Relationship Management system with AI Agent capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -32,6 +66,7 @@ app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(customers.router, prefix="/api/customers", tags=["customers"])
 app.include_router(email.router, prefix="/api/email", tags=["email"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 
 @app.get("/")
 async def root():
@@ -49,7 +84,8 @@ async def api_root():
             "/api/auth",
             "/api/users",
             "/api/customers",
-            "/api/email"
+            "/api/email",
+            "/api/metrics"
         ],
         "documentation": "/docs"
     }
@@ -1,15 +1,73 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import Session
-from typing import Generator
+from sqlalchemy.pool import QueuePool
+from fastapi import Depends
+from typing import AsyncGenerator, Generator
 import os
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./merchant.db")
+# 设为 1 时路由通过异步驱动访问数据库，数据库 I/O 不再占用事件循环线程
+ASYNC_DATABASE = os.getenv("ASYNC_DATABASE", "0") == "1"
+# 异步模式的连接串，不设置时按 DATABASE_URL 换成对应的异步驱动
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# SQLite 连接参数，设为 0 时使用 SQLite 的默认设置
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "1") == "1"
+# WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下只在检查点时 fsync
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# 每个连接的页缓存（KB）和内存映射的大小（字节）
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# 遇到写锁时最多等待的毫秒数，超时后才报 database is locked
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# 连接池保持的连接数和高峰时额外允许的连接数
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "20"))
+
+def configure_sqlite(engine) -> None:
+    """每个新建的 SQLite 连接设置 WAL、缓存和锁等待等参数"""
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+def create_db_engine(url: str, tune_sqlite: bool = SQLITE_TUNING):
+    """创建同步引擎，SQLite 文件数据库使用连接池并按需设置连接参数"""
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(url)
+    if not is_sqlite_file(url):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    # 文件数据库每个线程各用一个连接，WAL 下读连接可以和写连接并行
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=SQLITE_POOL_SIZE,
+        max_overflow=SQLITE_MAX_OVERFLOW,
+    )
+    if tune_sqlite:
+        configure_sqlite(engine)
+    return engine
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -19,4 +77,76 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def to_async_url(url: str) -> str:
+    """把同步连接串换成对应的异步驱动，例如 sqlite:// -> sqlite+aiosqlite://"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+_async_sessionmaker = None
+
+def get_async_sessionmaker():
+    """第一次使用时创建异步引擎，没有启用异步模式时不需要安装异步驱动"""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        url = ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+        async_engine = create_async_engine(url)
+        if SQLITE_TUNING and is_sqlite_file(url):
+            configure_sqlite(async_engine.sync_engine)
+        # 提交后不过期属性，否则之后读取属性会在事件循环中隐式查询
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+class SyncSessionAdapter:
+    """给同步 Session 套上和 AsyncSession 相同的 await 接口
+
+    路由只按 AsyncSession 的接口编写，同步模式下这些方法仍然直接在事件
+    循环中执行，和改动前的行为一致。
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.sync_session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.sync_session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.sync_session.scalars(statement, *args, **kwargs)
+
+    async def get(self, entity, ident):
+        return self.sync_session.get(entity, ident)
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    async def delete(self, instance) -> None:
+        self.sync_session.delete(instance)
+
+    async def commit(self) -> None:
+        self.sync_session.commit()
+
+    async def rollback(self) -> None:
+        self.sync_session.rollback()
+
+    async def refresh(self, instance) -> None:
+        self.sync_session.refresh(instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """执行只支持同步 Session 的代码，异步模式下由 AsyncSession 在驱动的协程中执行"""
+        return fn(self.sync_session, *args, **kwargs)
+
+async def get_session(db: Session = Depends(get_db)) -> AsyncGenerator:
+    """路由使用的数据库会话：启用 ASYNC_DATABASE 时是 AsyncSession，否则是包装后的同步会话"""
+    if not ASYNC_DATABASE:
+        yield SyncSessionAdapter(db)
+        return
+    async with get_async_sessionmaker()() as session:
+        yield session
@@ -0,0 +1,30 @@
+from sqlalchemy import BigInteger, Column, String, insert, select, update
+
+from .base import Base
+
+
+class CacheVersion(Base):
+    """进程内缓存的版本号
+
+    数据变化时在同一事务中把对应的版本号加 1，其他工作进程发现版本号
+    变化后清空自己的缓存。
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+def bump_version(connection, name: str) -> None:
+    """把版本号加 1，第一次修改时插入记录"""
+    result = connection.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(CacheVersion).values(name=name, version=1))
+
+
+def read_version(connection, name: str) -> int:
+    """当前版本号，从未修改过时为 0"""
+    version = connection.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return version or 0
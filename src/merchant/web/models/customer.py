@@ -1,10 +1,19 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.sql import func
 from .base import Base
 
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = (
+        # 客户列表按 (created_at, id) 倒序做 keyset 分页，每种筛选条件一个复合索引
+        Index("ix_customers_created_by_created_at_id", "created_by", "created_at", "id"),
+        Index("ix_customers_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_customers_company_created_at_id", "company", "created_at", "id"),
+        Index("ix_customers_created_at_id", "created_at", "id"),
+        Index("ix_customers_last_contact", "last_contact"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
@@ -22,8 +31,15 @@ class Customer(Base):
     user = relationship("User", back_populates="customers")
     interactions = relationship("CustomerInteraction", back_populates="customer")
 
+# 按邮箱去重时不区分大小写，表达式索引要在列定义之后声明
+Index("ix_customers_email_lower", func.lower(Customer.email))
+
 class CustomerInteraction(Base):
     __tablename__ = "customer_interactions"
+    __table_args__ = (
+        # 按客户取最近的互动记录；id 是 rowid，索引中相同时间的记录按 id 排列
+        Index("ix_customer_interactions_customer_id_created_at", "customer_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"))
@@ -33,4 +49,36 @@ class CustomerInteraction(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     customer = relationship("Customer", back_populates="interactions")
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User")
+
+
+class CustomerEmailLink(Base):
+    """邮件与客户的关联，按 Message-ID 去重"""
+    __tablename__ = "customer_email_links"
+    __table_args__ = (
+        UniqueConstraint("customer_id", "message_id", name="uq_customer_email_links_customer_message"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
+    interaction_id = Column(Integer, ForeignKey("customer_interactions.id"), nullable=False)
+    message_id = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CustomerHistorySummary(Base):
+    """客户较早互动记录的滚动摘要，through_* 是已经并入摘要的最后一条记录"""
+    __tablename__ = "customer_history_summaries"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    state = Column(Text, nullable=False)  # 摘要内容的 JSON
+    through_created_at = Column(String)  # created_at 在数据库中的原始文本，和分页游标一样按文本比较
+    through_id = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+def ensure_customer_indexes(connection) -> None:
+    """表早于这些索引存在时 create_all 不会补建，启动时调用一次"""
+    # SQLite 反射不出表达式索引，checkfirst 检查不到，直接用 IF NOT EXISTS
+    for table in (Customer.__table__, CustomerInteraction.__table__):
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,107 @@
+import json
+import re
+
+from sqlalchemy import DDL, event, text
+
+from .customer import Customer
+from .email_search import CJK_RE, cjk_bigrams, register_sqlite_function  # noqa: F401  cjk_bigrams 在导入时注册到每个 SQLite 连接
+
+FTS_TABLE = "customers_fts"
+# 各列在 bm25 排序中的权重：姓名、公司、职位、备注
+FTS_RANK = "bm25(10.0, 8.0, 3.0, 1.0)"
+# 姓名和公司中出现过的词（不含中日韩文字和纯数字），以及这些词的三字组索引。
+# 容错搜索在词表而不是客户表中找拼写相近的词，词表比客户表小得多。
+TERMS_TABLE = "customer_search_terms"
+TERMS_TRIGRAM_TABLE = "customer_search_terms_trigram"
+
+_WORD_RE = re.compile(r"\w+")
+
+_INDEXED = "cjk_bigrams({p}.full_name), cjk_bigrams({p}.company), cjk_bigrams({p}.position), cjk_bigrams({p}.notes)"
+_NEW_TERMS = f"INSERT OR IGNORE INTO {TERMS_TABLE}(term) SELECT value FROM json_each(search_terms(new.full_name, new.company));"
+
+# 和邮件索引一样不保存原文（content=''），删除时要提供写入时的文字。
+# 删除客户时不清理词表，多出来的词只会让容错查询多一个不命中的候选。
+SEARCH_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        full_name, company, position, notes, content = '', tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"CREATE TABLE IF NOT EXISTS {TERMS_TABLE} (id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE)",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TERMS_TRIGRAM_TABLE} USING fts5(
+        term, content = '{TERMS_TABLE}', content_rowid = 'id', tokenize = 'trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS customer_search_terms_insert AFTER INSERT ON {TERMS_TABLE} BEGIN
+        INSERT INTO {TERMS_TRIGRAM_TABLE}(rowid, term) VALUES (new.id, new.term);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, full_name, company, position, notes)
+        VALUES (new.id, {_INDEXED.format(p="new")});
+        {_NEW_TERMS}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_fts_update
+    AFTER UPDATE OF full_name, company, position, notes ON customers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, company, position, notes)
+        VALUES ('delete', old.id, {_INDEXED.format(p="old")});
+        INSERT INTO {FTS_TABLE}(rowid, full_name, company, position, notes)
+        VALUES (new.id, {_INDEXED.format(p="new")});
+        {_NEW_TERMS}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, full_name, company, position, notes)
+        VALUES ('delete', old.id, {_INDEXED.format(p="old")});
+    END""",
+]
+
+
+def is_search_term(word: str) -> bool:
+    """至少三个字、不含中日韩文字也不是纯数字的词才收录到词表"""
+    return len(word) >= 3 and not word.isdigit() and not CJK_RE.search(word)
+
+
+def search_terms(*values):
+    """词表中要收录的词（小写），以 JSON 数组返回"""
+    terms = set()
+    for value in values:
+        terms.update(word for word in _WORD_RE.findall(CJK_RE.sub(" ", value or "").lower()) if is_search_term(word))
+    return json.dumps(sorted(terms))
+
+
+# 客户索引触发器需要在每个 SQLite 连接上注册 search_terms 函数
+register_sqlite_function("search_terms", 2, search_terms)
+
+
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        ensure_customer_search_index(connection)
+
+
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        for name in (FTS_TABLE, TERMS_TRIGRAM_TABLE, TERMS_TABLE):
+            connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+
+event.listen(Customer.__table__, "after_create", _create_search_index)
+event.listen(Customer.__table__, "before_drop", _drop_search_index)
+
+
+def ensure_customer_search_index(connection) -> None:
+    """创建客户搜索索引、词表和同步触发器，索引是新建的时候用已有客户填充
+
+    customers 表早于索引存在时 after_create 不会触发，启动时调用一次。
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first()
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(DDL(statement))
+    if not exists:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', :rank)"), {"rank": FTS_RANK})
+        connection.execute(text(
+            f"INSERT INTO {FTS_TABLE}(rowid, full_name, company, position, notes) "
+            f"SELECT id, {_INDEXED.format(p='customers')} FROM customers"
+        ))
+        connection.execute(text(
+            f"INSERT OR IGNORE INTO {TERMS_TABLE}(term) "
+            f"SELECT terms.value FROM customers, json_each(search_terms(customers.full_name, customers.company)) AS terms"
+        ))
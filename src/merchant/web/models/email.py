@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -19,4 +19,48 @@ class EmailBinding(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # 关系
-    user = relationship("User", back_populates="email_bindings") 
\ No newline at end of file
+    user = relationship("User", back_populates="email_bindings")
+
+class EmailMessage(Base):
+    """本地缓存的邮件头"""
+    __tablename__ = "email_messages"
+    __table_args__ = (
+        UniqueConstraint("binding_id", "folder", "uid", name="uq_email_messages_binding_folder_uid"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    binding_id = Column(Integer, ForeignKey("email_bindings.id"), nullable=False)
+    folder = Column(String, nullable=False, default="INBOX")
+    uid = Column(Integer, nullable=False)
+    message_id = Column(String, index=True)
+    subject = Column(String)
+    from_addr = Column(String)
+    to_addrs = Column(Text)  # 多个收件人用换行分隔
+    date = Column(DateTime)
+    flags = Column(String)  # 多个标记用空格分隔
+    size = Column(Integer)
+    has_attachments = Column(Boolean, default=False)
+    modseq = Column(BigInteger)
+    preview = Column(String)  # 正文开头的一段文字
+    body_text = Column(Text)  # 正文纯文本，用于搜索
+    attachments = Column(Text)  # 附件信息的 JSON 列表
+    body_parsed_at = Column(DateTime)  # 正文解析时间，为空表示尚未下载正文
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EmailSyncState(Base):
+    """每个绑定、每个文件夹的同步进度"""
+    __tablename__ = "email_sync_states"
+    __table_args__ = (
+        UniqueConstraint("binding_id", "folder", name="uq_email_sync_states_binding_folder"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    binding_id = Column(Integer, ForeignKey("email_bindings.id"), nullable=False)
+    folder = Column(String, nullable=False, default="INBOX")
+    uidvalidity = Column(BigInteger)
+    highest_uid = Column(Integer, default=0)  # 已同步的最大 UID
+    highest_modseq = Column(BigInteger)  # CONDSTORE 下已同步的最大 MODSEQ
+    message_count = Column(Integer, default=0)  # 上次同步时文件夹中的邮件数
+    backfill_complete = Column(Boolean, default=False)  # 更早的邮件是否已全部缓存
+    last_synced_at = Column(DateTime)
+
@@ -0,0 +1,112 @@
+import re
+import sqlite3
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
+from sqlalchemy.engine import Engine
+
+from .email import EmailMessage
+
+# unicode61 分词器会把连续的中日韩文字当成一个词。建索引前把每段连续的
+# 中日韩文字拆成相邻两字的词（"季度报告" -> "季度 度报 报告 告"），最后
+# 一个字单独成词，这样单字查询可以用前缀匹配。二字词比单字的区分度高很多，
+# 短语查询不用合并大量单字的位置列表。
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+FTS_TABLE = "email_messages_fts"
+# 各列在 bm25 排序中的权重：主题、发件人、收件人、正文
+FTS_RANK = "bm25(10.0, 5.0, 2.0, 1.0)"
+
+_INDEXED = "cjk_bigrams({p}.subject), cjk_bigrams({p}.from_addr), cjk_bigrams({p}.to_addrs), cjk_bigrams({p}.body_text)"
+
+# 不保存原文（content=''），摘要和高亮从 email_messages 中的原文生成。
+# 无内容表删除时要提供与写入时相同的分词文字，cjk_bigrams 的规则修改后
+# 需要删除该表，启动时会重新建立索引。
+SEARCH_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        subject, from_addr, to_addrs, body_text, content = '', tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS email_messages_fts_insert AFTER INSERT ON email_messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, subject, from_addr, to_addrs, body_text)
+        VALUES (new.id, {_INDEXED.format(p="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS email_messages_fts_update
+    AFTER UPDATE OF subject, from_addr, to_addrs, body_text ON email_messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, from_addr, to_addrs, body_text)
+        VALUES ('delete', old.id, {_INDEXED.format(p="old")});
+        INSERT INTO {FTS_TABLE}(rowid, subject, from_addr, to_addrs, body_text)
+        VALUES (new.id, {_INDEXED.format(p="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS email_messages_fts_delete AFTER DELETE ON email_messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, from_addr, to_addrs, body_text)
+        VALUES ('delete', old.id, {_INDEXED.format(p="old")});
+    END""",
+]
+
+
+def cjk_bigrams(value):
+    """建索引用的分词文字：每段中日韩文字拆成相邻两字的词，再加上最后一个字"""
+    if value is None:
+        return None
+
+    def split(match):
+        run = match.group()
+        words = [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+        return " " + " ".join(words) + " "
+
+    return CJK_RE.sub(split, value)
+
+
+# pysqlite 直接给出 sqlite3 连接，aiosqlite 给出 SQLAlchemy 的适配器，两者都支持 create_function
+SQLITE_CONNECTIONS = (sqlite3.Connection, AsyncAdapt_aiosqlite_connection)
+
+
+def register_sqlite_function(name: str, nargs: int, func) -> None:
+    """在之后建立的每个 SQLite 连接（同步或异步驱动）上注册自定义函数
+
+    Args:
+        name: SQL 中使用的函数名
+        nargs: 参数个数
+        func: Python 实现，必须是确定性的
+    """
+    @event.listens_for(Engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, SQLITE_CONNECTIONS):
+            dbapi_connection.create_function(name, nargs, func, deterministic=True)
+
+
+# 索引触发器需要在每个 SQLite 连接上注册 cjk_bigrams 函数
+register_sqlite_function("cjk_bigrams", 1, cjk_bigrams)
+
+
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        ensure_search_index(connection)
+
+
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+event.listen(EmailMessage.__table__, "after_create", _create_search_index)
+event.listen(EmailMessage.__table__, "before_drop", _drop_search_index)
+
+
+def ensure_search_index(connection) -> None:
+    """创建全文索引和同步触发器，索引是新建的时候用已有邮件填充
+
+    email_messages 表早于索引存在时 after_create 不会触发，启动时调用一次。
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first()
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(DDL(statement))
+    if not exists:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', :rank)"), {"rank": FTS_RANK})
+        connection.execute(text(
+            f"INSERT INTO {FTS_TABLE}(rowid, subject, from_addr, to_addrs, body_text) "
+            f"SELECT id, {_INDEXED.format(p='email_messages')} FROM email_messages"
+        ))
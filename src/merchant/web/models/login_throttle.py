@@ -0,0 +1,13 @@
+from sqlalchemy import Boolean, Column, Float, String
+
+from .base import Base
+
+
+class LoginBucket(Base):
+    """登录限流的令牌桶，多个工作进程共用时保存在数据库中"""
+    __tablename__ = "login_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)
+    allowed = Column(Boolean, nullable=False, default=True)
@@ -1,15 +1,16 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
-from ..models.base import get_db
+from ..models.base import get_session
 from ..models.user import User
 from ..schemas.auth import Token, UserCreate, UserResponse
 from ..utils.auth import (
     authenticate_user,
+    check_login_throttle,
     create_access_token,
-    get_password_hash,
+    hash_password,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_user
 )
@@ -18,11 +19,13 @@ router = APIRouter()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """用户登录获取token"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    await check_login_throttle(request.client.host if request.client else None, form_data.username)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,23 +39,25 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db = Depends(get_session)):
     """用户注册"""
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
+    # 排队等待哈希期间不占用连接池中的数据库连接
+    await db.commit()
     new_user = User(
         email=user.email,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await hash_password(user.password),
         full_name=user.full_name
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # 创建并返回token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
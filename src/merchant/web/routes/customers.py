@@ -1,34 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Optional
+from datetime import datetime
 
-from ..models.base import get_db
+from ..models.base import SyncSessionAdapter, get_session
 from ..models.user import User
 from ..models.customer import Customer, CustomerInteraction
-from ..schemas.customer import CustomerCreate, CustomerResponse
+from ..schemas.customer import (
+    CustomerCreate, CustomerImportReport, CustomerPage, CustomerResponse,
+    CustomerSearchHit, CustomerSearchResponse
+)
+from ..services.customer_export import (
+    ENCODERS, MEDIA_TYPES, ExportUnavailable, customer_export_query, encode_stream,
+    encode_stream_async, interaction_export_query, iter_batches, iter_batches_async
+)
+from ..services.customer_import import CustomerImporter, detect_format
+from ..services.customer_linker import customer_index
+from ..services.customer_listing import build_customer_page_query, filter_customers, split_page
+from ..services.customer_search import search_customers
+from ..utils.pagination import InvalidCursor
 from ..utils.auth import get_current_active_user
 
 router = APIRouter()
 
-@router.get("/", response_model=List[CustomerResponse])
+def _visible_owner(current_user: User, created_by: Optional[int]) -> Optional[int]:
+    """普通用户只能看到自己创建的客户，管理员可以按 created_by 筛选"""
+    if current_user.is_superuser:
+        return created_by
+    if created_by not in (None, current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough privileges")
+    return current_user.id
+
+async def _export_response(db, stmt, fmt: str, filename: str) -> StreamingResponse:
+    """流式输出查询结果，数据库读取和编码都是一批一批进行的"""
+    try:
+        encoder = ENCODERS[fmt](stmt.selected_columns)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 响应开始发送时请求的会话已经关闭，导出用单独的连接
+    bind = await db.run_sync(lambda session: session.get_bind())
+    if isinstance(db, SyncSessionAdapter):
+        # 同步生成器由 StreamingResponse 放到线程池中迭代，不阻塞事件循环
+        body = encode_stream(encoder, iter_batches(bind, stmt))
+    else:
+        body = encode_stream_async(encoder, iter_batches_async(AsyncEngine(bind), stmt))
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+@router.get("/", response_model=CustomerPage)
 async def list_customers(
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    company: Optional[str] = None,
+    created_by: Optional[int] = None,
+    last_contact_from: Optional[datetime] = None,
+    last_contact_to: Optional[datetime] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
-    """获取客户列表"""
-    customers = db.query(Customer).offset(skip).limit(limit).all()
-    return customers
+    """按创建时间倒序分页获取客户列表，cursor 为上一页返回的 next_cursor
+
+    普通用户只能看到自己创建的客户，管理员可以用 created_by 筛选。
+    """
+    try:
+        stmt = build_customer_page_query(
+            limit,
+            cursor=cursor,
+            created_by=_visible_owner(current_user, created_by),
+            status=status,
+            company=company,
+            last_contact_from=last_contact_from,
+            last_contact_to=last_contact_to
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    customers, next_cursor = split_page((await db.execute(stmt)).all(), limit)
+    return CustomerPage(customers=customers, next_cursor=next_cursor)
 
 @router.post("/", response_model=CustomerResponse)
 async def create_customer(
     customer: CustomerCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """创建新客户"""
-    db_customer = db.query(Customer).filter(Customer.email == customer.email).first()
+    db_customer = await db.scalar(select(Customer).where(Customer.email == customer.email))
     if db_customer:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -37,18 +100,81 @@ async def create_customer(
     
     new_customer = Customer(**customer_data, created_by=current_user.id)
     db.add(new_customer)
-    db.commit()
-    db.refresh(new_customer)
+    await db.commit()
+    await db.refresh(new_customer)
+    customer_index.invalidate()
     return new_customer
 
+@router.post("/bulk", response_model=CustomerImportReport)
+async def bulk_import_customers(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_active_user),
+    db = Depends(get_session)
+):
+    """流式导入 CSV（首行为表头）或 NDJSON 格式的客户，返回失败的行
+
+    格式由 format 参数或 Content-Type（text/csv、application/x-ndjson）决定。
+    """
+    fmt = format or detect_format(request.headers.get("content-type", ""))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use text/csv or application/x-ndjson"
+        )
+    report = await CustomerImporter(current_user.id).run(db, request.stream(), fmt)
+    if report["inserted"]:
+        customer_index.invalidate()
+    return report
+
+@router.get("/export")
+async def export_customers(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    status: Optional[str] = None,
+    company: Optional[str] = None,
+    created_by: Optional[int] = None,
+    last_contact_from: Optional[datetime] = None,
+    last_contact_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_active_user),
+    db = Depends(get_session)
+):
+    """按 id 顺序导出客户（CSV、NDJSON 或 Parquet），筛选条件和客户列表相同"""
+    stmt = filter_customers(
+        customer_export_query(),
+        created_by=_visible_owner(current_user, created_by),
+        status=status,
+        company=company,
+        last_contact_from=last_contact_from,
+        last_contact_to=last_contact_to
+    )
+    return await _export_response(db, stmt, format, "customers")
+
+@router.get("/search", response_model=CustomerSearchResponse)
+async def search_customers_route(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    created_by: Optional[int] = None,
+    current_user: User = Depends(get_current_active_user),
+    db = Depends(get_session)
+):
+    """按姓名、公司、职位和备注搜索客户，支持词前缀和拼写容错"""
+    try:
+        hits = await db.run_sync(search_customers, q, owner_id=_visible_owner(current_user, created_by), limit=limit)
+    except OperationalError:
+        raise HTTPException(status_code=400, detail="Invalid search query")
+    return CustomerSearchResponse(results=[
+        CustomerSearchHit(**CustomerResponse.model_validate(customer).model_dump(), match=match)
+        for customer, match in hits
+    ])
+
 @router.get("/{customer_id}", response_model=CustomerResponse)
 async def get_customer(
     customer_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """获取客户详情"""
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    customer = await db.get(Customer, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
@@ -59,17 +185,33 @@ async def get_customer_interactions(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """获取客户互动记录"""
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    customer = await db.get(Customer, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    interactions = db.query(CustomerInteraction)\
-        .filter(CustomerInteraction.customer_id == customer_id)\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+    interactions = (await db.scalars(
+        select(CustomerInteraction)
+        .where(CustomerInteraction.customer_id == customer_id)
+        .offset(skip)
+        .limit(limit)
+    )).all()
     
-    return interactions 
\ No newline at end of file
+    return interactions
+
+@router.get("/{customer_id}/interactions/export")
+async def export_customer_interactions(
+    customer_id: int,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    current_user: User = Depends(get_current_active_user),
+    db = Depends(get_session)
+):
+    """按时间顺序导出客户的全部互动记录，普通用户只能导出自己创建的客户"""
+    customer = await db.get(Customer, customer_id)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    if not current_user.is_superuser and customer.created_by != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough privileges")
+    return await _export_response(db, interaction_export_query(customer_id), format, f"customer-{customer_id}-interactions")
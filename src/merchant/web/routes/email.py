@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+from urllib.parse import quote
+import asyncio
+import json
 
-from ..models.base import get_db
+from ..models.base import get_db, get_session
 from ..models.user import User
 from ..models.email import EmailBinding
-from ..schemas.email import EmailBindRequest, EmailBindResponse, EmailBindingInfo, EmailInboxResponse
-from ..utils.auth import get_current_user
-from ..utils.email import verify_imap_connection, fetch_inbox_emails
+from ..schemas.email import (
+    EmailBindRequest, EmailBindResponse, EmailBindingInfo, EmailInboxResponse, EmailDetail, UnifiedInboxResponse,
+    EmailSearchResponse, EmailBulkBindRequest, EmailBulkBindResult, EmailBulkBindResponse
+)
+from ..utils.auth import get_current_user, get_current_user_from_query
+from ..utils.attachments import attachment_cache, fetch_part_info, iter_attachment
+from ..utils.email import fetch_email_detail, imap_pool, imap_executor, run_imap
+from ..utils.imap_pool import IMAPAccount
+from ..services.email_bind import adopt_sessions, close_sessions, insert_bindings, verify_accounts
+from ..services.email_events import email_events
+from ..services.customer_linker import CustomerLinker
+from ..services.email_search import search_messages
+from ..services.email_sync import EmailSyncService, load_unified_inbox, to_inbox_item
+from ..services.email_watcher import email_watcher
 
 router = APIRouter()
 
@@ -15,32 +34,22 @@ router = APIRouter()
 async def bind_email(
     email_data: EmailBindRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """绑定邮箱"""
     # 检查邮箱是否已被绑定
-    existing_binding = db.query(EmailBinding).filter(EmailBinding.email == email_data.email).first()
+    existing_binding = await db.scalar(select(EmailBinding).where(EmailBinding.email == email_data.email))
     if existing_binding:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already bound"
         )
     
-    # 验证IMAP连接
-    success, message = verify_imap_connection(
-        email=email_data.email,
-        password=email_data.password,
-        imap_server=email_data.imap_server,
-        imap_port=email_data.imap_port
-    )
+    # 验证IMAP连接，等待期间归还数据库连接
+    await db.commit()
+    [(success, message, imap_client)] = await verify_accounts([email_data])
     
     if not success:
-        # 检查是否是 Gmail 的不安全登录错误
-        if "Gmail 需要应用专用密码" in message:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=message
-            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=message
@@ -56,30 +65,98 @@ async def bind_email(
     )
     
     db.add(email_binding)
-    db.commit()
-    db.refresh(email_binding)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 验证期间其他请求绑定了同一个邮箱
+        await db.rollback()
+        await close_sessions([(email_data.imap_server, imap_client)])
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already bound"
+        )
+    await db.refresh(email_binding)
+    # 验证时登录的会话留给首次同步使用
+    await adopt_sessions([(email_binding, imap_client)])
+    email_watcher.watch(email_binding)
     
     return email_binding
 
+@router.post("/bind/bulk", response_model=EmailBulkBindResponse)
+async def bulk_bind_email(
+    request: EmailBulkBindRequest,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_session)
+):
+    """批量绑定邮箱，并发验证登录信息，返回每个邮箱的绑定结果"""
+    emails = [account.email for account in request.accounts]
+    bound = set((await db.scalars(select(EmailBinding.email).where(EmailBinding.email.in_(emails)))).all())
+
+    results = [EmailBulkBindResult(email=account.email, success=False) for account in request.accounts]
+    pending = []
+    for index, account in enumerate(request.accounts):
+        if account.email in bound:
+            results[index].error = "Email already bound"
+        else:
+            bound.add(account.email)
+            pending.append(index)
+
+    await db.commit()
+    verified = await verify_accounts([request.accounts[index] for index in pending])
+
+    clients = {}
+    for index, (success, message, imap_client) in zip(pending, verified):
+        if success:
+            clients[index] = imap_client
+        else:
+            results[index].error = message
+    created = await db.run_sync(insert_bindings, [
+        {
+            "user_id": current_user.id,
+            "email": request.accounts[index].email,
+            "password": request.accounts[index].password,  # 注意：实际应用中应该加密存储
+            "imap_server": request.accounts[index].imap_server,
+            "imap_port": request.accounts[index].imap_port,
+        }
+        for index in clients
+    ]) if clients else {}
+
+    adopted, rejected = [], []
+    for index, imap_client in clients.items():
+        email_binding = created.get(request.accounts[index].email)
+        if email_binding is None:
+            results[index].error = "Email already bound"
+            rejected.append((request.accounts[index].imap_server, imap_client))
+            continue
+        adopted.append((email_binding, imap_client))
+        results[index].success = True
+        results[index].binding = EmailBindResponse.model_validate(email_binding)
+    await close_sessions(rejected)
+    await adopt_sessions(adopted)
+    for email_binding, _ in adopted:
+        email_watcher.watch(email_binding)
+
+    return {"results": results}
+
 @router.get("/list", response_model=List[EmailBindingInfo])
 async def list_email_bindings(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """获取用户绑定的邮箱列表"""
-    return db.query(EmailBinding).filter(EmailBinding.user_id == current_user.id).all()
+    return (await db.scalars(select(EmailBinding).where(EmailBinding.user_id == current_user.id))).all()
 
 @router.delete("/{binding_id}")
 async def unbind_email(
     binding_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """解绑邮箱"""
-    binding = db.query(EmailBinding).filter(
+    binding = await db.scalar(select(EmailBinding).where(
         EmailBinding.id == binding_id,
         EmailBinding.user_id == current_user.id
-    ).first()
+    ))
     
     if not binding:
         raise HTTPException(
@@ -87,18 +164,107 @@ async def unbind_email(
             detail="Email binding not found"
         )
     
-    db.delete(binding)
-    db.commit()
+    await db.run_sync(lambda session: EmailSyncService(session).purge(binding_id))
+    await db.delete(binding)
+    await db.commit()
+
+    # 关闭该绑定在连接池中的会话
+    imap_pool.evict(binding_id)
+    email_watcher.unwatch(binding_id)
     
     return {"status": "success", "message": "Email unbound successfully"}
 
+# SSE 心跳间隔（秒），防止代理关闭空闲连接
+EVENTS_KEEPALIVE_INTERVAL = 15
+
+@router.get("/events")
+async def email_events_stream(
+    request: Request,
+    current_user: User = Depends(get_current_user_from_query),
+    db = Depends(get_session)
+):
+    """通过 Server-Sent Events 推送当前用户邮箱的新邮件"""
+    user_id = current_user.id
+    # 长连接期间不持有数据库连接
+    await db.commit()
+    queue = email_events.subscribe(user_id)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(jsonable_encoder(event))}\n\n"
+        finally:
+            email_events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search", response_model=EmailSearchResponse)
+async def search_emails(
+    q: str = Query(..., min_length=1, max_length=200),
+    binding_id: Optional[int] = None,
+    sender: Optional[str] = Query(None, max_length=200),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_session)
+):
+    """在已同步的邮件中全文搜索（主题、发件人、收件人和正文）"""
+    try:
+        results = await db.run_sync(
+            search_messages,
+            current_user.id,
+            q,
+            binding_id=binding_id,
+            sender=sender,
+            date_from=date_from,
+            date_to=date_to,
+            limit=limit,
+            offset=offset
+        )
+    except OperationalError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid search query"
+        )
+    return EmailSearchResponse(results=results)
+
+@router.get("/inbox", response_model=UnifiedInboxResponse)
+async def get_unified_inbox(
+    limit: int = Query(20, ge=1, le=100),
+    timeout: Optional[float] = Query(None, gt=0, le=60),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)  # EmailSyncService 在等待 IMAP 时使用同步会话
+):
+    """获取所有启用邮箱的合并收件箱，超时或出错的邮箱在 errors 中返回"""
+    email_bindings = db.query(EmailBinding).filter(
+        EmailBinding.user_id == current_user.id,
+        EmailBinding.is_active == True
+    ).all()
+
+    emails, errors = await load_unified_inbox(db, email_bindings, limit=limit, timeout=timeout)
+    return UnifiedInboxResponse(emails=emails, errors=errors)
+
 @router.get("/inbox/{binding_id}", response_model=EmailInboxResponse)
 async def get_inbox_emails(
     binding_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    before_uid: Optional[int] = Query(None, ge=1),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db)  # EmailSyncService 在等待 IMAP 时使用同步会话
 ):
-    """获取指定邮箱的收件箱邮件"""
+    """获取指定邮箱的收件箱邮件（按日期倒序分页，before_uid 为上一页返回的 next_cursor）"""
     # 获取邮箱绑定信息
     email_binding = db.query(EmailBinding).filter(
         EmailBinding.id == binding_id,
@@ -112,9 +278,17 @@ async def get_inbox_emails(
         )
     
     try:
-        # 获取收件箱邮件
-        emails = fetch_inbox_emails(email_binding)
-        return EmailInboxResponse(emails=emails, total=len(emails))
+        # 第一页先增量同步，然后从本地缓存分页读取，缺少的部分按需补齐
+        messages, next_cursor, state = await EmailSyncService(db).load_page(
+            email_binding,
+            limit=limit,
+            before_uid=before_uid
+        )
+        return EmailInboxResponse(
+            emails=[to_inbox_item(message) for message in messages],
+            total=state.message_count or 0,
+            next_cursor=next_cursor
+        )
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -122,4 +296,143 @@ async def get_inbox_emails(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/{binding_id}/ingest")
+async def ingest_email_bodies(
+    binding_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)  # EmailSyncService 在等待 IMAP 时使用同步会话
+):
+    """批量下载并解析已缓存邮件的正文，生成预览和搜索用的文字"""
+    email_binding = db.query(EmailBinding).filter(
+        EmailBinding.id == binding_id,
+        EmailBinding.user_id == current_user.id
+    ).first()
+
+    if not email_binding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email binding not found"
+        )
+
+    try:
+        processed = await EmailSyncService(db).ingest_bodies(email_binding, limit=limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+    return {"status": "success", "processed": processed}
+
+@router.post("/{binding_id}/link-customers")
+async def link_email_customers(
+    binding_id: int,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_session)
+):
+    """把已缓存的邮件关联到匹配的客户，写入客户互动记录"""
+    email_binding = await db.scalar(select(EmailBinding).where(
+        EmailBinding.id == binding_id,
+        EmailBinding.user_id == current_user.id
+    ))
+
+    if not email_binding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email binding not found"
+        )
+
+    linked = await db.run_sync(lambda session: CustomerLinker(session).link_cached(binding_id))
+    return {"status": "success", "linked": linked}
+
+@router.get("/{binding_id}/messages/{uid}", response_model=EmailDetail)
+async def get_email_detail(
+    binding_id: int,
+    uid: int,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_session)
+):
+    """获取单封邮件的完整内容"""
+    email_binding = await db.scalar(select(EmailBinding).where(
+        EmailBinding.id == binding_id,
+        EmailBinding.user_id == current_user.id
+    ))
+
+    if not email_binding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email binding not found"
+        )
+
+    # 等待 IMAP 期间归还数据库连接
+    account = IMAPAccount.from_binding(email_binding)
+    await db.commit()
+    try:
+        detail = await imap_executor.run(account.imap_server, fetch_email_detail, account, uid)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    if detail is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email not found"
+        )
+    return detail
+
+@router.get("/{binding_id}/messages/{uid}/attachments/{part}")
+async def download_attachment(
+    binding_id: int,
+    uid: int,
+    part: str = Path(..., pattern=r"^\d+(\.\d+)*$"),
+    folder: str = Query("INBOX"),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_session)
+):
+    """分段下载邮件中的一个 part，边解码边返回，不把整个附件读入内存"""
+    email_binding = await db.scalar(select(EmailBinding).where(
+        EmailBinding.id == binding_id,
+        EmailBinding.user_id == current_user.id
+    ))
+
+    if not email_binding:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email binding not found"
+        )
+
+    account = IMAPAccount.from_binding(email_binding)
+    await db.commit()
+    try:
+        info = await run_imap(account, lambda client: fetch_part_info(client, folder, uid, part))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    if info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found"
+        )
+
+    filename = info["filename"] or f"part-{part}"
+    headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    writer = None
+    if attachment_cache is not None:
+        key = attachment_cache.key(account.email, folder, info["uidvalidity"], uid, part)
+        cached = await asyncio.to_thread(attachment_cache.lookup, key)
+        if cached is not None:
+            return FileResponse(cached, media_type=info["content_type"], headers=headers)
+        writer = await asyncio.to_thread(attachment_cache.writer, key)
+
+    return StreamingResponse(
+        iter_attachment(account, folder, uid, info, writer=writer),
+        media_type=info["content_type"],
+        headers=headers
+    )
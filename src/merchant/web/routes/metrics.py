@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from ..models.user import User
+from ..services.db_maintenance import db_maintenance
+from ..services.email_watcher import email_watcher
+from ..utils.auth import get_current_active_user, password_hasher
+from ..utils.email import imap_executor, imap_pool
+from ..utils.imap_profile import server_profiles
+from ..utils.login_throttle import login_throttle
+from ..utils.user_cache import user_cache
+
+router = APIRouter()
+
+@router.get("")
+async def get_metrics(current_user: User = Depends(get_current_active_user)):
+    """后台线程池和缓存的运行状态"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not enough privileges")
+    return {
+        "password_hasher": password_hasher.stats(),
+        "login_throttle": login_throttle.stats(),
+        "imap_executor": imap_executor.stats(),
+        "imap_pool": imap_pool.stats(),
+        "imap_profiles": server_profiles.stats(),
+        "email_watcher": email_watcher.stats(),
+        "db_maintenance": db_maintenance.stats(),
+        "user_cache": user_cache.stats(),
+    }
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List
 
-from ..models.base import get_db
+from ..models.base import get_session
 from ..models.user import User
 from ..schemas.auth import UserCreate
 from ..schemas.user import UserResponse
-from ..utils.auth import get_current_active_user, get_password_hash
+from ..utils.auth import get_current_active_user, hash_password
 
 router = APIRouter()
 
@@ -15,34 +15,36 @@ async def list_users(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """获取用户列表"""
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough privileges")
-    users = db.query(User).offset(skip).limit(limit).all()
+    users = (await db.scalars(select(User).offset(skip).limit(limit))).all()
     return users
 
 @router.post("/", response_model=UserResponse)
 async def create_user(
     user: UserCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ):
     """创建新用户"""
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough privileges")
     
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    # 排队等待哈希期间不占用连接池中的数据库连接
+    await db.commit()
     new_user = User(
         email=user.email,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await hash_password(user.password),
         full_name=user.full_name
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class CustomerBase(BaseModel):
@@ -19,4 +19,31 @@ class CustomerResponse(CustomerBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
-    model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class CustomerPage(BaseModel):
+    """客户列表的一页"""
+    customers: List[CustomerResponse]
+    next_cursor: Optional[str] = None
+
+class CustomerSearchHit(CustomerResponse):
+    """搜索结果，match 为 prefix（词前缀匹配）或 fuzzy（拼写相近）"""
+    match: str
+
+class CustomerSearchResponse(BaseModel):
+    """按相关度排序的搜索结果，容错匹配的结果排在后面"""
+    results: List[CustomerSearchHit]
+
+class CustomerImportError(BaseModel):
+    """导入失败的一行，row 从 1 开始且不含 CSV 表头"""
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class CustomerImportReport(BaseModel):
+    """批量导入的结果"""
+    processed: int
+    inserted: int
+    failed: int
+    errors: List[CustomerImportError]
+    errors_truncated: bool = False
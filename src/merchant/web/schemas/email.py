@@ -22,6 +22,21 @@ class EmailBindResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class EmailBulkBindRequest(BaseModel):
+    """批量绑定邮箱请求"""
+    accounts: List[EmailBindRequest] = Field(..., min_length=1, max_length=500)
+
+class EmailBulkBindResult(BaseModel):
+    """单个邮箱的批量绑定结果"""
+    email: str
+    success: bool
+    binding: Optional[EmailBindResponse] = None
+    error: Optional[str] = None
+
+class EmailBulkBindResponse(BaseModel):
+    """批量绑定邮箱响应，结果顺序与请求一致"""
+    results: List[EmailBulkBindResult]
+
 class EmailBindingInfo(BaseModel):
     """邮箱绑定信息"""
     id: int
@@ -42,8 +57,50 @@ class EmailMessage(BaseModel):
     from_addr: str
     date: datetime
     has_attachments: bool
+    preview: Optional[str] = None
 
 class EmailInboxResponse(BaseModel):
     """收件箱响应"""
     emails: List[EmailMessage]
-    total: int 
\ No newline at end of file
+    total: int
+    next_cursor: Optional[str] = None
+
+class UnifiedInboxMessage(EmailMessage):
+    """统一收件箱中的邮件"""
+    binding_id: int
+    account: str
+
+class BindingError(BaseModel):
+    """统一收件箱中同步失败的邮箱"""
+    binding_id: int
+    email: str
+    error: str
+
+class UnifiedInboxResponse(BaseModel):
+    """统一收件箱响应"""
+    emails: List[UnifiedInboxMessage]
+    errors: List[BindingError] = []
+
+class EmailSearchResult(UnifiedInboxMessage):
+    """邮件搜索结果，subject_highlight 和 snippet 为已转义的 HTML"""
+    date: Optional[datetime] = None
+    subject_highlight: str
+    snippet: str
+
+class EmailSearchResponse(BaseModel):
+    """邮件搜索响应"""
+    results: List[EmailSearchResult]
+
+class EmailAttachment(BaseModel):
+    """邮件附件信息"""
+    part: str
+    filename: str
+    content_type: str
+    size: int
+
+class EmailDetail(EmailMessage):
+    """邮件详情"""
+    to_addrs: List[str] = []
+    text_body: Optional[str] = None
+    html_body: Optional[str] = None
+    attachments: List[EmailAttachment] = []
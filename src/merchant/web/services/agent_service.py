@@ -1,10 +1,18 @@
 from typing import List, Optional
 from ..models.customer import Customer, CustomerInteraction
+from .customer_history import load_customer_history
+from .customer_linker import customer_index
+from .prospect_dedup import ProspectDeduplicator
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+import logging
 import os
 import asyncio
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class AgentService:
     def __init__(self, db: Session):
         self.db = db
@@ -15,8 +23,9 @@ class AgentService:
         else:
             self.crew = None
 
-    async def prospect_new_customers(self, industry: str, region: str, target_count: int) -> List[dict]:
-        """使用 Agent 来寻找新的潜在客户"""
+    async def prospect_new_customers(self, industry: str, region: str, target_count: int) -> List[Customer]:
+        """使用 Agent 来寻找新的潜在客户，和已有客户重复的只补充空字段，不再新建"""
+        dedup = ProspectDeduplicator(self.db)
         if os.getenv("TESTING"):
             # 测试模式下返回模拟数据
             prospects = [
@@ -28,24 +37,46 @@ class AgentService:
                 }
             ]
         else:
-            prospects = await self.crew.find_prospects(industry, region, target_count)
-        
-        # 将潜在客户保存到数据库
-        new_customers = []
-        for prospect in prospects:
-            customer = Customer(
-                email=prospect["email"],
-                full_name=prospect["name"],
-                company=prospect["company"],
-                position=prospect["position"],
-                status="prospect",
-                notes=f"Auto-generated by Agent. Industry: {industry}, Region: {region}",
-                created_at=datetime.now()
+            # 已经有的公司不用再让 Agent 研究
+            prospects = await self.crew.find_prospects(
+                industry, region, target_count, exclude_companies=dedup.known_companies(industry, region)
             )
-            self.db.add(customer)
-            new_customers.append(customer)
-        
+
+        notes = f"Auto-generated by Agent. Industry: {industry}, Region: {region}"
+        try:
+            new_customers = self._save_prospects(dedup, prospects, notes)
+        except IntegrityError:
+            # 其他请求同时创建了相同邮箱的客户，重新去重后再试一次，Agent 的结果不会丢失
+            self.db.rollback()
+            new_customers = self._save_prospects(dedup, prospects, notes)
+        if new_customers:
+            customer_index.invalidate()
+        return new_customers
+
+    def _save_prospects(self, dedup: ProspectDeduplicator, prospects: List[dict], notes: str) -> List[Customer]:
+        """去重后一次写入新的潜在客户"""
+        fresh, duplicates = dedup.split(prospects)
+        merged = dedup.merge(duplicates)
+        new_customers = []
+        if fresh:
+            new_customers = list(self.db.scalars(
+                insert(Customer).returning(Customer, sort_by_parameter_order=True),
+                [
+                    {
+                        "email": prospect["email"],
+                        "full_name": prospect.get("name"),
+                        "company": prospect.get("company"),
+                        "position": prospect.get("position"),
+                        "status": "prospect",
+                        "notes": notes,
+                        "created_at": datetime.now(),
+                    }
+                    for prospect in fresh
+                ]
+            ))
         self.db.commit()
+        if duplicates:
+            logger.info("Skipped %d duplicate prospects, merged %d into existing customers", len(duplicates), merged)
         return new_customers
 
     async def engage_customer(self, customer_id: int) -> dict:
@@ -63,10 +94,12 @@ class AgentService:
             }
         else:
             # 使用 Agent 生成互动内容
+            history = self._get_customer_history(customer_id)
             interaction = await self.crew.generate_engagement(
                 customer_name=customer.full_name,
                 company=customer.company,
-                history=self._get_customer_history(customer_id)
+                history=history["recent"],
+                summary=history["summary"]
             )
 
         # 记录互动
@@ -85,18 +118,6 @@ class AgentService:
             "status": "success"
         }
 
-    def _get_customer_history(self, customer_id: int) -> List[dict]:
-        """获取客户历史互动记录"""
-        interactions = self.db.query(CustomerInteraction)\
-            .filter(CustomerInteraction.customer_id == customer_id)\
-            .order_by(CustomerInteraction.created_at.desc())\
-            .all()
-        
-        return [
-            {
-                "type": i.interaction_type,
-                "content": i.content,
-                "created_at": i.created_at.isoformat()
-            }
-            for i in interactions
-        ] 
\ No newline at end of file
+    def _get_customer_history(self, customer_id: int) -> dict:
+        """获取客户历史互动记录：较早记录的滚动摘要和最近的若干条记录"""
+        return load_customer_history(self.db, customer_id)
@@ -0,0 +1,214 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import AsyncIterator, Iterable, Iterator, List, Sequence
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Select, select
+
+from ..models.customer import Customer, CustomerInteraction
+
+# 每次从数据库游标读取并编码的行数，决定了导出时占用的内存
+EXPORT_BATCH_SIZE = int(os.getenv("CUSTOMER_EXPORT_BATCH_SIZE", "2000"))
+
+CUSTOMER_COLUMNS = (
+    Customer.id, Customer.email, Customer.full_name, Customer.company, Customer.position, Customer.phone,
+    Customer.status, Customer.notes, Customer.last_contact, Customer.created_by, Customer.created_at,
+    Customer.updated_at,
+)
+INTERACTION_COLUMNS = (
+    CustomerInteraction.id, CustomerInteraction.customer_id, CustomerInteraction.user_id,
+    CustomerInteraction.interaction_type, CustomerInteraction.content, CustomerInteraction.created_at,
+)
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+# Excel 等表格软件把以这些字符开头的单元格解析为公式
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportUnavailable(Exception):
+    """导出格式需要的可选依赖没有安装"""
+
+
+def customer_export_query() -> Select:
+    """按 id 顺序导出客户，只选列，不构造 ORM 对象"""
+    return select(*CUSTOMER_COLUMNS).order_by(Customer.id)
+
+
+def interaction_export_query(customer_id: int) -> Select:
+    return (
+        select(*INTERACTION_COLUMNS)
+        .where(CustomerInteraction.customer_id == customer_id)
+        .order_by(CustomerInteraction.created_at, CustomerInteraction.id)
+    )
+
+
+def iter_batches(engine, stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence]:
+    """用流式游标分批读取结果，同一时间只在内存中保留一批行
+
+    使用单独的连接：StreamingResponse 发送内容时请求的会话已经关闭。
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        for batch in result.partitions():
+            yield batch
+
+
+async def iter_batches_async(async_engine, stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence]:
+    """iter_batches 的异步版本，用于 ASYNC_DATABASE 模式"""
+    async with async_engine.connect() as connection:
+        result = await connection.stream(stmt.execution_options(yield_per=batch_size))
+        async for batch in result.partitions():
+            yield batch
+
+
+class RowEncoder(ABC):
+    """把一批行编码成输出格式的字节，columns 为查询选出的列"""
+
+    def __init__(self, columns: Sequence):
+        self.columns = list(columns)
+        self.names = [column.name for column in self.columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    @abstractmethod
+    def encode(self, rows: Sequence) -> bytes:
+        """编码一批行"""
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class CSVEncoder(RowEncoder):
+    def header(self) -> bytes:
+        # 带 BOM，Excel 才能正确识别 UTF-8
+        return ("\ufeff" + ",".join(self.names) + "\r\n").encode()
+
+    def encode(self, rows: Sequence) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+
+
+class NDJSONEncoder(RowEncoder):
+    def encode(self, rows: Sequence) -> bytes:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_json_default).encode
+        names = self.names
+        return "".join(encoder(dict(zip(names, row))) + "\n" for row in rows).encode()
+
+
+class ParquetEncoder(RowEncoder):
+    """每批写成一个 row group，写完立即把缓冲区的内容交给响应
+
+    Arrow schema 按列的 SQL 类型一次确定，不从数据推断：第一批中全为空的列
+    会被推断成 null 类型，之后的批次就写不进去了。
+    """
+
+    def __init__(self, columns: Sequence):
+        super().__init__(columns)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportUnavailable("Parquet export requires pyarrow")
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(column.name, _arrow_type(pyarrow, column.type)) for column in self.columns])
+        self._sink = _DrainingBuffer()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self._schema)
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: Sequence) -> bytes:
+        if not rows:
+            return b""
+        arrays = [
+            self._pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self._schema)
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        # 没有行时也要写出 schema 和文件尾，得到合法的空 Parquet 文件
+        self._writer.close()
+        return self._sink.drain()
+
+
+def _arrow_type(pa, sql_type):
+    """SQL 列类型对应的 Arrow 类型；SQLite 返回的时间不带时区"""
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+class _DrainingBuffer(io.RawIOBase):
+    """只保留还没发送的字节的可写文件对象"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+ENCODERS = {"csv": CSVEncoder, "ndjson": NDJSONEncoder, "parquet": ParquetEncoder}
+
+
+def encode_stream(encoder: RowEncoder, batches: Iterable[Sequence]) -> Iterator[bytes]:
+    yield encoder.header()
+    for batch in batches:
+        yield encoder.encode(batch)
+    yield encoder.footer()
+
+
+async def encode_stream_async(encoder: RowEncoder, batches: AsyncIterator[Sequence]) -> AsyncIterator[bytes]:
+    yield encoder.header()
+    async for batch in batches:
+        yield encoder.encode(batch)
+    yield encoder.footer()
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # 以公式字符开头的文本在 Excel 中会被当作公式执行，加 ' 前缀按文本显示
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,188 @@
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+
+from sqlalchemy import String, select, tuple_, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.customer import CustomerHistorySummary, CustomerInteraction
+from ..models.email_search import CJK_RE
+
+# 提示词中最多放这么多条最近的互动记录
+HISTORY_WINDOW = int(os.getenv("AGENT_HISTORY_WINDOW", "20"))
+# 最近互动记录占用的 token 上限（估算值）
+HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "1500"))
+# 摘要中保留的较早互动要点数
+SUMMARY_HIGHLIGHTS = int(os.getenv("AGENT_HISTORY_SUMMARY_HIGHLIGHTS", "5"))
+HIGHLIGHT_LENGTH = 120
+# 并入摘要时每次读取的记录数
+FOLD_BATCH_SIZE = 500
+# 每条记录的时间和类型等固定开销
+ITEM_OVERHEAD_TOKENS = 12
+
+# 和客户分页一样按数据库中的原始文本比较 created_at
+_created_at = type_coerce(CustomerInteraction.created_at, String)
+_position = tuple_(_created_at, CustomerInteraction.id)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算 token 数：中日韩文字每字一个，其他文字每四个字符一个"""
+    if not text:
+        return 0
+    cjk = sum(len(run) for run in CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """截断到估算不超过 budget 个 token，截断时以省略号结尾"""
+    if estimate_tokens(text) <= budget:
+        return text
+    keep = len(text) * budget // max(estimate_tokens(text), 1)
+    while keep > 0 and estimate_tokens(text[:keep]) + 1 > budget:
+        keep = keep * 9 // 10
+    return text[:keep] + "…"
+
+
+def load_recent_interactions(
+    db: Session,
+    customer_id: int,
+    window: int = HISTORY_WINDOW,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+    """按时间倒序读取最近的互动记录，条数不超过 window，内容不超过 token_budget
+
+    只放得下一条时截断它的内容。
+
+    Returns:
+        Tuple[List[Dict], Optional[Tuple[str, int]]]: 最近的互动记录，以及其中最早一条的
+        (created_at, id)，更早的记录应该并入摘要
+    """
+    rows = db.execute(
+        select(
+            CustomerInteraction.id,
+            CustomerInteraction.interaction_type,
+            CustomerInteraction.content,
+            CustomerInteraction.created_at,
+            _created_at.label("position"),
+        )
+        .where(CustomerInteraction.customer_id == customer_id)
+        .order_by(CustomerInteraction.created_at.desc(), CustomerInteraction.id.desc())
+        .limit(window)
+    ).all()
+
+    items = []
+    boundary = None
+    remaining = token_budget
+    for row in rows:
+        content = row.content or ""
+        cost = estimate_tokens(content) + ITEM_OVERHEAD_TOKENS
+        if cost > remaining:
+            if items:
+                break
+            content = truncate_to_tokens(content, max(remaining - ITEM_OVERHEAD_TOKENS, 0))
+            cost = remaining
+        remaining -= cost
+        items.append({
+            "type": row.interaction_type,
+            "content": content,
+            "created_at": row.created_at.isoformat() if row.created_at else "",
+        })
+        boundary = (row.position, row.id)
+    return items, boundary
+
+
+def fold_summary(state: Dict, rows) -> Dict:
+    """把按时间顺序排列的一批互动记录并入摘要"""
+    types = state.setdefault("types", {})
+    highlights = state.setdefault("highlights", [])
+    for row in rows:
+        at = row.created_at.isoformat() if row.created_at else ""
+        state["count"] = state.get("count", 0) + 1
+        state.setdefault("first_at", at)
+        state["last_at"] = at
+        types[row.interaction_type or "other"] = types.get(row.interaction_type or "other", 0) + 1
+        text = " ".join((row.content or "").split())
+        if text:
+            highlights.append({"at": at, "type": row.interaction_type, "text": text[:HIGHLIGHT_LENGTH]})
+    del highlights[:-SUMMARY_HIGHLIGHTS]
+    return state
+
+
+def render_summary(state: Dict) -> Optional[str]:
+    """把摘要转成放进提示词的文字，没有较早的记录时返回 None"""
+    if not state.get("count"):
+        return None
+    types = "、".join(f"{name} {count} 次" for name, count in sorted(state["types"].items(), key=lambda item: -item[1]))
+    lines = [f"较早的 {state['count']} 条互动（{state['first_at'][:10]} 至 {state['last_at'][:10]}）：{types}"]
+    for highlight in state["highlights"]:
+        lines.append(f"- {highlight['at'][:10]} {highlight['type']}：{highlight['text']}")
+    return "\n".join(lines)
+
+
+def update_summary(db: Session, customer_id: int, boundary: Optional[Tuple[str, int]]) -> Dict:
+    """把 boundary 之前、还没有并入摘要的互动记录并入摘要并保存
+
+    摘要记录已经处理到哪一条，平时每次只读取新移出窗口的几条记录。
+    created_at 早于已处理位置的补录记录不会再并入摘要。
+    """
+    summary = db.get(CustomerHistorySummary, customer_id)
+    state = json.loads(summary.state) if summary else {}
+    if boundary is None:
+        return state
+    position = (summary.through_created_at, summary.through_id) if summary and summary.through_id else None
+
+    folded = False
+    while True:
+        stmt = (
+            select(
+                CustomerInteraction.id,
+                CustomerInteraction.interaction_type,
+                CustomerInteraction.content,
+                CustomerInteraction.created_at,
+                _created_at.label("position"),
+            )
+            .where(CustomerInteraction.customer_id == customer_id)
+            .where(_position < tuple_(*boundary))
+            .order_by(CustomerInteraction.created_at, CustomerInteraction.id)
+            .limit(FOLD_BATCH_SIZE)
+        )
+        if position is not None:
+            stmt = stmt.where(_position > tuple_(*position))
+        rows = db.execute(stmt).all()
+        if not rows:
+            break
+        fold_summary(state, rows)
+        position = (rows[-1].position, rows[-1].id)
+        folded = True
+        if len(rows) < FOLD_BATCH_SIZE:
+            break
+
+    if folded:
+        if summary is None:
+            summary = CustomerHistorySummary(customer_id=customer_id)
+            db.add(summary)
+        summary.state = json.dumps(state, ensure_ascii=False)
+        summary.through_created_at, summary.through_id = position
+        try:
+            db.commit()
+        except IntegrityError:
+            # 并发的请求已经为这个客户建立了摘要，这次的结果不保存
+            db.rollback()
+    return state
+
+
+def load_customer_history(
+    db: Session,
+    customer_id: int,
+    window: int = HISTORY_WINDOW,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> Dict:
+    """生成互动内容时使用的客户历史：较早记录的摘要和最近的若干条记录
+
+    Returns:
+        Dict: summary 为摘要文字（没有较早记录时为 None），recent 为按时间倒序的最近记录
+    """
+    recent, boundary = load_recent_interactions(db, customer_id, window, token_budget)
+    state = update_summary(db, customer_id, boundary)
+    return {"summary": render_summary(state), "recent": recent}
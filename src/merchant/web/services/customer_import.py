@@ -0,0 +1,197 @@
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import codecs
+import csv
+import json
+import logging
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.customer import Customer
+from ..schemas.customer import CustomerCreate
+
+logger = logging.getLogger(__name__)
+
+# 每批校验和写入的行数
+IMPORT_CHUNK_SIZE = int(os.getenv("CUSTOMER_IMPORT_CHUNK_SIZE", "1000"))
+# 响应中最多列出的错误行数，超过的只计数
+IMPORT_MAX_ERRORS = int(os.getenv("CUSTOMER_IMPORT_MAX_ERRORS", "1000"))
+
+# 请求的 Content-Type 对应的格式
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+# 新导入的客户的状态，和逐个创建时一致
+DEFAULT_STATUS = "potential"
+
+
+def detect_format(content_type: str) -> Optional[str]:
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """把请求体的字节流切成行（保留换行符），兼容 UTF-8 BOM"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        # 最后一段可能不完整，留到下一块
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """把行合并成完整的 CSV 记录，引号内的换行不算记录结束"""
+    record = ""
+    async for line in lines:
+        record += line
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ""
+    if record:
+        yield record
+
+
+class CustomerImporter:
+    """从 CSV 或 NDJSON 流中批量导入客户
+
+    逐行解析，按 chunk_size 分批：用 CustomerCreate 校验，一次查询找出已存在的
+    邮箱，其余的用一条 executemany 插入并提交。整个文件不会读入内存，响应
+    中按行号列出失败的行。
+    """
+
+    def __init__(self, user_id: int, chunk_size: int = IMPORT_CHUNK_SIZE, max_errors: int = IMPORT_MAX_ERRORS):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.processed = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors: List[Dict] = []
+
+    async def run(self, db, stream: AsyncIterator[bytes], fmt: str) -> Dict:
+        """导入整个流，db 为 get_session 提供的会话，每批单独提交"""
+        chunk: List[Tuple[int, Dict]] = []
+        async for row, record in self._iter_rows(stream, fmt):
+            if record is None:
+                continue
+            chunk.append((row, record))
+            if len(chunk) >= self.chunk_size:
+                await db.run_sync(self.import_chunk, chunk)
+                chunk = []
+        if chunk:
+            await db.run_sync(self.import_chunk, chunk)
+        return self.report()
+
+    def report(self) -> Dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "failed": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+    def import_chunk(self, db: Session, chunk: List[Tuple[int, Dict]]) -> int:
+        """校验并写入一批记录，返回写入的条数；邮箱不区分大小写去重"""
+        valid: Dict[str, Tuple[int, Dict]] = {}
+        for row, record in chunk:
+            self.processed += 1
+            try:
+                customer = CustomerCreate.model_validate(record)
+            except ValidationError as e:
+                self._error(row, record.get("email"), _describe(e))
+                continue
+            key = customer.email.lower()
+            if key in valid:
+                self._error(row, customer.email, f"Duplicate of row {valid[key][0]}")
+                continue
+            valid[key] = (row, {
+                **customer.model_dump(), "status": DEFAULT_STATUS, "created_by": self.user_id,
+            })
+        if not valid:
+            return 0
+        try:
+            existing = self._insert(db, valid)
+        except IntegrityError:
+            # 其他请求同时创建了相同邮箱的客户，重新排除已存在的邮箱后再试一次
+            db.rollback()
+            existing = self._insert(db, valid)
+        # 只按最终成功的那次记录已存在的邮箱，重试不会重复计错
+        for key, (row, values) in valid.items():
+            if key in existing:
+                self._error(row, values["email"], "Email already registered")
+        inserted = len(valid) - len(existing)
+        self.inserted += inserted
+        return inserted
+
+    def _insert(self, db: Session, valid: Dict[str, Tuple[int, Dict]]) -> Set[str]:
+        """插入尚不存在的客户并提交，返回已存在的邮箱（小写）"""
+        existing = set(db.scalars(select(func.lower(Customer.email)).where(func.lower(Customer.email).in_(list(valid)))))
+        values = [values for key, (_, values) in valid.items() if key not in existing]
+        if values:
+            db.execute(insert(Customer), values)
+        db.commit()
+        return existing
+
+    async def _iter_rows(self, stream: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict]]]:
+        """逐条产出 (行号, 字段)，无法解析的行记为错误并产出 None；行号不含 CSV 表头"""
+        lines = iter_lines(stream)
+        if fmt == "ndjson":
+            row = 0
+            async for line in lines:
+                if not line.strip():
+                    continue
+                row += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = None
+                    self.processed += 1
+                    self._error(row, None, f"Invalid JSON: {e}")
+                else:
+                    if not isinstance(record, dict):
+                        record = None
+                        self.processed += 1
+                        self._error(row, None, "Expected a JSON object")
+                yield row, record
+            return
+
+        header: Optional[List[str]] = None
+        row = 0
+        async for text in iter_csv_records(lines):
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]), [])
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if len(values) != len(header):
+                self.processed += 1
+                self._error(row, None, f"Expected {len(header)} columns, got {len(values)}")
+                yield row, None
+                continue
+            # 空字段按未填写处理，让可选字段保持为空
+            yield row, {name: value for name, value in zip(header, values) if value != ""}
+
+    def _error(self, row: int, email: Optional[str], message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "email": email, "error": message})
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
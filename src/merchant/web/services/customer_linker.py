@@ -0,0 +1,200 @@
+from datetime import datetime
+from email.utils import getaddresses
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.customer import Customer, CustomerEmailLink, CustomerInteraction
+from ..models.email import EmailBinding, EmailMessage
+
+logger = logging.getLogger(__name__)
+
+# 客户地址索引的有效期（秒），新建客户时会主动失效
+INDEX_TTL = float(os.getenv("CUSTOMER_INDEX_TTL", "300"))
+
+# 公共邮箱的域名不代表某家公司，不按域名匹配
+FREE_MAIL_DOMAINS = frozenset(
+    domain.strip().lower()
+    for domain in os.getenv(
+        "CUSTOMER_FREE_MAIL_DOMAINS",
+        "gmail.com,googlemail.com,outlook.com,hotmail.com,live.com,yahoo.com,icloud.com,me.com,"
+        "qq.com,foxmail.com,163.com,126.com,yeah.net,sina.com,sohu.com,aliyun.com,139.com",
+    ).split(",")
+    if domain.strip()
+)
+
+
+def normalize_addresses(*fields: Optional[str]) -> List[str]:
+    """从 From/To 字段中提取小写的邮件地址，去掉显示名"""
+    values = []
+    for field in fields:
+        if field:
+            values.extend(field.split("\n"))
+    addresses = []
+    for _, address in getaddresses(values):
+        address = address.strip().lower()
+        if "@" in address and address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+def address_domain(address: str) -> str:
+    return address.rsplit("@", 1)[1]
+
+
+class CustomerAddressIndex:
+    """客户邮件地址和公司域名的内存索引，按客户的创建者分开
+
+    每次同步都要按地址匹配一批邮件，客户表不大，整表读入内存比逐个地址
+    查询便宜。索引过期或新建客户后在下一次查询时重建。邮件只和绑定所属
+    用户自己的客户匹配，不会写到其他用户的客户上。
+    """
+
+    def __init__(self, ttl: float = INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_owner: Dict[int, Tuple[Dict[str, int], Dict[str, List[int]]]] = {}
+        self._expires_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires_at = 0.0
+
+    def match(self, db: Session, owner_id: int, addresses: Iterable[str]) -> Dict[str, List[int]]:
+        """返回每个地址对应的 owner_id 名下的客户，地址完全匹配优先，否则按公司域名匹配"""
+        by_address, by_domain = self._load(db).get(owner_id, ({}, {}))
+        matches = {}
+        for address in addresses:
+            if address in by_address:
+                matches[address] = [by_address[address]]
+            elif address_domain(address) in by_domain:
+                matches[address] = by_domain[address_domain(address)]
+        return matches
+
+    def _load(self, db: Session) -> Dict[int, Tuple[Dict[str, int], Dict[str, List[int]]]]:
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._by_owner
+            by_owner: Dict[int, Tuple[Dict[str, int], Dict[str, List[int]]]] = {}
+            rows = db.execute(
+                select(Customer.created_by, Customer.id, Customer.email).where(
+                    Customer.email.isnot(None), Customer.created_by.isnot(None)
+                )
+            )
+            for owner_id, customer_id, email in rows:
+                address = email.strip().lower()
+                if "@" not in address:
+                    continue
+                by_address, by_domain = by_owner.setdefault(owner_id, ({}, {}))
+                by_address[address] = customer_id
+                domain = address_domain(address)
+                if domain not in FREE_MAIL_DOMAINS:
+                    by_domain.setdefault(domain, []).append(customer_id)
+            self._by_owner = by_owner
+            self._expires_at = time.monotonic() + self.ttl
+            return by_owner
+
+
+customer_index = CustomerAddressIndex()
+
+
+class CustomerLinker:
+    """把同步到的邮件记录为匹配客户的邮件互动"""
+
+    def __init__(self, db: Session, index: CustomerAddressIndex = customer_index):
+        self.db = db
+        self.index = index
+
+    def link(self, binding_id: int, messages: List[EmailMessage]) -> int:
+        """为一批邮件批量写入客户互动，同一封邮件（Message-ID）对每个客户只记录一次，返回写入的条数
+
+        只关联绑定所属用户创建的客户。没有 Message-ID 的邮件无法去重，不做关联。
+        """
+        messages = [message for message in messages if message.message_id]
+        if not messages:
+            return 0
+        binding = self.db.get(EmailBinding, binding_id)
+        if binding is None:
+            return 0
+        own_address = (binding.email or "").lower()
+
+        parsed = []
+        addresses: Set[str] = set()
+        for message in messages:
+            senders = normalize_addresses(message.from_addr)
+            recipients = normalize_addresses(message.to_addrs)
+            parsed.append((message, senders, recipients))
+            addresses.update(senders)
+            addresses.update(recipients)
+        addresses.discard(own_address)
+        matches = self.index.match(self.db, binding.user_id, addresses)
+        if not matches:
+            return 0
+
+        candidates: Dict[Tuple[int, str], Dict] = {}
+        for message, senders, recipients in parsed:
+            for address in senders + recipients:
+                inbound = address in senders
+                for customer_id in matches.get(address, []):
+                    key = (customer_id, message.message_id)
+                    if key not in candidates:
+                        candidates[key] = _interaction(customer_id, binding.user_id, message, inbound)
+
+        try:
+            return self._insert(candidates)
+        except IntegrityError:
+            # 另一个同步任务同时写入了相同的邮件，去掉已有的记录后重试一次
+            self.db.rollback()
+            return self._insert(candidates)
+
+    def link_cached(self, binding_id: int, batch_size: int = 500) -> int:
+        """关联绑定下所有已缓存的邮件，用于新建客户或首次启用关联后补齐历史记录"""
+        linked = 0
+        last_id = 0
+        while True:
+            messages = self.db.query(EmailMessage).filter(
+                EmailMessage.binding_id == binding_id,
+                EmailMessage.id > last_id
+            ).order_by(EmailMessage.id).limit(batch_size).all()
+            if not messages:
+                return linked
+            last_id = messages[-1].id
+            linked += self.link(binding_id, messages)
+
+    def _insert(self, candidates: Dict[Tuple[int, str], Dict]) -> int:
+        existing = set(self.db.execute(
+            select(CustomerEmailLink.customer_id, CustomerEmailLink.message_id).where(
+                CustomerEmailLink.message_id.in_({message_id for _, message_id in candidates})
+            )
+        ).all())
+        keys = [key for key in candidates if key not in existing]
+        if not keys:
+            return 0
+        interaction_ids = self.db.scalars(
+            insert(CustomerInteraction).returning(CustomerInteraction.id, sort_by_parameter_order=True),
+            [candidates[key] for key in keys],
+        ).all()
+        self.db.execute(insert(CustomerEmailLink), [
+            {"customer_id": customer_id, "message_id": message_id, "interaction_id": interaction_id}
+            for (customer_id, message_id), interaction_id in zip(keys, interaction_ids)
+        ])
+        self.db.commit()
+        return len(keys)
+
+
+def _interaction(customer_id: int, user_id: int, message: EmailMessage, inbound: bool) -> Dict:
+    direction = "收到邮件" if inbound else "发出邮件"
+    return {
+        "customer_id": customer_id,
+        "user_id": user_id,
+        "interaction_type": "email",
+        "content": f"{direction}：{message.subject or '(无主题)'}",
+        # 时间线按邮件日期排列，而不是同步的时间
+        "created_at": message.date or datetime.utcnow(),
+    }
@@ -0,0 +1,76 @@
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, String, select, tuple_, type_coerce
+
+from ..models.customer import Customer
+from ..utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# created_at 按数据库中保存的原始字符串比较和编码，服务端默认值没有微秒，
+# 转成 datetime 再比较会和保存的值对不上
+_created_at = type_coerce(Customer.created_at, String)
+
+
+def filter_customers(
+    stmt: Select,
+    created_by: Optional[int] = None,
+    status: Optional[str] = None,
+    company: Optional[str] = None,
+    last_contact_from: Optional[datetime] = None,
+    last_contact_to: Optional[datetime] = None,
+) -> Select:
+    """给客户查询加上列表和导出共用的筛选条件"""
+    if created_by is not None:
+        stmt = stmt.where(Customer.created_by == created_by)
+    if status is not None:
+        stmt = stmt.where(Customer.status == status)
+    if company is not None:
+        stmt = stmt.where(Customer.company == company)
+    if last_contact_from is not None:
+        stmt = stmt.where(Customer.last_contact >= last_contact_from)
+    if last_contact_to is not None:
+        stmt = stmt.where(Customer.last_contact < last_contact_to)
+    return stmt
+
+
+def build_customer_page_query(
+    limit: int,
+    cursor: Optional[str] = None,
+    created_by: Optional[int] = None,
+    status: Optional[str] = None,
+    company: Optional[str] = None,
+    last_contact_from: Optional[datetime] = None,
+    last_contact_to: Optional[datetime] = None,
+) -> Select:
+    """按创建时间倒序分页查询客户，多取一行用来判断是否还有下一页
+
+    用 (created_at, id) 做 keyset 分页，翻到多深都只扫描一页的索引，
+    翻页期间新插入的客户也不会让后面的页重复或漏掉。
+
+    Raises:
+        InvalidCursor: cursor 格式不正确
+    """
+    stmt = filter_customers(
+        select(Customer, _created_at.label("created_key")),
+        created_by=created_by,
+        status=status,
+        company=company,
+        last_contact_from=last_contact_from,
+        last_contact_to=last_contact_to,
+    )
+    if cursor is not None:
+        created_key, customer_id = decode_cursor(cursor, 2)
+        if not isinstance(created_key, str) or not isinstance(customer_id, int):
+            raise InvalidCursor(cursor)
+        stmt = stmt.where(tuple_(_created_at, Customer.id) < tuple_(created_key, customer_id))
+    return stmt.order_by(_created_at.desc(), Customer.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: Sequence, limit: int) -> Tuple[List[Customer], Optional[str]]:
+    """从 build_customer_page_query 的结果中取出一页客户和下一页的游标"""
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last.created_key, last.Customer.id)
+    return [row.Customer for row in page], next_cursor
@@ -0,0 +1,120 @@
+from difflib import SequenceMatcher
+from typing import List, Optional, Set, Tuple
+import os
+
+from sqlalchemy import column, literal_column, select, table, text
+from sqlalchemy.orm import Session
+
+from ..models.customer import Customer
+from ..models.customer_search import FTS_TABLE, TERMS_TABLE, TERMS_TRIGRAM_TABLE, is_search_term
+from .email_search import build_match_query, count_candidates, match_phrase, query_pieces
+
+_fts = table(FTS_TABLE, column("rowid"))
+_terms = table(TERMS_TABLE, column("term"))
+
+# 匹配的客户不超过这个数量时按 bm25 相关度排序，否则返回最新的客户
+RANK_LIMIT = int(os.getenv("CUSTOMER_SEARCH_RANK_LIMIT", "5000"))
+# 每个查询词从词表中取这么多个共有三字组最多的词，再按编辑相似度筛选
+TERM_CANDIDATES = int(os.getenv("CUSTOMER_SEARCH_TERM_CANDIDATES", "50"))
+# 每个查询词最多替换成这么多个拼写相近的词
+MAX_CORRECTIONS = int(os.getenv("CUSTOMER_SEARCH_MAX_CORRECTIONS", "5"))
+# 词和查询词的相似度（difflib ratio）不低于这个值才算拼写相近
+FUZZY_THRESHOLD = float(os.getenv("CUSTOMER_SEARCH_FUZZY_THRESHOLD", "0.75"))
+
+
+def _owned(stmt, owner_id: Optional[int]):
+    return stmt if owner_id is None else stmt.where(Customer.created_by == owner_id)
+
+
+def _ranked_matches(db: Session, match: str, owner_id: Optional[int], limit: int) -> List[Customer]:
+    """执行 FTS5 查询，匹配数不多时按相关度排序，否则按 id 倒序"""
+    stmt = _owned(
+        select(Customer)
+        .select_from(_fts)
+        .join(Customer, Customer.id == _fts.c.rowid)
+        .where(text(f"{FTS_TABLE} MATCH :match")),
+        owner_id
+    )
+    # 只数这个用户的客户，其他用户的匹配不影响排序方式
+    candidates = count_candidates(db, stmt, _fts.c.rowid, {"match": match}, RANK_LIMIT)
+    if not candidates:
+        return []
+    if candidates <= RANK_LIMIT:
+        stmt = stmt.order_by(literal_column(f"{FTS_TABLE}.rank"))
+    else:
+        # 全文索引可以直接按 rowid 倒序输出，找到一页结果就停止
+        stmt = stmt.order_by(_fts.c.rowid.desc())
+    return list(db.scalars(stmt.limit(limit), {"match": match}))
+
+
+def similar_terms(db: Session, word: str) -> List[str]:
+    """在词表中找和 word 拼写相近的词，按相似度从高到低排列"""
+    grams = {word[i:i + 3] for i in range(len(word) - 2)}
+    if not grams:
+        return []
+    rows = db.execute(
+        text(
+            f"SELECT term FROM {TERMS_TRIGRAM_TABLE} WHERE {TERMS_TRIGRAM_TABLE} MATCH :match "
+            f"ORDER BY rank LIMIT :limit"
+        ),
+        {"match": " OR ".join(f'"{gram}"' for gram in sorted(grams)), "limit": TERM_CANDIDATES}
+    ).scalars()
+    scored = []
+    for term in rows:
+        ratio = SequenceMatcher(None, word, term).ratio()
+        if term != word and ratio >= FUZZY_THRESHOLD:
+            scored.append((ratio, term))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [term for _, term in scored[:MAX_CORRECTIONS]]
+
+
+def build_fuzzy_query(db: Session, query: str, require_correction: bool = True, prefix: bool = True) -> str:
+    """把每个查询词换成“原词（prefix 为真时按前缀）或任一拼写相近的词”
+
+    词表中已有的词认为拼写正确，不再查找相近的词。require_correction 为真时，
+    没有任何词可以替换则返回空字符串。
+    """
+    pieces = query_pieces(query)
+    words = {piece.lower() for piece in pieces if is_search_term(piece)}
+    known = set(db.scalars(select(_terms.c.term).where(_terms.c.term.in_(words)))) if words else set()
+    groups = []
+    corrected = False
+    for piece in pieces:
+        alternatives = [match_phrase(piece, prefix)]
+        if is_search_term(piece) and piece.lower() not in known:
+            corrections = similar_terms(db, piece.lower())
+            alternatives.extend(f'"{term}"' for term in corrections)
+            corrected = corrected or bool(corrections)
+        groups.append(alternatives[0] if len(alternatives) == 1 else "(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(groups) if corrected or not require_correction else ""
+
+
+def search_customers(
+    db: Session,
+    query: str,
+    owner_id: Optional[int] = None,
+    limit: int = 20,
+) -> List[Tuple[Customer, str]]:
+    """在姓名、公司、职位和备注中搜索客户
+
+    先按词前缀全文匹配并按相关度排序；结果不足 limit 个时，把查询词换成词表
+    中拼写相近的词再查一次，结果补在后面。
+
+    Args:
+        owner_id: 只搜索这个用户创建的客户，None 表示不限
+
+    Returns:
+        List[Tuple[Customer, str]]: 客户和匹配方式（"prefix" 或 "fuzzy"）
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    results = [(customer, "prefix") for customer in _ranked_matches(db, match, owner_id, limit)]
+    if len(results) < limit:
+        fuzzy = build_fuzzy_query(db, query)
+        if fuzzy:
+            found: Set[int] = {customer.id for customer, _ in results}
+            for customer in _ranked_matches(db, fuzzy, owner_id, limit + len(found)):
+                if customer.id not in found and len(results) < limit:
+                    results.append((customer, "fuzzy"))
+    return results
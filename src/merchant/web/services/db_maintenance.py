@@ -0,0 +1,92 @@
+from typing import Dict, Optional
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from ..models.base import engine as default_engine, is_sqlite_file
+
+logger = logging.getLogger(__name__)
+
+# 执行 PRAGMA optimize 和 WAL 检查点的间隔（秒），0 表示不定期执行
+MAINTENANCE_INTERVAL = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "3600"))
+
+
+class DatabaseMaintenance:
+    """定期整理 SQLite 数据库
+
+    PRAGMA optimize 按查询情况更新统计信息；wal_checkpoint(TRUNCATE) 把 WAL
+    写回数据库文件并截断。一直有读连接时自动检查点无法完成，WAL 文件会
+    持续增长，所以在后台线程中定期执行一次。
+    """
+
+    def __init__(self, engine=default_engine, interval: float = MAINTENANCE_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._failures = 0
+        self._last_run_ms = 0.0
+        self._last_checkpoint: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and is_sqlite_file(str(self.engine.url))
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        # 关闭前再更新一次统计信息，SQLite 建议在连接关闭前执行
+        self.run_once()
+
+    def run_once(self) -> Dict[str, int]:
+        """执行一次 optimize 和检查点，返回检查点结果"""
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("PRAGMA optimize"))
+                busy, log_pages, checkpointed = connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+                connection.commit()
+        except Exception:
+            logger.exception("SQLite maintenance failed")
+            with self._lock:
+                self._failures += 1
+            return {}
+        checkpoint = {"busy": busy, "log_pages": log_pages, "checkpointed_pages": checkpointed}
+        with self._lock:
+            self._runs += 1
+            self._last_run_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._last_checkpoint = checkpoint
+        logger.debug("SQLite maintenance: %s", checkpoint)
+        return checkpoint
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "runs": self._runs,
+                "failures": self._failures,
+                "last_run_ms": self._last_run_ms,
+                "last_checkpoint": dict(self._last_checkpoint),
+            }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+db_maintenance = DatabaseMaintenance()
@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models.email import EmailBinding
+from ..utils.email import imap_executor, imap_pool, verify_imap_login
+from ..utils.imap_pool import IMAPAccount, close_client
+
+# 批量绑定时同时验证的邮箱数，同一服务器的并发数另受 IMAP_PER_HOST_CONCURRENCY 限制
+BULK_BIND_CONCURRENCY = int(os.getenv("EMAIL_BULK_BIND_CONCURRENCY", "16"))
+
+
+async def verify_accounts(accounts: List, concurrency: Optional[int] = None) -> List[Tuple[bool, str, Optional[object]]]:
+    """并发验证多个邮箱的登录信息，按输入顺序返回 (是否成功, 错误信息, 已登录的客户端)"""
+    semaphore = asyncio.Semaphore(concurrency or BULK_BIND_CONCURRENCY)
+
+    async def verify(account):
+        async with semaphore:
+            return await imap_executor.run(
+                account.imap_server,
+                verify_imap_login,
+                email=account.email,
+                password=account.password,
+                imap_server=account.imap_server,
+                imap_port=account.imap_port
+            )
+
+    return await asyncio.gather(*(verify(account) for account in accounts))
+
+
+async def adopt_sessions(sessions: List[Tuple[object, object]]) -> None:
+    """把验证时登录的客户端放入连接池，首次同步不用重新登录
+
+    连接池已满时会淘汰空闲会话并登出，这些网络操作放到 IMAP 线程池中执行。
+    """
+    await asyncio.gather(*(
+        imap_executor.run(binding.imap_server, imap_pool.adopt, IMAPAccount.from_binding(binding), client)
+        for binding, client in sessions
+    ))
+
+
+async def close_sessions(sessions: List[Tuple[str, object]]) -> None:
+    """登出没能绑定的邮箱在验证时登录的客户端，sessions 为 (IMAP 服务器, 客户端)"""
+    await asyncio.gather(*(
+        imap_executor.run(imap_server, close_client, client)
+        for imap_server, client in sessions
+    ))
+
+
+def insert_bindings(db: Session, rows: List[Dict]) -> Dict[str, EmailBinding]:
+    """逐行插入邮箱绑定并提交，返回新建的绑定（按邮箱）
+
+    验证登录期间其他请求可能已经绑定了同一个邮箱，冲突的行直接跳过，
+    不影响同一批中的其他邮箱。
+    """
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    ids = db.scalars(insert(EmailBinding).on_conflict_do_nothing().returning(EmailBinding.id), rows).all()
+    bindings = db.scalars(select(EmailBinding).where(EmailBinding.id.in_(ids))).all()
+    db.commit()
+    return {binding.email: binding for binding in bindings}
@@ -0,0 +1,61 @@
+from typing import Dict, Optional, Set
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EmailEventBroker:
+    """把后台线程产生的邮件事件分发给已连接的 SSE 客户端
+
+    publish 可以在任意线程调用，事件通过 call_soon_threadsafe 交给事件循环；
+    每个订阅者一个有界队列，客户端读得太慢时丢弃新事件而不是无限堆积。
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """设置用来分发事件的事件循环（应用启动时调用）"""
+        self._loop = loop
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """订阅用户的邮件事件，必须在事件循环中调用"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: Dict) -> None:
+        """向用户的所有订阅者发送事件，可以在任意线程调用"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, user_id, event)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _dispatch(self, user_id: int, event: Dict) -> None:
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping email event for user {user_id}: subscriber queue is full")
+
+
+email_events = EmailEventBroker()
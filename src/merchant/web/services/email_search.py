@@ -0,0 +1,163 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Pattern
+import html
+import os
+import re
+
+from sqlalchemy import Select, column, func, literal_column, select, table, text
+from sqlalchemy.orm import Session
+
+from ..models.email import EmailBinding, EmailMessage
+from ..models.email_search import CJK_RE, FTS_TABLE
+
+_fts = table(FTS_TABLE, column("rowid"))
+
+# 匹配的邮件不超过这个数量时按 bm25 相关度排序，否则按同步顺序返回最新的邮件，
+# 避免宽泛的查询为所有匹配的邮件计算相关度
+RANK_LIMIT = int(os.getenv("EMAIL_SEARCH_RANK_LIMIT", "5000"))
+SNIPPET_LENGTH = 120
+
+# 非中日韩文字按 unicode61 的规则拆成词
+_WORD_RE = re.compile(r"\w+")
+
+
+def query_pieces(query: str) -> List[str]:
+    """把查询拆成连续的中日韩文字和单词"""
+    pieces = []
+    for term in query.split():
+        position = 0
+        for match in CJK_RE.finditer(term):
+            pieces.extend(_WORD_RE.findall(term[position:match.start()]))
+            pieces.append(match.group())
+            position = match.end()
+        pieces.extend(_WORD_RE.findall(term[position:]))
+    return pieces
+
+
+def build_match_query(query: str) -> str:
+    """把用户输入转成 FTS5 查询，各部分之间为 AND
+
+    连续的中日韩文字转成相邻两字组成的短语，单个字和单词按前缀匹配，
+    支持边输入边搜索。
+    """
+    return " ".join(match_phrase(piece) for piece in query_pieces(query))
+
+
+def match_phrase(piece: str, prefix: bool = True) -> str:
+    """一段中日韩文字或一个单词对应的 FTS5 短语，prefix 为真时单词按前缀匹配"""
+    if CJK_RE.fullmatch(piece) and len(piece) > 1:
+        return '"' + " ".join(piece[i:i + 2] for i in range(len(piece) - 1)) + '"'
+    return f'"{piece}"*' if prefix else f'"{piece}"'
+
+
+def _highlight_pattern(query: str) -> Optional[Pattern]:
+    pieces = sorted(set(query_pieces(query)), key=len, reverse=True)
+    if not pieces:
+        return None
+    alternatives = [re.escape(p) if CJK_RE.fullmatch(p) else r"\b" + re.escape(p) + r"\w*" for p in pieces]
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def _highlight(value: str, pattern: Optional[Pattern]) -> str:
+    """转义 HTML 并用 <mark> 标出匹配的文字"""
+    if pattern is None:
+        return html.escape(value)
+    parts = []
+    position = 0
+    for match in pattern.finditer(value):
+        parts.append(html.escape(value[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(html.escape(value[position:]))
+    return "".join(parts)
+
+
+def _snippet(value: str, pattern: Optional[Pattern]) -> str:
+    """截取正文中第一处匹配附近的文字"""
+    value = re.sub(r"\s+", " ", value).strip()
+    match = pattern.search(value) if pattern is not None else None
+    start = max(0, match.start() - SNIPPET_LENGTH // 3) if match else 0
+    end = start + SNIPPET_LENGTH
+    snippet = _highlight(value[start:end], pattern)
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(value) else "")
+
+
+def count_candidates(db: Session, stmt: Select, key, params: Dict, cap: int = RANK_LIMIT) -> int:
+    """统计 stmt 的结果数，最多数到 cap + 1，用于决定是否按相关度排序"""
+    capped = stmt.with_only_columns(key).limit(cap + 1).subquery()
+    return db.execute(select(func.count()).select_from(capped), params).scalar()
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    binding_id: Optional[int] = None,
+    sender: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict]:
+    """在本地缓存的邮件中全文搜索
+
+    Returns:
+        List[Dict]: 搜索结果，subject_highlight 和 snippet 是已转义的 HTML
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    stmt = (
+        select(
+            EmailMessage.binding_id,
+            EmailBinding.email.label("account"),
+            EmailMessage.uid,
+            EmailMessage.subject,
+            EmailMessage.from_addr,
+            EmailMessage.date,
+            EmailMessage.has_attachments,
+            EmailMessage.preview,
+            EmailMessage.body_text,
+        )
+        .select_from(_fts)
+        .join(EmailMessage, EmailMessage.id == _fts.c.rowid)
+        .join(EmailBinding, EmailBinding.id == EmailMessage.binding_id)
+        .where(text(f"{FTS_TABLE} MATCH :match"))
+        .where(EmailBinding.user_id == user_id)
+    )
+    if binding_id is not None:
+        stmt = stmt.where(EmailMessage.binding_id == binding_id)
+    if sender:
+        stmt = stmt.where(EmailMessage.from_addr.icontains(sender, autoescape=True))
+    if date_from is not None:
+        stmt = stmt.where(EmailMessage.date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(EmailMessage.date < date_to)
+    # 只数当前用户、按筛选条件可见的匹配，其他用户的邮件不影响排序方式
+    candidates = count_candidates(db, stmt, _fts.c.rowid, {"match": match}, RANK_LIMIT)
+    if not candidates:
+        return []
+    if candidates <= RANK_LIMIT:
+        stmt = stmt.order_by(literal_column(f"{FTS_TABLE}.rank"))
+    else:
+        # 全文索引可以直接按 rowid 倒序输出，找到一页结果就停止
+        stmt = stmt.order_by(_fts.c.rowid.desc())
+    stmt = stmt.limit(limit).offset(offset)
+
+    pattern = _highlight_pattern(query)
+    results = []
+    for row in db.execute(stmt, {"match": match}):
+        results.append({
+            "binding_id": row.binding_id,
+            "account": row.account,
+            "id": str(row.uid),
+            "subject": row.subject or "",
+            "from_addr": row.from_addr or "",
+            "date": row.date,
+            "has_attachments": bool(row.has_attachments),
+            "preview": row.preview,
+            "subject_highlight": _highlight(row.subject or "", pattern),
+            "snippet": _snippet(row.body_text or row.preview or "", pattern),
+        })
+    return results
@@ -0,0 +1,398 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import heapq
+import json
+import logging
+import os
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..models.email import EmailMessage, EmailSyncState
+from ..utils.email import run_imap, fetch_folder_changes, fetch_older_messages, fetch_raw_messages
+from ..utils.imap_pool import IMAPAccount
+from ..utils.mime_parser import mime_parser
+from .customer_linker import CustomerLinker
+
+logger = logging.getLogger(__name__)
+
+# 首次同步时只获取最近的邮件，更早的邮件按需补齐
+INITIAL_SYNC_WINDOW = int(os.getenv("EMAIL_SYNC_INITIAL_WINDOW", "50"))
+
+# 下载正文时单批的邮件数和总字节数上限，超过单封上限的邮件不下载正文
+INGEST_BATCH_SIZE = int(os.getenv("EMAIL_INGEST_BATCH_SIZE", "100"))
+INGEST_BATCH_BYTES = int(os.getenv("EMAIL_INGEST_BATCH_BYTES", str(20 * 1024 * 1024)))
+INGEST_MAX_MESSAGE_SIZE = int(os.getenv("EMAIL_INGEST_MAX_MESSAGE_SIZE", str(5 * 1024 * 1024)))
+
+# 统一收件箱同时同步的邮箱数，以及单个邮箱的默认超时（秒）
+UNIFIED_INBOX_CONCURRENCY = int(os.getenv("EMAIL_UNIFIED_INBOX_CONCURRENCY", "8"))
+UNIFIED_INBOX_TIMEOUT = float(os.getenv("EMAIL_UNIFIED_INBOX_TIMEOUT", "10"))
+
+
+class EmailSyncService:
+    """把远程邮箱增量同步到本地邮件缓存
+
+    数据库读写在调用方线程完成，IMAP 操作通过 run_imap 放到线程池中执行。
+    等待 IMAP 期间不持有数据库连接，慢服务器不会占满数据库连接池。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def sync_folder(self, email_binding, folder: str = "INBOX") -> EmailSyncState:
+        """增量同步一个文件夹，返回同步后的状态"""
+        state = self._get_state(email_binding.id, folder)
+        snapshot = self._snapshot(state)
+        changes = await self._run_imap(
+            email_binding,
+            lambda client: fetch_folder_changes(client, folder, initial_window=INITIAL_SYNC_WINDOW, **snapshot),
+        )
+        self._apply_changes(email_binding.id, state, changes)
+        return state
+
+    def sync_with_client(self, binding_id: int, client, folder: str = "INBOX") -> List[EmailMessage]:
+        """用调用方已登录的客户端在当前线程中增量同步，返回新增的邮件
+
+        供后台监听线程使用，它持有自己的 IMAP 连接和数据库会话。
+        """
+        state = self._get_state(binding_id, folder)
+        changes = fetch_folder_changes(client, folder, initial_window=INITIAL_SYNC_WINDOW, **self._snapshot(state))
+        return self._apply_changes(binding_id, state, changes)
+
+    async def ingest_bodies(self, email_binding, folder: str = "INBOX", limit: int = INGEST_BATCH_SIZE) -> int:
+        """下载缓存中还没有正文的邮件，在进程池中解析后保存预览和正文，返回解析成功的邮件数"""
+        state = self._get_state(email_binding.id, folder)
+        uidvalidity = state.uidvalidity
+        uids = self._pending_body_uids(email_binding.id, folder, limit)
+        if not uids:
+            return 0
+        raw_messages = await self._run_imap(
+            email_binding,
+            lambda client: fetch_raw_messages(client, folder, uidvalidity, uids),
+        )
+        if raw_messages is None:
+            # UIDVALIDITY 已变化，下次同步时会重建缓存
+            return 0
+        records = await mime_parser.parse_many_async(list(raw_messages.items()))
+        return self._store_bodies(email_binding.id, folder, uids, records)
+
+    def ingest_bodies_with_client(
+        self,
+        binding_id: int,
+        client,
+        folder: str = "INBOX",
+        limit: int = INGEST_BATCH_SIZE,
+    ) -> int:
+        """用调用方已登录的客户端在当前线程中下载并解析正文，供后台监听线程使用"""
+        state = self._get_state(binding_id, folder)
+        uids = self._pending_body_uids(binding_id, folder, limit)
+        if not uids:
+            return 0
+        raw_messages = fetch_raw_messages(client, folder, state.uidvalidity, uids)
+        if raw_messages is None:
+            return 0
+        records = mime_parser.parse_many(list(raw_messages.items()))
+        return self._store_bodies(binding_id, folder, uids, records)
+
+    def list_messages(
+        self,
+        binding_id: int,
+        folder: str = "INBOX",
+        limit: int = 10,
+        before_uid: Optional[int] = None,
+    ) -> List[EmailMessage]:
+        """从本地缓存读取 UID 小于 before_uid 的最新邮件"""
+        query = self.db.query(EmailMessage).filter(
+            EmailMessage.binding_id == binding_id,
+            EmailMessage.folder == folder
+        )
+        if before_uid is not None:
+            query = query.filter(EmailMessage.uid < before_uid)
+        return query.order_by(EmailMessage.uid.desc()).limit(limit).all()
+
+    async def load_page(
+        self,
+        email_binding,
+        folder: str = "INBOX",
+        limit: int = 20,
+        before_uid: Optional[int] = None,
+    ) -> Tuple[List[EmailMessage], Optional[str], EmailSyncState]:
+        """读取一页邮件，缓存中不够时只从服务器补齐这一页需要的 UID 范围
+
+        翻页游标是页中最小的 UID，新邮件到达不会影响后续页的内容；
+        页内按邮件日期倒序排列。
+
+        Returns:
+            Tuple: (邮件列表, 下一页游标, 同步状态)
+        """
+        state = self._get_state(email_binding.id, folder)
+        if before_uid is None or state.uidvalidity is None:
+            await self.sync_folder(email_binding, folder)
+
+        rows = self.list_messages(email_binding.id, folder, limit + 1, before_uid)
+        if len(rows) <= limit and not state.backfill_complete:
+            below_uid = rows[-1].uid if rows else self._lowest_cached_uid(state)
+            if before_uid is not None and (below_uid is None or before_uid < below_uid):
+                below_uid = before_uid
+            if below_uid is None:
+                below_uid = (state.highest_uid or 0) + 1
+            await self._backfill(email_binding, state, below_uid, limit + 1 - len(rows))
+            rows = self.list_messages(email_binding.id, folder, limit + 1, before_uid)
+
+        page = rows[:limit]
+        next_cursor = str(page[-1].uid) if len(rows) > limit else None
+        page.sort(key=lambda message: (message.date or datetime.min, message.uid), reverse=True)
+        return page, next_cursor, state
+
+    def purge(self, binding_id: int) -> None:
+        """删除绑定的全部缓存邮件和同步状态"""
+        self.db.query(EmailMessage).filter(EmailMessage.binding_id == binding_id).delete(synchronize_session=False)
+        self.db.query(EmailSyncState).filter(EmailSyncState.binding_id == binding_id).delete(synchronize_session=False)
+
+    async def _run_imap(self, email_binding, operation):
+        """结束当前事务、归还数据库连接后再执行 IMAP 操作"""
+        account = IMAPAccount.from_binding(email_binding)
+        self.db.commit()
+        return await run_imap(account, operation)
+
+    def _get_state(self, binding_id: int, folder: str) -> EmailSyncState:
+        state = self.db.query(EmailSyncState).filter(
+            EmailSyncState.binding_id == binding_id,
+            EmailSyncState.folder == folder
+        ).first()
+        if state is None:
+            state = EmailSyncState(binding_id=binding_id, folder=folder, highest_uid=0, message_count=0)
+            self.db.add(state)
+            # 立即提交，不能在等待 IMAP 的过程中持有 SQLite 的写锁
+            self.db.commit()
+        return state
+
+    def _pending_body_uids(self, binding_id: int, folder: str, limit: int) -> List[int]:
+        """还没有正文的最新邮件，总大小不超过 INGEST_BATCH_BYTES"""
+        rows = self.db.query(EmailMessage.uid, EmailMessage.size).filter(
+            EmailMessage.binding_id == binding_id,
+            EmailMessage.folder == folder,
+            EmailMessage.body_parsed_at.is_(None),
+            or_(EmailMessage.size.is_(None), EmailMessage.size <= INGEST_MAX_MESSAGE_SIZE)
+        ).order_by(EmailMessage.uid.desc()).limit(limit).all()
+
+        uids, total = [], 0
+        for uid, size in rows:
+            total += size or 0
+            if uids and total > INGEST_BATCH_BYTES:
+                break
+            uids.append(uid)
+        return uids
+
+    def _store_bodies(self, binding_id: int, folder: str, uids: List[int], records: List[Dict]) -> int:
+        """保存解析结果，服务器上已不存在或解析失败的邮件也标记为已处理，避免反复下载"""
+        records_by_uid = {record["uid"]: record for record in records}
+        parsed_at = datetime.utcnow()
+        stored = 0
+        for message in self.db.query(EmailMessage).filter(
+            EmailMessage.binding_id == binding_id,
+            EmailMessage.folder == folder,
+            EmailMessage.uid.in_(uids)
+        ).all():
+            message.body_parsed_at = parsed_at
+            record = records_by_uid.get(message.uid)
+            if record is None or "error" in record:
+                continue
+            message.preview = record["preview"]
+            message.body_text = record["body_text"]
+            message.attachments = json.dumps(record["attachments"], ensure_ascii=False)
+            message.has_attachments = bool(message.has_attachments or record["has_attachments"])
+            message.message_id = message.message_id or record["message_id"]
+            message.date = message.date or record["date"]
+            stored += 1
+        self.db.commit()
+        return stored
+
+    def _lowest_cached_uid(self, state: EmailSyncState) -> Optional[int]:
+        lowest = self.db.query(EmailMessage.uid).filter(
+            EmailMessage.binding_id == state.binding_id,
+            EmailMessage.folder == state.folder
+        ).order_by(EmailMessage.uid.asc()).first()
+        return lowest[0] if lowest else None
+
+    def _snapshot(self, state: EmailSyncState) -> Dict:
+        """同步需要的状态，用普通值传给 IMAP 操作"""
+        return {
+            "uidvalidity": state.uidvalidity,
+            "highest_uid": state.highest_uid or 0,
+            "highest_modseq": state.highest_modseq,
+            "message_count": state.message_count or 0,
+            "lowest_uid": self._lowest_cached_uid(state) if state.uidvalidity is not None else None,
+        }
+
+    async def _backfill(self, email_binding, state: EmailSyncState, below_uid: int, count: int) -> None:
+        """从服务器补齐 below_uid 以下的 count 封邮件"""
+        folder, uidvalidity = state.folder, state.uidvalidity
+        result = await self._run_imap(
+            email_binding,
+            lambda client: fetch_older_messages(client, folder, uidvalidity, below_uid, count),
+        )
+        if result["uidvalidity_changed"]:
+            # 缓存已失效，重新同步最近的邮件
+            await self.sync_folder(email_binding, state.folder)
+            return
+        added = self._store_records(email_binding.id, state.folder, result["messages"])
+        state.backfill_complete = result["complete"]
+        self.db.commit()
+        self._link_customers(email_binding.id, added)
+
+    def _store_records(self, binding_id: int, folder: str, records: List[Dict]) -> List[EmailMessage]:
+        """写入或更新邮件头记录，返回新增的邮件"""
+        if not records:
+            return []
+        existing = {
+            message.uid: message
+            for message in self.db.query(EmailMessage).filter(
+                EmailMessage.binding_id == binding_id,
+                EmailMessage.folder == folder,
+                EmailMessage.uid.in_([r["uid"] for r in records])
+            ).all()
+        }
+
+        added = []
+        for record in records:
+            message = existing.get(record["uid"])
+            if message is None:
+                message = EmailMessage(binding_id=binding_id, folder=folder, uid=record["uid"])
+                self.db.add(message)
+                added.append(message)
+            message.message_id = record["message_id"]
+            message.subject = record["subject"]
+            message.from_addr = record["from_addr"]
+            message.to_addrs = "\n".join(record["to_addrs"])
+            message.date = record["date"]
+            message.flags = " ".join(record["flags"])
+            message.size = record["size"]
+            message.has_attachments = record["has_attachments"]
+            message.modseq = record["modseq"]
+        return added
+
+    def _apply_changes(self, binding_id: int, state: EmailSyncState, changes: Dict) -> List[EmailMessage]:
+        """把同步结果写入缓存，返回新增的邮件"""
+        folder = state.folder
+        cached = self.db.query(EmailMessage).filter(
+            EmailMessage.binding_id == binding_id,
+            EmailMessage.folder == folder
+        )
+
+        if changes["reset"]:
+            # UIDVALIDITY 变化后旧的 UID 全部失效
+            cached.delete(synchronize_session=False)
+            state.highest_uid = 0
+            state.backfill_complete = changes["backfill_complete"]
+
+        new_records = changes["new_messages"]
+        added = self._store_records(binding_id, folder, new_records)
+
+        flag_changes = changes["flag_changes"]
+        if flag_changes:
+            for message in cached.filter(EmailMessage.uid.in_(list(flag_changes))).all():
+                change = flag_changes[message.uid]
+                message.flags = " ".join(change["flags"])
+                message.modseq = change["modseq"]
+
+        present_uids = changes["present_uids"]
+        if present_uids is not None:
+            low, high = changes["checked_range"]
+            cached.filter(
+                EmailMessage.uid >= low,
+                EmailMessage.uid <= high,
+                EmailMessage.uid.notin_(present_uids)
+            ).delete(synchronize_session=False)
+
+        state.uidvalidity = changes["uidvalidity"]
+        state.highest_uid = max([state.highest_uid or 0] + [r["uid"] for r in new_records])
+        state.highest_modseq = changes["highest_modseq"]
+        state.message_count = changes["message_count"]
+        state.last_synced_at = datetime.utcnow()
+        self.db.commit()
+
+        logger.debug(
+            f"Synced binding {binding_id} {folder}: {len(added)} new, "
+            f"{len(flag_changes)} flag changes, highest uid {state.highest_uid}"
+        )
+        self._link_customers(binding_id, added)
+        return added
+
+    def _link_customers(self, binding_id: int, messages: List[EmailMessage]) -> None:
+        """把新邮件记录到匹配客户的互动中，失败不影响同步结果"""
+        if not messages:
+            return
+        try:
+            linked = CustomerLinker(self.db).link(binding_id, messages)
+            if linked:
+                logger.debug(f"Linked {linked} messages of binding {binding_id} to customers")
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logger.warning(f"Failed to link messages of binding {binding_id} to customers: {e}")
+
+
+def _date_key(message: EmailMessage) -> Tuple[datetime, int]:
+    return (message.date or datetime.min, message.uid)
+
+
+async def load_unified_inbox(
+    db: Session,
+    email_bindings: List,
+    limit: int = 20,
+    timeout: Optional[float] = None,
+    concurrency: Optional[int] = None,
+) -> Tuple[List[Dict], List[Dict]]:
+    """并发同步多个邮箱，按日期合并成一个收件箱
+
+    每个邮箱先取日期最新的 limit 封邮件，再做 k 路归并。某个邮箱超时或
+    出错时，用它在本地缓存中的邮件代替，并在 errors 中说明。所有协程共用
+    同一个 Session，数据库读写都在事件循环上完成，等待 IMAP 前已经提交。
+
+    Returns:
+        Tuple: (合并后的收件箱列表项, 出错的邮箱列表)
+    """
+    timeout = UNIFIED_INBOX_TIMEOUT if timeout is None else timeout
+    semaphore = asyncio.Semaphore(concurrency or UNIFIED_INBOX_CONCURRENCY)
+    service = EmailSyncService(db)
+
+    async def load(email_binding):
+        async with semaphore:
+            page, _, _ = await asyncio.wait_for(service.load_page(email_binding, limit=limit), timeout)
+            return page
+
+    results = await asyncio.gather(*(load(binding) for binding in email_bindings), return_exceptions=True)
+
+    pages, errors = [], []
+    for email_binding, result in zip(email_bindings, results):
+        if isinstance(result, BaseException):
+            error = str(result)
+            if not error:
+                # wait_for 超时的异常没有消息
+                error = f"Timed out after {timeout:g}s" if isinstance(result, TimeoutError) else type(result).__name__
+            logger.warning(f"Unified inbox: binding {email_binding.id} failed: {error}")
+            errors.append({"binding_id": email_binding.id, "email": email_binding.email, "error": error})
+            result = sorted(service.list_messages(email_binding.id, limit=limit), key=_date_key, reverse=True)
+        pages.append([(message, email_binding) for message in result])
+
+    merged = heapq.merge(*pages, key=lambda item: _date_key(item[0]), reverse=True)
+    items = []
+    for message, email_binding in merged:
+        if len(items) >= limit:
+            break
+        items.append({**to_inbox_item(message), "binding_id": email_binding.id, "account": email_binding.email})
+    return items, errors
+
+
+def to_inbox_item(message: EmailMessage) -> Dict:
+    """把缓存的邮件转成收件箱列表项"""
+    return {
+        "id": str(message.uid),
+        "subject": message.subject or "",
+        "from_addr": message.from_addr or "",
+        "date": message.date,
+        "has_attachments": bool(message.has_attachments),
+        "preview": message.preview,
+    }
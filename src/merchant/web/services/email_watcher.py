@@ -0,0 +1,374 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from ..models.base import SessionLocal
+from ..models.email import EmailBinding
+from ..utils.email import open_imap_client
+from ..utils.imap_pool import IMAPAccount
+from ..utils.imap_profile import server_profiles
+from .email_events import EmailEventBroker, email_events
+from .email_sync import EmailSyncService, to_inbox_item
+
+logger = logging.getLogger(__name__)
+
+# 是否在应用启动时开启后台监听
+WATCH_ENABLED = os.getenv("EMAIL_WATCH_ENABLED", "1") == "1"
+# 同时保持的监听连接数上限，超出的邮箱排队等待空位
+WATCH_MAX_CONNECTIONS = int(os.getenv("EMAIL_WATCH_MAX_CONNECTIONS", "100"))
+# 建立连接和同步邮件的工作线程数
+WATCH_WORKERS = int(os.getenv("EMAIL_WATCH_WORKERS", "4"))
+# RFC 2177 要求客户端在 29 分钟内重新发出 IDLE
+IDLE_RENEW_INTERVAL = float(os.getenv("EMAIL_WATCH_IDLE_RENEW_INTERVAL", "600"))
+# 不支持 IDLE 的服务器用 NOOP 轮询的间隔（秒）
+POLL_INTERVAL = float(os.getenv("EMAIL_WATCH_POLL_INTERVAL", "60"))
+# 重新读取启用的邮箱绑定的间隔（秒）
+REFRESH_INTERVAL = float(os.getenv("EMAIL_WATCH_REFRESH_INTERVAL", "60"))
+# 连接失败后的最长重试间隔（秒）
+MAX_RETRY_DELAY = 300
+
+# 表示文件夹内容有变化的未标记响应
+CHANGE_RESPONSES = (b'EXISTS', b'EXPUNGE', b'FETCH', b'VANISHED')
+
+
+class _Watch:
+    """一个被监听的邮箱
+
+    除了 client 在 busy 期间归工作线程使用外，其余字段只在监听线程中修改。
+    """
+
+    def __init__(self, account: IMAPAccount, user_id: int):
+        self.account = account
+        self.user_id = user_id
+        self.client = None
+        self.idling = False
+        self.registered = False
+        self.busy = False
+        self.removed = False
+        self.deadline = 0.0
+        self.retry_at = 0.0
+        self.failures = 0
+
+
+class EmailWatcher:
+    """用 IMAP IDLE 监听所有启用的邮箱，新邮件写入本地缓存并推送给前端
+
+    一个监听线程用 selector 同时等待所有 IDLE 连接，有数据可读、需要续期
+    IDLE 或轮询时，才把对应的邮箱交给工作线程结束 IDLE、增量同步后重新
+    进入 IDLE。服务器不支持 IDLE 时改为定期 NOOP。同时保持的连接数不超过
+    max_connections。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        connect: Callable = open_imap_client,
+        broker: EmailEventBroker = email_events,
+        max_connections: int = WATCH_MAX_CONNECTIONS,
+        workers: int = WATCH_WORKERS,
+        idle_renew_interval: float = IDLE_RENEW_INTERVAL,
+        poll_interval: float = POLL_INTERVAL,
+        refresh_interval: float = REFRESH_INTERVAL,
+        folder: str = "INBOX",
+    ):
+        self._session_factory = session_factory
+        self._connect = connect
+        self._broker = broker
+        self.max_connections = max_connections
+        self.workers = workers
+        self.idle_renew_interval = idle_renew_interval
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.folder = folder
+
+        self._watches: Dict[int, _Watch] = {}
+        self._inbox: "queue.SimpleQueue[Tuple]" = queue.SimpleQueue()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._selector = None
+        self._executor = None
+        self._wakeup_r = self._wakeup_w = None
+        self._next_refresh = 0.0
+
+    def start(self) -> None:
+        """启动监听线程"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="imap-watch")
+        self._next_refresh = 0.0
+        self._thread = threading.Thread(target=self._run, name="imap-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """停止监听并关闭所有连接"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+
+    def watch(self, email_binding) -> None:
+        """开始监听邮箱（绑定或修改邮箱后调用）"""
+        if self._thread is not None:
+            self._post("watch", IMAPAccount.from_binding(email_binding), email_binding.user_id)
+
+    def unwatch(self, binding_id: int) -> None:
+        """停止监听邮箱（解绑邮箱后调用）"""
+        if self._thread is not None:
+            self._post("unwatch", binding_id)
+
+    def stats(self) -> Dict[str, int]:
+        """监听状态"""
+        watches = list(self._watches.values())
+        return {
+            "watched": len(watches),
+            "connected": sum(1 for watch in watches if watch.client is not None),
+            "idling": sum(1 for watch in watches if watch.idling),
+            "max_connections": self.max_connections,
+        }
+
+    # 以下方法在监听线程中执行
+
+    def _run(self) -> None:
+        try:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if now >= self._next_refresh:
+                    self._next_refresh = now + self.refresh_interval
+                    self._executor.submit(self._load_bindings)
+                self._schedule(now)
+
+                for key, _ in self._selector.select(self._next_timeout(now)):
+                    if key.data is None:
+                        self._drain_wakeup()
+                        continue
+                    watch = key.data
+                    self._unregister(watch)
+                    self._dispatch(watch, self._check)
+                self._process_inbox()
+        except Exception:
+            logger.exception("Email watcher crashed")
+        finally:
+            for watch in self._watches.values():
+                if not watch.busy:
+                    self._close(watch)
+            self._watches.clear()
+            self._selector.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
+    def _schedule(self, now: float) -> None:
+        """建立新连接，处理需要续期 IDLE 或轮询的邮箱"""
+        connections = sum(1 for watch in self._watches.values() if watch.client is not None or watch.busy)
+        for watch in self._watches.values():
+            if watch.busy:
+                continue
+            if watch.client is None:
+                if now >= watch.retry_at and connections < self.max_connections:
+                    connections += 1
+                    self._dispatch(watch, self._open)
+            elif now >= watch.deadline:
+                self._unregister(watch)
+                self._dispatch(watch, self._check)
+
+    def _next_timeout(self, now: float) -> float:
+        deadlines = [self._next_refresh]
+        connections = sum(1 for watch in self._watches.values() if watch.client is not None or watch.busy)
+        for watch in self._watches.values():
+            if watch.busy:
+                continue
+            if watch.client is not None:
+                deadlines.append(watch.deadline)
+            elif connections < self.max_connections:
+                # 名额已满时要等其他连接关闭，由 done 消息唤醒
+                deadlines.append(watch.retry_at)
+        return max(0.0, min(deadlines) - now)
+
+    def _process_inbox(self) -> None:
+        while True:
+            try:
+                message = self._inbox.get_nowait()
+            except queue.Empty:
+                return
+            kind, *args = message
+            if kind == "done":
+                self._finish(*args)
+            elif kind == "watch":
+                self._add(*args)
+            elif kind == "unwatch":
+                self._remove(*args)
+            elif kind == "bindings":
+                self._sync_bindings(*args)
+
+    def _add(self, account: IMAPAccount, user_id: int) -> None:
+        current = self._watches.get(account.id)
+        if current is not None:
+            if current.account == account:
+                return
+            # 登录信息变化，用新的信息重新连接
+            self._remove(account.id)
+        self._watches[account.id] = _Watch(account, user_id)
+
+    def _remove(self, binding_id: int) -> None:
+        watch = self._watches.pop(binding_id, None)
+        if watch is None:
+            return
+        watch.removed = True
+        if not watch.busy:
+            self._unregister(watch)
+            self._close(watch)
+
+    def _sync_bindings(self, bindings: List[Tuple[IMAPAccount, int]]) -> None:
+        """让监听的邮箱和数据库中启用的绑定保持一致"""
+        active = {account.id for account, _ in bindings}
+        for binding_id in [binding_id for binding_id in self._watches if binding_id not in active]:
+            self._remove(binding_id)
+        for account, user_id in bindings:
+            self._add(account, user_id)
+
+    def _finish(self, watch: _Watch) -> None:
+        """工作线程处理完成，重新开始等待"""
+        watch.busy = False
+        if watch.removed:
+            self._close(watch)
+            return
+        if watch.client is None or not watch.idling:
+            return
+        sock = watch.client.socket()
+        if getattr(sock, "pending", lambda: 0)():
+            # TLS 缓冲区中已有数据，selector 不会再通知
+            self._dispatch(watch, self._check)
+            return
+        self._selector.register(sock, selectors.EVENT_READ, watch)
+        watch.registered = True
+
+    def _dispatch(self, watch: _Watch, operation: Callable[[_Watch], None]) -> None:
+        watch.busy = True
+        self._executor.submit(self._work, watch, operation)
+
+    def _unregister(self, watch: _Watch) -> None:
+        if watch.registered:
+            watch.registered = False
+            try:
+                self._selector.unregister(watch.client.socket())
+            except (KeyError, ValueError, OSError):
+                pass
+
+    def _post(self, *message) -> None:
+        self._inbox.put(message)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_r.recv(1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    # 以下方法在工作线程中执行
+
+    def _work(self, watch: _Watch, operation: Callable[[_Watch], None]) -> None:
+        try:
+            if not self._stopping.is_set():
+                operation(watch)
+        except Exception as e:
+            watch.failures += 1
+            delay = min(MAX_RETRY_DELAY, 5 * 2 ** min(watch.failures, 6))
+            logger.warning(f"Email watcher: binding {watch.account.id} failed, retrying in {delay}s: {e}")
+            self._close(watch)
+            watch.retry_at = time.monotonic() + delay
+        finally:
+            self._post("done", watch)
+
+    def _open(self, watch: _Watch) -> None:
+        """连接邮箱，补齐离线期间的变化后开始等待"""
+        watch.client = self._connect(watch.account)
+        watch.idling = server_profiles.load(watch.client).idle
+        self._sync(watch, publish=False)
+        self._wait(watch)
+        watch.failures = 0
+
+    def _check(self, watch: _Watch) -> None:
+        """读取服务器推送的变化，有变化时同步并推送新邮件"""
+        client = watch.client
+        if watch.idling:
+            responses = client.idle_check(timeout=0)
+            _, remaining = client.idle_done()
+            responses.extend(remaining)
+        else:
+            _, responses = client.noop()
+        if any(len(response) > 1 and response[1] in CHANGE_RESPONSES for response in responses):
+            self._sync(watch, publish=True)
+        self._wait(watch)
+
+    def _wait(self, watch: _Watch) -> None:
+        if watch.idling:
+            watch.client.idle()
+            watch.deadline = time.monotonic() + self.idle_renew_interval
+        else:
+            watch.deadline = time.monotonic() + self.poll_interval
+
+    def _sync(self, watch: _Watch, publish: bool) -> None:
+        db = self._session_factory()
+        try:
+            service = EmailSyncService(db)
+            added = service.sync_with_client(watch.account.id, watch.client, self.folder)
+            if added:
+                # 推送前先解析新邮件的正文，前端可以直接显示预览
+                service.ingest_bodies_with_client(watch.account.id, watch.client, self.folder)
+            if publish and added:
+                added.sort(key=lambda message: message.uid, reverse=True)
+                self._broker.publish(watch.user_id, {
+                    "type": "new_messages",
+                    "binding_id": watch.account.id,
+                    "account": watch.account.email,
+                    "emails": [to_inbox_item(message) for message in added],
+                })
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _load_bindings(self) -> None:
+        db = self._session_factory()
+        try:
+            bindings = db.query(EmailBinding).filter(EmailBinding.is_active == True).all()
+            self._post("bindings", [(IMAPAccount.from_binding(binding), binding.user_id) for binding in bindings])
+        except Exception as e:
+            logger.warning(f"Email watcher: failed to load bindings: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _close(watch: _Watch) -> None:
+        client, watch.client, watch.idling = watch.client, None, False
+        if client is not None:
+            try:
+                # 直接关闭套接字，不等待服务器响应 LOGOUT
+                client.shutdown()
+            except Exception as e:
+                logger.debug(f"Error closing IMAP connection: {e}")
+
+
+email_watcher = EmailWatcher()
@@ -0,0 +1,210 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import os
+import re
+import unicodedata
+
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.orm import Session
+
+from ..models.customer import Customer
+from ..models.customer_search import FTS_TABLE
+from .customer_search import build_fuzzy_query
+from .email_search import build_match_query, query_pieces
+
+logger = logging.getLogger(__name__)
+
+_fts = table(FTS_TABLE, column("rowid"))
+
+# 公司名和联系人姓名的相似度（difflib ratio）都不低于阈值才认为是同一个客户
+COMPANY_THRESHOLD = float(os.getenv("PROSPECT_COMPANY_THRESHOLD", "0.85"))
+NAME_THRESHOLD = float(os.getenv("PROSPECT_NAME_THRESHOLD", "0.8"))
+# 一批潜在客户最多和这么多个公司名相近的已有客户比较
+BLOCK_CANDIDATES = int(os.getenv("PROSPECT_BLOCK_CANDIDATES", "2000"))
+# 让 Agent 排除的已有公司数上限，控制提示词长度
+KNOWN_COMPANY_LIMIT = int(os.getenv("PROSPECT_KNOWN_COMPANY_LIMIT", "200"))
+
+# 比较公司名时去掉的公司类型后缀
+LEGAL_SUFFIXES = frozenset([
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc", "llp", "plc",
+    "gmbh", "ag", "sa", "srl", "bv", "kk", "pte", "pty", "group", "holdings",
+])
+CJK_SUFFIX_RE = re.compile(r"(股份有限公司|有限责任公司|有限公司|集团|公司)$")
+_PUNCTUATION_RE = re.compile(r"[^\w]+")
+
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    """去掉空白并转成小写，不是邮件地址时返回 None"""
+    value = (value or "").strip().lower()
+    return value if "@" in value else None
+
+
+def normalize_company(value: Optional[str]) -> str:
+    """统一全半角和大小写，去掉标点和公司类型后缀"""
+    value = unicodedata.normalize("NFKC", value or "").lower().strip()
+    value = CJK_SUFFIX_RE.sub("", value)
+    words = [word for word in _PUNCTUATION_RE.sub(" ", value).split() if word not in LEGAL_SUFFIXES]
+    return " ".join(words)
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """统一全半角和大小写，去掉标点，词按字母排序（名和姓的顺序不影响比较）"""
+    value = unicodedata.normalize("NFKC", value or "").lower()
+    return " ".join(sorted(_PUNCTUATION_RE.sub(" ", value).split()))
+
+
+def similar(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class _Block:
+    """按公司名中的词分块的内存索引，只和共有至少一个词的记录比较"""
+
+    def __init__(self):
+        self._entries: Dict[str, List[Tuple[str, str, Optional[int]]]] = defaultdict(list)
+
+    def add(self, company: str, name: str, customer_id: Optional[int]) -> None:
+        entry = (company, name, customer_id)
+        for key in set(query_pieces(company)):
+            self._entries[key].append(entry)
+
+    def find(self, company: str, name: str) -> Optional[Tuple[str, str, Optional[int]]]:
+        seen = set()
+        for key in set(query_pieces(company)):
+            for entry in self._entries.get(key, ()):
+                if id(entry) in seen:
+                    continue
+                seen.add(id(entry))
+                if similar(company, entry[0]) >= COMPANY_THRESHOLD and similar(name, entry[1]) >= NAME_THRESHOLD:
+                    return entry
+        return None
+
+
+class ProspectDeduplicator:
+    """在写入前找出和已有客户或同批其他潜在客户重复的潜在客户
+
+    邮箱用一次 IN 查询和已有客户比较；公司名加联系人姓名的容错比较先用客户
+    全文索引把公司名相近的已有客户一次取出，再在内存中按公司名分块比较。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def split(self, prospects: Iterable[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """把潜在客户分成要新建的和重复的
+
+        Returns:
+            Tuple[List[Dict], List[Dict]]: 新客户（email 已规范化）；重复项，每项包含
+            prospect、reason（invalid_email、duplicate_in_batch、email 或 fuzzy）和
+            customer_id（匹配到的已有客户，同批重复时为 None）
+        """
+        fresh: List[Dict] = []
+        duplicates: List[Dict] = []
+        emails: Set[str] = set()
+        for prospect in prospects:
+            email = normalize_email(prospect.get("email"))
+            if email is None:
+                duplicates.append({"prospect": prospect, "reason": "invalid_email", "customer_id": None})
+            elif email in emails:
+                duplicates.append({"prospect": prospect, "reason": "duplicate_in_batch", "customer_id": None})
+            else:
+                emails.add(email)
+                fresh.append({**prospect, "email": email})
+        if not fresh:
+            return [], duplicates
+
+        # 已有客户的邮箱可能不是小写的，按 lower(email) 的表达式索引查
+        existing = {
+            email.lower(): customer_id
+            for customer_id, email in self.db.execute(
+                select(Customer.id, Customer.email).where(func.lower(Customer.email).in_([p["email"] for p in fresh]))
+            )
+        }
+        remaining = []
+        for prospect in fresh:
+            if prospect["email"] in existing:
+                duplicates.append({"prospect": prospect, "reason": "email", "customer_id": existing[prospect["email"]]})
+            else:
+                remaining.append(prospect)
+
+        block = _Block()
+        for customer_id, full_name, company in self._company_candidates(remaining):
+            block.add(normalize_company(company), normalize_name(full_name), customer_id)
+        result = []
+        for prospect in remaining:
+            company = normalize_company(prospect.get("company"))
+            name = normalize_name(prospect.get("name"))
+            match = block.find(company, name) if company else None
+            if match is not None:
+                reason = "fuzzy" if match[2] is not None else "duplicate_in_batch"
+                duplicates.append({"prospect": prospect, "reason": reason, "customer_id": match[2]})
+                continue
+            if company:
+                block.add(company, name, None)
+            result.append(prospect)
+        return result, duplicates
+
+    def merge(self, duplicates: List[Dict]) -> int:
+        """把按邮箱匹配到的潜在客户信息补到已有客户的空字段中，返回更新的客户数"""
+        by_customer = {d["customer_id"]: d["prospect"] for d in duplicates if d["reason"] == "email"}
+        if not by_customer:
+            return 0
+        updated = 0
+        for customer in self.db.scalars(select(Customer).where(Customer.id.in_(list(by_customer)))):
+            prospect = by_customer[customer.id]
+            changed = False
+            for field, key in (("full_name", "name"), ("company", "company"), ("position", "position")):
+                if not getattr(customer, field) and prospect.get(key):
+                    setattr(customer, field, prospect[key])
+                    changed = True
+            updated += changed
+        return updated
+
+    def known_companies(self, industry: str, region: str, limit: int = KNOWN_COMPANY_LIMIT) -> List[str]:
+        """之前为相同行业和地区找到的客户公司，让 Agent 不再研究这些公司"""
+        match = build_match_query(f"{industry} {region}")
+        if not match:
+            return []
+        notes = f"Auto-generated by Agent. Industry: {industry}, Region: {region}"
+        rows = self.db.scalars(
+            select(Customer.company)
+            .select_from(_fts)
+            .join(Customer, Customer.id == _fts.c.rowid)
+            .where(text(f"{FTS_TABLE} MATCH :match"))
+            .where(Customer.notes == notes)
+            .order_by(_fts.c.rowid.desc())
+            .limit(limit * 5),
+            {"match": f"notes : ({match})"}
+        )
+        companies = []
+        for company in rows:
+            if company and company not in companies:
+                companies.append(company)
+                if len(companies) >= limit:
+                    break
+        return companies
+
+    def _company_candidates(self, prospects: List[Dict]) -> List[Tuple[int, str, str]]:
+        """用一次全文查询取出公司名和任一潜在客户相近（每个词相同或拼写相近）的已有客户"""
+        groups = []
+        for prospect in prospects:
+            company = normalize_company(prospect.get("company"))
+            if company:
+                expression = build_fuzzy_query(self.db, company, require_correction=False, prefix=False)
+                if expression:
+                    groups.append(f"(company : ({expression}))")
+        if not groups:
+            return []
+        rows = self.db.execute(
+            select(Customer.id, Customer.full_name, Customer.company)
+            .select_from(_fts)
+            .join(Customer, Customer.id == _fts.c.rowid)
+            .where(text(f"{FTS_TABLE} MATCH :match"))
+            .limit(BLOCK_CANDIDATES),
+            {"match": " OR ".join(groups)}
+        ).all()
+        if len(rows) >= BLOCK_CANDIDATES:
+            logger.info("Prospect dedup candidates capped at %s", BLOCK_CANDIDATES)
+        return rows
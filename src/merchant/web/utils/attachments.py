@@ -0,0 +1,269 @@
+import asyncio
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import AsyncIterator, Dict, Optional
+
+from .email import describe_body_part, iter_body_parts, run_imap
+from .imap_pool import IMAPAccount
+
+# 每次从服务器读取的编码后字节数，决定了下载附件时占用的内存
+ATTACHMENT_CHUNK_SIZE = int(os.getenv("EMAIL_ATTACHMENT_CHUNK_SIZE", str(1024 * 1024)))
+
+# 附件磁盘缓存目录，为空时不缓存；缓存总大小超过上限时删除最久未使用的文件
+ATTACHMENT_CACHE_DIR = os.getenv("EMAIL_ATTACHMENT_CACHE_DIR", "")
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("EMAIL_ATTACHMENT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+
+def fetch_part_info(client, folder: str, uid: int, part: str) -> Optional[Dict]:
+    """从 BODYSTRUCTURE 中找到指定 part 的类型、编码和大小，不下载内容
+
+    Returns:
+        Optional[Dict]: part 信息和文件夹的 UIDVALIDITY，邮件或 part 不存在时返回 None
+    """
+    info = client.select_folder(folder, readonly=True)
+    fetched = client.fetch([uid], ['BODYSTRUCTURE'])
+    body = fetched.get(uid, {}).get(b'BODYSTRUCTURE')
+    if body is None:
+        return None
+    for part_id, leaf in iter_body_parts(body):
+        if part_id == part:
+            return dict(describe_body_part(leaf), part=part, uidvalidity=info.get(b'UIDVALIDITY'))
+    return None
+
+
+def fetch_part_chunk(client, folder: str, uidvalidity: Optional[int], uid: int, part: str, offset: int, size: int) -> bytes:
+    """用 BODY.PEEK[part]<offset.size> 读取 part 编码后内容的一段，超出末尾时返回空字节串
+
+    连接池中的会话可能在两次读取之间被其他请求切换到别的文件夹，每次都重新选择。
+    """
+    info = client.select_folder(folder, readonly=True)
+    if uidvalidity is not None and info.get(b'UIDVALIDITY') != uidvalidity:
+        raise ValueError("Folder UIDVALIDITY changed during download")
+    fetched = client.fetch([uid], [f'BODY.PEEK[{part}]<{offset}.{size}>'])
+    for key, value in fetched.get(uid, {}).items():
+        if key.startswith(b'BODY['):
+            return value or b""
+    return b""
+
+
+class _Base64Decoder:
+    """分段解码 base64，不足 4 个字符的尾部留到下一段"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + re.sub(rb"[^A-Za-z0-9+/=]", b"", data)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b""
+
+    def flush(self) -> bytes:
+        data, self._pending = self._pending, b""
+        if not data:
+            return b""
+        # 末尾缺少填充时补齐
+        return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+
+
+class _QuotedPrintableDecoder:
+    """按行解码 quoted-printable，最后一行不完整时留到下一段"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data
+        end = data.rfind(b"\n") + 1
+        if not end:
+            # 没有换行的超长行，只保留可能被截断的 "=XX"
+            equals = data.rfind(b"=")
+            end = equals if equals != -1 and equals >= len(data) - 2 else len(data)
+        self._pending = data[end:]
+        return binascii.a2b_qp(data[:end])
+
+    def flush(self) -> bytes:
+        data, self._pending = self._pending, b""
+        return binascii.a2b_qp(data)
+
+
+class _IdentityDecoder:
+    def feed(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def transfer_decoder(encoding: str):
+    """返回 Content-Transfer-Encoding 对应的分段解码器"""
+    encoding = (encoding or "").lower()
+    if encoding == "base64":
+        return _Base64Decoder()
+    if encoding == "quoted-printable":
+        return _QuotedPrintableDecoder()
+    return _IdentityDecoder()
+
+
+async def iter_attachment(
+    email_binding,
+    folder: str,
+    uid: int,
+    info: Dict,
+    chunk_size: int = ATTACHMENT_CHUNK_SIZE,
+    writer: Optional["_CacheWriter"] = None,
+) -> AsyncIterator[bytes]:
+    """分段下载并解码附件，同一时间只在内存中保留一段内容
+
+    Args:
+        email_binding: 邮箱绑定信息对象
+        folder: 邮件所在的文件夹
+        uid: 邮件 UID
+        info: fetch_part_info 返回的 part 信息
+        chunk_size: 每次读取的编码后字节数
+        writer: 缓存写入器，完整下载后提交，中断时丢弃
+    """
+    account = IMAPAccount.from_binding(email_binding)
+    decoder = transfer_decoder(info["encoding"])
+    offset = 0
+    completed = False
+    try:
+        while True:
+            chunk = await run_imap(
+                account,
+                lambda client, offset=offset: fetch_part_chunk(
+                    client, folder, info["uidvalidity"], uid, info["part"], offset, chunk_size
+                ),
+            )
+            offset += len(chunk)
+            last = len(chunk) < chunk_size
+            data = decoder.feed(chunk) + decoder.flush() if last else decoder.feed(chunk)
+            if data:
+                if writer is not None:
+                    await asyncio.to_thread(writer.write, data)
+                yield data
+            if last:
+                break
+        if writer is not None:
+            await asyncio.to_thread(writer.commit)
+        completed = True
+    finally:
+        # 生成器可能在事件循环之外被回收，这里不能 await；丢弃只是关闭并删除临时文件
+        if writer is not None and not completed:
+            writer.discard()
+
+
+class AttachmentCache:
+    """按内容寻址的附件磁盘缓存
+
+    blobs/ 下按解码后内容的 sha256 保存文件，不同邮件中相同的附件只存一份；
+    refs/ 下记录 (邮箱, 文件夹, UIDVALIDITY, UID, part) 对应的内容哈希。
+    所有方法都会读写磁盘，在异步代码中要通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = ATTACHMENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 缓存的总大小，首次写入时扫描目录得到，之后按写入累加，超过上限时才重新扫描
+        self._size: Optional[int] = None
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "refs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+
+    @staticmethod
+    def key(account: str, folder: str, uidvalidity: Optional[int], uid: int, part: str) -> str:
+        return hashlib.sha256(f"{account}\0{folder}\0{uidvalidity}\0{uid}\0{part}".encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        """返回缓存文件路径，未缓存时返回 None"""
+        try:
+            with open(self._ref_path(key)) as f:
+                path = self._blob_path(f.read().strip())
+            os.utime(path)
+            return path
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def writer(self, key: str) -> "_CacheWriter":
+        return _CacheWriter(self, key)
+
+    def _store(self, key: str, temp_path: str, digest: str) -> None:
+        blob_path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        added = 0 if os.path.exists(blob_path) else os.path.getsize(temp_path)
+        os.replace(temp_path, blob_path)
+        fd, ref_temp = tempfile.mkstemp(dir=os.path.join(self.directory, "tmp"))
+        with os.fdopen(fd, "w") as f:
+            f.write(digest)
+        os.replace(ref_temp, self._ref_path(key))
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            needs_prune = self._size is None or self._size > self.max_bytes
+        if needs_prune:
+            self._prune()
+
+    def _prune(self) -> None:
+        """扫描缓存目录，超过上限时删除最久未使用的文件，失效的引用在下次读取时视为未缓存"""
+        with self._lock:
+            blobs = []
+            for root, _, files in os.walk(os.path.join(self.directory, "blobs")):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    blobs.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in blobs)
+            for _, size, path in sorted(blobs):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._size = total
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.directory, "refs", key)
+
+    def _blob_path(self, digest: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            raise ValueError("Invalid cache reference")
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+
+class _CacheWriter:
+    """边下载边写入临时文件，完整下载后才放入缓存"""
+
+    def __init__(self, cache: AttachmentCache, key: str):
+        self._cache = cache
+        self._key = key
+        self._hash = hashlib.sha256()
+        fd, self._path = tempfile.mkstemp(dir=os.path.join(cache.directory, "tmp"))
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self) -> None:
+        self._file.close()
+        self._cache._store(self._key, self._path, self._hash.hexdigest())
+
+    def discard(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+attachment_cache = AttachmentCache(ATTACHMENT_CACHE_DIR) if ATTACHMENT_CACHE_DIR else None
@@ -2,17 +2,28 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 import os
 
-from ..models.base import get_db
+from ..models.base import get_db, get_session
 from ..models.user import User
 from ..schemas.auth import TokenData
+from .login_throttle import login_throttle
+from .password_hasher import PasswordHasher, PasswordHasherBusy
+from .user_cache import user_cache
+
+# bcrypt 轮数，每加 1 计算时间翻倍；调整后旧密码在用户下次登录时按新轮数重新哈希
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 执行哈希的线程数和最多排队的任务数，超过时返回 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
 
 # 配置密码哈希
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+password_hasher = PasswordHasher(pwd_context, max_workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
 # 配置 JWT
@@ -28,11 +39,47 @@ def get_password_hash(password: str) -> str:
     """生成密码哈希"""
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    """验证用户"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+async def check_login_throttle(ip: Optional[str], email: str) -> None:
+    """超过登录频率限制时返回 429，在查询用户和验证密码之前调用"""
+    retry_after = await login_throttle.check_async(ip, email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+async def hash_password(password: str) -> str:
+    """在密码线程池中生成哈希，不阻塞事件循环"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+async def authenticate_user(db, email: str, password: str) -> Optional[User]:
+    """验证用户，哈希参数过时时顺便更新保存的哈希"""
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
         return None
+    hashed_password = user.hashed_password
+    # 排队等待哈希期间不占用连接池中的数据库连接
+    await db.commit()
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -46,9 +93,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _load_user(db: Session, email: str) -> Optional[User]:
+    user = user_cache.get(db, email)
+    if user is None:
+        user = db.query(User).filter(User.email == email).first()
+        if user is not None:
+            user_cache.set(email, user)
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db = Depends(get_session)
 ) -> User:
     """获取当前用户"""
     credentials_exception = HTTPException(
@@ -65,11 +120,18 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = await db.run_sync(_load_user, token_data.email)
     if user is None:
         raise credentials_exception
     return user
 
+async def get_current_user_from_query(
+    token: str = Query(...),
+    db = Depends(get_session)
+) -> User:
+    """从查询参数中的 token 获取当前用户（EventSource 等无法设置请求头的场景）"""
+    return await get_current_user(token, db)
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -1,192 +1,597 @@
 import imapclient
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional, Iterator, Callable, TypeVar
 import email
 from email.header import decode_header
+from email.utils import collapse_rfc2231_value, decode_rfc2231, getaddresses
 from datetime import datetime
+import hashlib
 import logging
+import os
+import socket
+import ssl
+
+from .imap_executor import IMAPExecutor
+from .imap_pool import IMAPAccount, IMAPConnectionPool, close_client
+from .imap_profile import requires_id, server_profiles
+from .ttl_cache import TTLCache
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def verify_imap_connection(email: str, password: str, imap_server: str, imap_port: int) -> Tuple[bool, str]:
-    """验证IMAP连接
-    
-    Args:
-        email: 邮箱地址
-        password: 密码
-        imap_server: IMAP服务器地址
-        imap_port: IMAP服务器端口
+T = TypeVar("T")
 
-    Returns:
-        Tuple[bool, str]: (是否成功, 错误信息)
-    """
+# IMAP 读写超时（秒），避免服务器无响应时线程一直挂起
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", "30"))
+# 建立连接和 TLS 握手的超时（秒），服务器地址错误时尽快失败
+IMAP_CONNECT_TIMEOUT = float(os.getenv("IMAP_CONNECT_TIMEOUT", "10"))
+# 额外信任的 CA 证书文件，连接使用自签名证书的服务器（例如本地测试服务器）时设置
+IMAP_SSL_CA_FILE = os.getenv("IMAP_SSL_CA_FILE", "")
+
+# 所有连接共用一个 SSL 上下文，避免每次登录都重新加载系统证书
+imap_ssl_context = ssl.create_default_context(cafile=IMAP_SSL_CA_FILE or None)
+
+# 验证失败的结果缓存时间（秒），避免重试时反复登录同一个服务器
+VERIFY_FAILURE_TTL = float(os.getenv("IMAP_VERIFY_FAILURE_TTL", "60"))
+
+# 收件箱列表只需要信封和结构信息，不下载完整邮件体
+LIST_FETCH_ITEMS = ['ENVELOPE', 'BODYSTRUCTURE', 'INTERNALDATE', 'FLAGS', 'RFC822.SIZE']
+
+# 打开单封邮件时才下载完整内容（PEEK 不会把邮件标记为已读）
+DETAIL_FETCH_ITEMS = ['BODY.PEEK[]', 'INTERNALDATE', 'FLAGS']
+
+def _imap_timeout() -> imapclient.SocketTimeout:
+    return imapclient.SocketTimeout(connect=IMAP_CONNECT_TIMEOUT, read=IMAP_TIMEOUT)
+
+def login_imap_client(email: str, password: str, imap_server: str, imap_port: int) -> imapclient.IMAPClient:
+    """连接、登录并发送 ID 信息，失败时关闭连接并抛出异常"""
+    client = imapclient.IMAPClient(
+        imap_server, port=imap_port, use_uid=True, ssl=True, ssl_context=imap_ssl_context, timeout=_imap_timeout()
+    )
     try:
-        # 创建IMAPClient连接
-        client = imapclient.IMAPClient(imap_server, port=imap_port, use_uid=True, ssl=True)
-        
-        # 尝试登录
+        # IMAPClient 把命令和结尾的 CRLF 分两次写出，关闭 Nagle 算法，
+        # 避免和服务器的延迟确认叠加，每条 SEARCH 等命令多等 40ms
+        client.socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         client.login(email, password)
-        
-        # 发送ID信息
-        id_info = {
-            "name": "Python IMAP Client",
-            "version": "1.0.0",
-            "vendor": "Custom Client",
-            "support-email": email
-        }
-        client.id_(id_info)
-        logger.debug(f"Sent IMAP ID info: {id_info}")
-        
-        # 登录成功，关闭连接
-        client.logout()
-        
-        return True, "Connection successful"
-    except imapclient.exceptions.LoginError as e:
+
+        # 只有要求 ID 的服务器才发送ID信息，其他服务器省去一次往返
+        profile = server_profiles.get(imap_server, imap_port)
+        if profile.requires_id if profile is not None else requires_id(imap_server):
+            id_info = {
+                "name": "Python IMAP Client",
+                "version": "1.0.0",
+                "vendor": "Custom Client",
+                "support-email": email
+            }
+            client.id_(id_info)
+            logger.debug(f"Sent IMAP ID info: {id_info}")
+        if profile is None:
+            server_profiles.load(client)
+    except Exception:
+        try:
+            client.shutdown()
+        except Exception:
+            pass
+        raise
+    return client
+
+def _login_error_message(e: Exception, email: str, imap_server: str, imap_port: int) -> str:
+    """把登录或连接错误转成给用户看的提示"""
+    if isinstance(e, imapclient.exceptions.LoginError):
         error_msg = str(e)
         # 检查是否是 Gmail 的不安全登录错误
         if "Unsafe Login" in error_msg and "gmail.com" in imap_server:
-            return False, "Gmail 需要应用专用密码。请访问 Google 账户设置 -> 安全性 -> 2 步验证 -> 应用专用密码，生成一个应用专用密码，然后使用该密码代替您的 Gmail 密码。"
+            return "Gmail 需要应用专用密码。请访问 Google 账户设置 -> 安全性 -> 2 步验证 -> 应用专用密码，生成一个应用专用密码，然后使用该密码代替您的 Gmail 密码。"
         # 检查是否是163邮箱的错误
         elif "163.com" in email or "163.com" in imap_server:
             if "AUTHENTICATE failed" in error_msg:
-                return False, "163邮箱登录失败。请确保您使用的是正确的密码。如果您开启了客户端授权码，请使用授权码而不是登录密码。"
+                return "163邮箱登录失败。请确保您使用的是正确的密码。如果您开启了客户端授权码，请使用授权码而不是登录密码。"
             elif "Invalid credentials" in error_msg:
-                return False, "163邮箱登录失败。请确保您使用的是正确的密码。如果您开启了客户端授权码，请使用授权码而不是登录密码。"
-        return False, f"IMAP error: {error_msg}"
-    except ConnectionRefusedError:
-        return False, f"无法连接到IMAP服务器 {imap_server}:{imap_port}。请检查服务器地址和端口是否正确，以及服务器是否在运行。"
-    except TimeoutError:
-        return False, f"连接IMAP服务器 {imap_server}:{imap_port} 超时。请检查网络连接和服务器状态。"
-    except OSError as e:
+                return "163邮箱登录失败。请确保您使用的是正确的密码。如果您开启了客户端授权码，请使用授权码而不是登录密码。"
+        return f"IMAP error: {error_msg}"
+    if isinstance(e, ConnectionRefusedError):
+        return f"无法连接到IMAP服务器 {imap_server}:{imap_port}。请检查服务器地址和端口是否正确，以及服务器是否在运行。"
+    if isinstance(e, TimeoutError):
+        return f"连接IMAP服务器 {imap_server}:{imap_port} 超时。请检查网络连接和服务器状态。"
+    if isinstance(e, OSError):
         if e.errno == 101:  # Network is unreachable
-            return False, f"无法连接到IMAP服务器 {imap_server}:{imap_port}。请检查：\n1. 网络连接是否正常\n2. 服务器地址是否正确\n3. 防火墙设置是否允许该连接\n4. DNS解析是否正常"
+            return f"无法连接到IMAP服务器 {imap_server}:{imap_port}。请检查：\n1. 网络连接是否正常\n2. 服务器地址是否正确\n3. 防火墙设置是否允许该连接\n4. DNS解析是否正常"
         elif e.errno == 111:  # Connection refused
-            return False, f"IMAP服务器 {imap_server}:{imap_port} 拒绝连接。请检查服务器是否在运行以及端口是否正确。"
-        else:
-            return False, f"连接错误: {str(e)}"
+            return f"IMAP服务器 {imap_server}:{imap_port} 拒绝连接。请检查服务器是否在运行以及端口是否正确。"
+    return f"连接错误: {str(e)}"
+
+# 最近验证失败的 (服务器, 邮箱, 密码) 及错误信息，短时间内重试直接返回失败
+verify_failures: TTLCache[str] = TTLCache(ttl=VERIFY_FAILURE_TTL, max_size=10000)
+
+def _verify_key(email: str, password: str, imap_server: str, imap_port: int) -> Tuple:
+    # 密码只保存摘要；换了密码可以立即重试
+    return (imap_server.lower(), imap_port, email.lower(), hashlib.sha256(password.encode()).hexdigest())
+
+def verify_imap_login(
+    email: str, password: str, imap_server: str, imap_port: int
+) -> Tuple[bool, str, Optional[imapclient.IMAPClient]]:
+    """验证IMAP登录信息，成功时返回已登录的客户端，调用方可以放入连接池复用
+
+    Returns:
+        Tuple[bool, str, Optional[IMAPClient]]: (是否成功, 错误信息, 已登录的客户端)
+    """
+    key = _verify_key(email, password, imap_server, imap_port)
+    cached = verify_failures.get(key)
+    if cached is not None:
+        return False, cached, None
+    try:
+        client = login_imap_client(email, password, imap_server, imap_port)
     except Exception as e:
-        return False, f"连接错误: {str(e)}"
+        message = _login_error_message(e, email, imap_server, imap_port)
+        verify_failures.set(key, message)
+        return False, message, None
+    return True, "Connection successful", client
+
+def verify_imap_connection(email: str, password: str, imap_server: str, imap_port: int) -> Tuple[bool, str]:
+    """验证IMAP连接
+    
+    Args:
+        email: 邮箱地址
+        password: 密码
+        imap_server: IMAP服务器地址
+        imap_port: IMAP服务器端口
+
+    Returns:
+        Tuple[bool, str]: (是否成功, 错误信息)
+    """
+    success, message, client = verify_imap_login(email, password, imap_server, imap_port)
+    if client is not None:
+        # 登录成功，关闭连接
+        close_client(client)
+    return success, message
+
+def _to_str(value) -> str:
+    """把 IMAP 返回的 bytes 转成字符串"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+def decode_mime_header(value) -> str:
+    """解码 MIME 编码的邮件头，支持多段编码和不同字符集"""
+    value = _to_str(value)
+    if not value:
+        return ""
+    parts = []
+    for text, charset in decode_header(value):
+        if isinstance(text, bytes):
+            try:
+                text = text.decode(charset or 'utf-8', errors='replace')
+            except LookupError:
+                text = text.decode('utf-8', errors='replace')
+        parts.append(text)
+    return ''.join(parts)
+
+def _format_address(address) -> str:
+    """把 ENVELOPE 中的 Address 格式化为 "名字 <邮箱>" """
+    name = decode_mime_header(address.name)
+    if address.mailbox and address.host:
+        addr = f"{_to_str(address.mailbox)}@{_to_str(address.host)}"
+    else:
+        addr = _to_str(address.mailbox or address.host)
+    return f"{name} <{addr}>" if name else addr
+
+def _format_address_list(addresses) -> List[str]:
+    """格式化地址列表，跳过组语法的起止标记"""
+    return [
+        _format_address(address)
+        for address in addresses or ()
+        if address.mailbox and address.host
+    ]
+
+def format_header_addresses(values) -> List[str]:
+    """格式化完整邮件中的地址头（先拆分地址再解码名字）"""
+    return [
+        f"{decode_mime_header(name)} <{addr}>" if name else addr
+        for name, addr in getaddresses([str(value) for value in values])
+        if addr
+    ]
+
+def _params_to_dict(params) -> Dict[str, str]:
+    """把 BODYSTRUCTURE 中的 (key, value, key, value) 参数列表转成字典"""
+    if not isinstance(params, (tuple, list)):
+        return {}
+    result = {}
+    for i in range(0, len(params) - 1, 2):
+        result[_to_str(params[i]).lower()] = _to_str(params[i + 1])
+    return result
+
+def _filename_from_params(params: Dict[str, str]) -> Optional[str]:
+    """从参数中取出文件名（支持 RFC 2231 的 filename* 形式）"""
+    for key in ('filename', 'name'):
+        if params.get(key):
+            return decode_mime_header(params[key])
+        if params.get(f'{key}*'):
+            return collapse_rfc2231_value(decode_rfc2231(params[f'{key}*']))
+    return None
+
+def iter_body_parts(body, part_id: str = "") -> Iterator[Tuple[str, tuple]]:
+    """遍历 BODYSTRUCTURE，按 IMAP 的编号规则生成 (part 编号, 叶子 part)"""
+    if body.is_multipart:
+        for index, child in enumerate(body[0], start=1):
+            yield from iter_body_parts(child, f"{part_id}.{index}" if part_id else str(index))
+    else:
+        yield part_id or "1", body
+
+def _part_disposition(part) -> Tuple[Optional[str], Dict[str, str]]:
+    """从 BODYSTRUCTURE 的扩展字段中找出 Content-Disposition"""
+    for item in part[7:]:
+        if (
+            isinstance(item, tuple)
+            and len(item) == 2
+            and isinstance(item[0], bytes)
+            and item[0].lower() in (b'attachment', b'inline')
+        ):
+            return item[0].decode().lower(), _params_to_dict(item[1])
+    return None, {}
+
+def describe_body_part(part) -> Dict:
+    """提取叶子 part 的类型、编码、大小和文件名"""
+    disposition, disposition_params = _part_disposition(part)
+    filename = _filename_from_params(disposition_params) or _filename_from_params(_params_to_dict(part[2]))
+    return {
+        "content_type": f"{_to_str(part[0])}/{_to_str(part[1])}".lower(),
+        "encoding": _to_str(part[5]).lower() if len(part) > 5 else "",
+        "size": part[6] if len(part) > 6 and isinstance(part[6], int) else 0,
+        "disposition": disposition,
+        "filename": filename,
+    }
+
+def bodystructure_has_attachments(body) -> bool:
+    """根据 BODYSTRUCTURE 判断邮件是否带附件，规则与解析完整邮件时一致"""
+    if body is None:
+        return False
+    for _, part in iter_body_parts(body):
+        info = describe_body_part(part)
+        if info["disposition"] and info["filename"]:
+            return True
+    return False
+
+def parse_header_record(uid: int, message_data: Dict) -> Dict:
+    """把一封邮件的 ENVELOPE/BODYSTRUCTURE 等头部信息转成缓存记录"""
+    envelope = message_data.get(b'ENVELOPE')
+    from_addrs = _format_address_list(envelope.from_) if envelope else []
+    date = message_data.get(b'INTERNALDATE') or (envelope.date if envelope else None)
+    return {
+        "uid": uid,
+        "message_id": _to_str(envelope.message_id).strip() or None if envelope else None,
+        "subject": decode_mime_header(envelope.subject) if envelope else "",
+        "from_addr": from_addrs[0] if from_addrs else "",
+        "to_addrs": _format_address_list(envelope.to) if envelope else [],
+        "date": date or datetime.utcnow(),
+        "flags": [_to_str(flag) for flag in message_data.get(b'FLAGS', ())],
+        "size": message_data.get(b'RFC822.SIZE'),
+        "has_attachments": bodystructure_has_attachments(message_data.get(b'BODYSTRUCTURE')),
+        "modseq": message_data.get(b'MODSEQ', (None,))[0],
+    }
+
+def _parse_list_item(uid: int, message_data: Dict) -> Dict:
+    """把一封邮件的 ENVELOPE/BODYSTRUCTURE 转成列表项"""
+    record = parse_header_record(uid, message_data)
+    return {
+        "id": str(uid),
+        "subject": record["subject"],
+        "from_addr": record["from_addr"],
+        "date": record["date"].isoformat(),
+        "has_attachments": record["has_attachments"],
+    }
+
+def open_imap_client(email_binding) -> imapclient.IMAPClient:
+    """连接并登录到绑定邮箱的 IMAP 服务器"""
+    logger.debug(f"Connecting to IMAP server: {email_binding.imap_server}:{email_binding.imap_port}")
+    return login_imap_client(
+        email_binding.email,
+        email_binding.password,
+        email_binding.imap_server,
+        email_binding.imap_port
+    )
+
+# 按绑定复用已登录的 IMAP 会话，避免每次请求都重新握手和登录
+imap_pool = IMAPConnectionPool(
+    connect=open_imap_client,
+    max_sessions=int(os.getenv("IMAP_POOL_MAX_SESSIONS", "50")),
+    idle_timeout=float(os.getenv("IMAP_POOL_IDLE_TIMEOUT", "300")),
+    health_check_interval=float(os.getenv("IMAP_POOL_HEALTH_CHECK_INTERVAL", "30")),
+)
+
+# 阻塞的 IMAP 操作都在这个线程池中执行，不占用事件循环
+imap_executor = IMAPExecutor(
+    max_workers=int(os.getenv("IMAP_EXECUTOR_WORKERS", "32")),
+    per_host_limit=int(os.getenv("IMAP_PER_HOST_CONCURRENCY", "4")),
+)
+
+async def run_imap(email_binding, operation: Callable[..., T]) -> T:
+    """在线程池中用连接池里的会话执行 IMAP 操作
+
+    Args:
+        email_binding: 邮箱绑定信息对象
+        operation: 接收已登录 IMAPClient 的函数
+
+    Returns:
+        operation 的返回值
+    """
+    account = IMAPAccount.from_binding(email_binding)
+    return await imap_executor.run(account.imap_server, imap_pool.run, account, operation)
 
 def fetch_inbox_emails(email_binding) -> List[Dict]:
     """获取邮箱收件箱中的邮件
-    
+
+    只获取 ENVELOPE/BODYSTRUCTURE 等头部信息，完整邮件体在打开邮件时
+    通过 fetch_email_detail 获取。
+
     Args:
         email_binding: 邮箱绑定信息对象
 
     Returns:
         List[Dict]: 邮件列表，每个邮件包含基本信息
     """
-    client = None
-    try:
-        logger.debug(f"Connecting to IMAP server: {email_binding.imap_server}:{email_binding.imap_port}")
-        # 创建IMAPClient连接
-        client = imapclient.IMAPClient(email_binding.imap_server, port=email_binding.imap_port, use_uid=True, ssl=True)
-        
-        logger.debug(f"Logging in with email: {email_binding.email}")
-        # 登录
-        client.login(email_binding.email, email_binding.password)
-        
-        # 发送ID信息
-        id_info = {
-            "name": "Python IMAP Client",
-            "version": "1.0.0",
-            "vendor": "Custom Client",
-            "support-email": email_binding.email
-        }
-        client.id_(id_info)
-        logger.debug(f"Sent IMAP ID info: {id_info}")
-        
-        # 列出可用的邮箱
-        logger.debug("Listing mailboxes")
-        folders = client.list_folders()
-        logger.debug(f"List folders result: {folders}")
-        
-        # 检查是否有 INBOX
-        has_inbox = False
-        for folder in folders:
-            if folder[2] == 'INBOX':
-                has_inbox = True
-                break
-        
-        if not has_inbox:
-            logger.warning("INBOX not found, trying to select it anyway")
-        
-        logger.debug("Selecting INBOX")
-        # 选择收件箱
-        client.select_folder('INBOX')
-        
-        # 获取邮件总数
-        total_messages = len(client.search(['ALL']))
-        logger.debug(f"Total messages: {total_messages}")
-        
+    def _fetch(client) -> List[Dict]:
+        # 收件箱名称来自缓存的服务器信息，不用每次都列出文件夹
+        inbox = server_profiles.load(client).inbox
+        logger.debug(f"Selecting {inbox}")
+        client.select_folder(inbox, readonly=True)
+
         # 只获取最近的10封邮件
-        start = max(1, total_messages - 9)  # 从倒数第10封开始，或者从第1封开始
-        end = total_messages
-        
-        logger.debug(f"Fetching messages from {start} to {end}")
-        emails = []
-        
-        # 获取邮件ID列表
         message_ids = client.search(['ALL'])
-        recent_ids = message_ids[-10:] if len(message_ids) > 10 else message_ids
-        
-        # 获取邮件内容
-        messages = client.fetch(recent_ids, ['RFC822', 'INTERNALDATE'])
-        
+        recent_ids = message_ids[-10:]
+        logger.debug(f"Total messages: {len(message_ids)}, fetching headers for {len(recent_ids)}")
+
+        emails = []
+        if not recent_ids:
+            return emails
+
+        messages = client.fetch(recent_ids, LIST_FETCH_ITEMS)
         for uid, message_data in messages.items():
             logger.debug(f"Processing message: {uid}")
-            
-            # 解析邮件内容
-            email_body = message_data[b'RFC822']
-            email_message = email.message_from_bytes(email_body)
-            
-            # 解析邮件主题
-            subject = decode_header(email_message["subject"])[0][0]
-            if isinstance(subject, bytes):
-                subject = subject.decode()
-            
-            # 解析发件人
-            from_addr = decode_header(email_message["from"])[0][0]
-            if isinstance(from_addr, bytes):
-                from_addr = from_addr.decode()
-            
-            # 获取日期
-            date = message_data[b'INTERNALDATE']
-            
-            # 检查是否有附件
-            has_attachments = False
-            for part in email_message.walk():
-                if part.get_content_maintype() == 'multipart':
-                    continue
-                if part.get('Content-Disposition') is None:
-                    continue
-                if part.get_filename():
-                    has_attachments = True
-                    break
-            
-            # 构建邮件信息
-            email_info = {
-                "id": str(uid),
-                "subject": subject,
-                "from_addr": from_addr,
-                "date": date.isoformat(),
-                "has_attachments": has_attachments
-            }
-            
-            emails.append(email_info)
-        
+            emails.append(_parse_list_item(uid, message_data))
+
         logger.debug(f"Successfully fetched {len(emails)} emails")
         return emails
+
+    try:
+        return imap_pool.run(email_binding, _fetch)
     except Exception as e:
         logger.error(f"Error fetching emails: {str(e)}", exc_info=True)
         raise Exception(f"Failed to fetch emails: {str(e)}")
-    finally:
-        # 确保连接被正确关闭
-        if client:
-            try:
-                logger.debug("Closing IMAP connection")
-                client.logout()
-            except Exception as e:
-                logger.error(f"Error closing IMAP connection: {str(e)}")
-                pass 
\ No newline at end of file
+
+def fetch_folder_changes(
+    client,
+    folder: str = 'INBOX',
+    uidvalidity: Optional[int] = None,
+    highest_uid: int = 0,
+    highest_modseq: Optional[int] = None,
+    message_count: int = 0,
+    lowest_uid: Optional[int] = None,
+    initial_window: int = 50,
+) -> Dict:
+    """获取文件夹自上次同步以来的变化
+
+    只获取 UID 大于 highest_uid 的新邮件头；服务器支持 CONDSTORE 时用
+    CHANGEDSINCE 获取标记有变化的邮件；邮件数比预期少时才检查已缓存
+    范围内被删除的邮件。UIDVALIDITY 变化时重新开始同步。
+
+    Args:
+        client: 已登录的 IMAPClient
+        folder: 要同步的文件夹
+        uidvalidity: 上次同步时的 UIDVALIDITY
+        highest_uid: 已同步的最大 UID
+        highest_modseq: 已同步的最大 MODSEQ
+        message_count: 上次同步时文件夹中的邮件数
+        lowest_uid: 已缓存的最小 UID
+        initial_window: 首次同步时获取的最近邮件数量
+
+    Returns:
+        Dict: 同步结果，包括新邮件、标记变化和仍然存在的 UID
+    """
+    info = client.select_folder(folder, readonly=True)
+    server_uidvalidity = info.get(b'UIDVALIDITY')
+    uidnext = info.get(b'UIDNEXT')
+    exists = info.get(b'EXISTS', 0)
+    condstore = server_profiles.load(client).condstore
+
+    reset = uidvalidity is None or server_uidvalidity != uidvalidity
+    if reset:
+        logger.debug(f"Full resync of {folder}: UIDVALIDITY {uidvalidity} -> {server_uidvalidity}")
+        highest_uid, highest_modseq, message_count, lowest_uid = 0, None, 0, None
+        all_uids = client.search(['ALL']) if exists else []
+        new_uids = all_uids[-initial_window:]
+    elif uidnext is not None and uidnext <= highest_uid + 1:
+        new_uids = []
+    else:
+        # "n:*" 总会包含最后一封邮件，需要过滤掉已同步的 UID
+        new_uids = [uid for uid in client.search(['UID', f'{highest_uid + 1}:*']) if uid > highest_uid]
+
+    fetch_items = LIST_FETCH_ITEMS + (['MODSEQ'] if condstore else [])
+    new_messages = []
+    if new_uids:
+        fetched = client.fetch(new_uids, fetch_items)
+        new_messages = [parse_header_record(uid, data) for uid, data in fetched.items()]
+
+    server_modseq = info.get(b'HIGHESTMODSEQ')
+    flag_changes = {}
+    if not reset and condstore and highest_uid and highest_modseq and (
+        server_modseq is None or server_modseq > highest_modseq
+    ):
+        # IMAPClient.fetch 只接受 UID 列表，先用 SEARCH MODSEQ 找出有变化的邮件
+        changed_uids = [uid for uid in client.search(['MODSEQ', highest_modseq + 1]) if uid <= highest_uid]
+        changed = client.fetch(
+            changed_uids, ['FLAGS'], modifiers=[f'CHANGEDSINCE {highest_modseq}']
+        ) if changed_uids else {}
+        flag_changes = {
+            uid: {
+                "flags": [_to_str(flag) for flag in data.get(b'FLAGS', ())],
+                "modseq": data.get(b'MODSEQ', (None,))[0],
+            }
+            for uid, data in changed.items()
+        }
+
+    # 邮件数少于预期说明有邮件被删除，此时才检查已缓存范围内的 UID
+    present_uids = None
+    if not reset and lowest_uid and exists < message_count + len(new_messages):
+        present_uids = list(client.search(['UID', f'{lowest_uid}:{highest_uid}']))
+
+    modseqs = [m["modseq"] for m in new_messages] + [c["modseq"] for c in flag_changes.values()]
+    modseqs = [m for m in modseqs + [highest_modseq, server_modseq] if m]
+    return {
+        "folder": folder,
+        "reset": reset,
+        "backfill_complete": reset and len(all_uids) <= initial_window,
+        "uidvalidity": server_uidvalidity,
+        "message_count": exists,
+        "highest_modseq": max(modseqs) if modseqs else None,
+        "new_messages": new_messages,
+        "flag_changes": flag_changes,
+        "present_uids": present_uids,
+        "checked_range": (lowest_uid, highest_uid),
+    }
+
+def fetch_older_messages(client, folder: str, uidvalidity: int, below_uid: int, count: int) -> Dict:
+    """获取 UID 小于 below_uid 的最近 count 封邮件的头部信息
+
+    Args:
+        client: 已登录的 IMAPClient
+        folder: 文件夹
+        uidvalidity: 缓存对应的 UIDVALIDITY，不一致时不获取
+        below_uid: 只获取小于该 UID 的邮件
+        count: 最多获取的邮件数
+
+    Returns:
+        Dict: 获取到的邮件，以及是否已经到达文件夹中最早的邮件
+    """
+    info = client.select_folder(folder, readonly=True)
+    if info.get(b'UIDVALIDITY') != uidvalidity:
+        return {"uidvalidity_changed": True, "messages": [], "complete": False}
+
+    uids = client.search(['UID', f'1:{below_uid - 1}']) if below_uid > 1 else []
+    uids = [uid for uid in uids if uid < below_uid]
+    page_uids = uids[-count:]
+
+    messages = []
+    if page_uids:
+        fetched = client.fetch(page_uids, LIST_FETCH_ITEMS)
+        messages = [parse_header_record(uid, data) for uid, data in fetched.items()]
+    return {"uidvalidity_changed": False, "messages": messages, "complete": len(uids) <= count}
+
+def iter_message_parts(message, part_id: str = "") -> Iterator[Tuple[str, email.message.Message]]:
+    """遍历解析后的邮件，按 IMAP 的编号规则生成 (part 编号, 叶子 part)"""
+    if message.is_multipart():
+        for index, child in enumerate(message.get_payload(), start=1):
+            yield from iter_message_parts(child, f"{part_id}.{index}" if part_id else str(index))
+    else:
+        yield part_id or "1", message
+
+def _decode_part_text(part) -> str:
+    """按声明的字符集解码文本 part"""
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return payload.decode(charset, errors='replace')
+    except LookupError:
+        return payload.decode('utf-8', errors='replace')
+
+def parse_email_detail(uid: int, raw_message: bytes, internal_date: Optional[datetime] = None) -> Dict:
+    """解析完整邮件内容
+
+    Args:
+        uid: 邮件 UID
+        raw_message: 完整的 RFC822 邮件内容
+        internal_date: 服务器记录的邮件到达时间
+
+    Returns:
+        Dict: 邮件详情，包括正文和附件列表
+    """
+    email_message = email.message_from_bytes(raw_message)
+    text_parts, html_body, attachments = collect_message_parts(email_message)
+
+    from_addrs = format_header_addresses(email_message.get_all("from", []))
+    date = internal_date or datetime.utcnow()
+    return {
+        "id": str(uid),
+        "subject": decode_mime_header(email_message.get("subject")),
+        "from_addr": from_addrs[0] if from_addrs else "",
+        "to_addrs": format_header_addresses(email_message.get_all("to", [])),
+        "date": date.isoformat(),
+        "has_attachments": bool(attachments),
+        "text_body": "\n".join(text_parts) if text_parts else None,
+        "html_body": html_body,
+        "attachments": attachments,
+    }
+
+def collect_message_parts(message) -> Tuple[List[str], Optional[str], List[Dict]]:
+    """把邮件拆分成纯文本正文、HTML 正文和附件信息
+
+    Returns:
+        Tuple: (纯文本 part 列表, 第一个 HTML part, 附件列表)
+    """
+    text_parts = []
+    html_body = None
+    attachments = []
+    for part_id, part in iter_message_parts(message):
+        filename = part.get_filename()
+        if part.get('Content-Disposition') is not None and filename:
+            attachments.append({
+                "part": part_id,
+                "filename": decode_mime_header(filename),
+                "content_type": part.get_content_type(),
+                "size": len(part.get_payload(decode=True) or b""),
+            })
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/plain':
+            text_parts.append(_decode_part_text(part))
+        elif content_type == 'text/html' and html_body is None:
+            html_body = _decode_part_text(part)
+    return text_parts, html_body, attachments
+
+def fetch_raw_messages(client, folder: str, uidvalidity: Optional[int], uids: List[int]) -> Optional[Dict[int, bytes]]:
+    """下载多封邮件的完整内容（不设置 \\Seen 标记）
+
+    Args:
+        client: 已登录的 IMAPClient
+        folder: 文件夹
+        uidvalidity: 缓存对应的 UIDVALIDITY，不一致时不下载
+        uids: 邮件 UID 列表
+
+    Returns:
+        Optional[Dict[int, bytes]]: UID 到原始邮件内容的映射，UIDVALIDITY 变化时返回 None
+    """
+    info = client.select_folder(folder, readonly=True)
+    if uidvalidity is not None and info.get(b'UIDVALIDITY') != uidvalidity:
+        return None
+    if not uids:
+        return {}
+    fetched = client.fetch(uids, ['BODY.PEEK[]'])
+    return {uid: data[b'BODY[]'] for uid, data in fetched.items() if b'BODY[]' in data}
+
+def fetch_email_detail(email_binding, uid: int, folder: str = 'INBOX') -> Optional[Dict]:
+    """获取单封邮件的完整内容
+
+    Args:
+        email_binding: 邮箱绑定信息对象
+        uid: 邮件 UID
+        folder: 邮件所在的文件夹
+
+    Returns:
+        Optional[Dict]: 邮件详情，邮件不存在时返回 None
+    """
+    def _fetch(client) -> Optional[Dict]:
+        client.select_folder(folder, readonly=True)
+
+        messages = client.fetch([uid], DETAIL_FETCH_ITEMS)
+        message_data = messages.get(uid)
+        if not message_data or b'BODY[]' not in message_data:
+            return None
+
+        return parse_email_detail(uid, message_data[b'BODY[]'], message_data.get(b'INTERNALDATE'))
+
+    try:
+        return imap_pool.run(email_binding, _fetch)
+    except Exception as e:
+        logger.error(f"Error fetching email {uid}: {str(e)}", exc_info=True)
+        raise Exception(f"Failed to fetch email: {str(e)}")
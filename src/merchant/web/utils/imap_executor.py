@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class IMAPExecutor:
+    """在有界线程池中执行阻塞的 IMAP 操作
+
+    每个 IMAP 服务器的并发数单独限制，排队发生在事件循环上而不是
+    工作线程里，一个很慢的服务器最多占用 per_host_limit 个线程，
+    不会拖慢其他用户的请求。
+    """
+
+    def __init__(self, max_workers: int = 32, per_host_limit: int = 4):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="imap")
+        # asyncio.Semaphore 绑定在事件循环上，按循环分别保存
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}
+
+    async def run(self, host: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """在线程池中执行 func，同一服务器的并发数不超过 per_host_limit
+
+        调用方取消等待（例如超时）时，名额要等线程里的操作真正结束才释放。
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(host)
+        self._track(host, 1)
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self._track(host, -1)
+            raise
+
+        def _release(_):
+            self._track(host, -1)
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                # 事件循环已经关闭，信号量也不会再被使用
+                pass
+
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._track(host, -1)
+            semaphore.release()
+            raise
+        future.add_done_callback(_release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        """每个服务器正在执行和排队的操作数"""
+        with self._lock:
+            return dict(self._pending)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            if host not in semaphores:
+                semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+            return semaphores[host]
+
+    def _track(self, host: str, delta: int) -> None:
+        with self._lock:
+            count = self._pending.get(host, 0) + delta
+            if count:
+                self._pending[host] = count
+            else:
+                self._pending.pop(host, None)
@@ -0,0 +1,249 @@
+import imaplib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+import imapclient
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 连接已断开时抛出的异常，遇到这些异常时丢弃会话并重新连接
+ABORT_ERRORS = (imapclient.exceptions.IMAPClientAbortError, imaplib.IMAP4.abort, OSError)
+
+
+@dataclass(frozen=True)
+class IMAPAccount:
+    """邮箱绑定的连接信息，用普通对象在线程之间传递"""
+    id: int
+    email: str
+    password: str
+    imap_server: str
+    imap_port: int
+
+    @classmethod
+    def from_binding(cls, email_binding) -> "IMAPAccount":
+        return cls(
+            id=email_binding.id,
+            email=email_binding.email,
+            password=email_binding.password,
+            imap_server=email_binding.imap_server,
+            imap_port=email_binding.imap_port,
+        )
+
+
+def _credentials(email_binding) -> Tuple[str, str, str, int]:
+    """会话对应的登录信息，绑定信息变化后需要重新登录"""
+    return (
+        email_binding.email,
+        email_binding.password,
+        email_binding.imap_server,
+        email_binding.imap_port,
+    )
+
+
+def close_client(client) -> None:
+    """登出并关闭不再使用的 IMAP 连接，忽略连接已断开等错误"""
+    try:
+        client.logout()
+    except Exception as e:
+        logger.debug(f"Error closing IMAP connection: {e}")
+
+
+class _PooledSession:
+    """连接池中的一个 IMAP 会话"""
+
+    def __init__(self):
+        self.client = None
+        self.credentials = None
+        self.lock = threading.Lock()
+        self.in_use = False
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+        # 已从池中移除；借出中的会话在归还时关闭，避免留下无人管理的连接
+        self.removed = False
+
+
+class IMAPConnectionPool:
+    """按 EmailBinding.id 复用已登录的 IMAP 会话
+
+    同一个绑定同时只会有一个请求使用会话，其他请求排队等待。
+    空闲超过 idle_timeout 的会话会被关闭；复用空闲超过
+    health_check_interval 的会话前会先发送 NOOP 检查连接是否可用。
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        max_sessions: int = 50,
+        idle_timeout: float = 300,
+        health_check_interval: float = 30,
+    ):
+        self._connect = connect
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._sessions: "OrderedDict[int, _PooledSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def run(self, email_binding, operation: Callable[[imapclient.IMAPClient], T]) -> T:
+        """在池中的会话上执行操作，连接中断时自动重连并重试一次"""
+        for attempt in range(2):
+            try:
+                with self.session(email_binding) as client:
+                    return operation(client)
+            except ABORT_ERRORS as e:
+                # 超时说明服务器没有响应，重试只会让调用方再等一次
+                if attempt or isinstance(e, TimeoutError):
+                    raise
+                logger.warning(f"IMAP connection for binding {email_binding.id} aborted, reconnecting: {e}")
+
+    @contextmanager
+    def session(self, email_binding) -> Iterator[imapclient.IMAPClient]:
+        """借出绑定对应的已登录会话"""
+        self.evict_idle()
+        entry = self._checkout_entry(email_binding.id)
+        if entry is None:
+            # 所有会话都在使用中且已达上限，使用一次性连接
+            logger.debug(f"IMAP pool full, using unpooled connection for binding {email_binding.id}")
+            client = self._connect(email_binding)
+            try:
+                yield client
+            finally:
+                close_client(client)
+            return
+
+        with entry.lock:
+            entry.in_use = True
+            try:
+                client = self._ensure_client(entry, email_binding)
+                try:
+                    yield client
+                except ABORT_ERRORS:
+                    self._discard_client(entry)
+                    raise
+            finally:
+                entry.in_use = False
+                entry.last_used = time.monotonic()
+                if entry.removed:
+                    self._discard_client(entry)
+
+    def adopt(self, email_binding, client: imapclient.IMAPClient) -> None:
+        """把已登录的连接放入连接池"""
+        entry = self._checkout_entry(email_binding.id)
+        if entry is None:
+            close_client(client)
+            return
+        with entry.lock:
+            self._discard_client(entry)
+            if entry.removed:
+                close_client(client)
+                return
+            entry.client = client
+            entry.credentials = _credentials(email_binding)
+            entry.last_used = entry.last_checked = time.monotonic()
+
+    def evict(self, binding_id: int) -> None:
+        """关闭并移除绑定对应的会话（例如解绑邮箱时）"""
+        with self._lock:
+            entry = self._pop(binding_id)
+        if entry is not None:
+            with entry.lock:
+                self._discard_client(entry)
+
+    def evict_idle(self) -> None:
+        """关闭空闲超时的会话"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                binding_id
+                for binding_id, entry in self._sessions.items()
+                if not entry.in_use and now - entry.last_used > self.idle_timeout
+            ]
+            entries = [self._pop(binding_id) for binding_id in expired]
+        for entry in entries:
+            if entry.lock.acquire(blocking=False):
+                try:
+                    self._discard_client(entry)
+                finally:
+                    entry.lock.release()
+
+    def close_all(self) -> None:
+        """关闭所有会话"""
+        with self._lock:
+            entries = [self._pop(binding_id) for binding_id in list(self._sessions)]
+        for entry in entries:
+            with entry.lock:
+                self._discard_client(entry)
+
+    def stats(self) -> Dict[str, int]:
+        """连接池状态"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "in_use": sum(1 for entry in self._sessions.values() if entry.in_use),
+                "max_sessions": self.max_sessions,
+            }
+
+    def _checkout_entry(self, binding_id: int) -> Optional[_PooledSession]:
+        """取得绑定对应的池条目，必要时按 LRU 淘汰空闲会话"""
+        evicted = []
+        with self._lock:
+            entry = self._sessions.get(binding_id)
+            if entry is not None:
+                self._sessions.move_to_end(binding_id)
+                return entry
+            while len(self._sessions) >= self.max_sessions:
+                idle_id = next(
+                    (key for key, value in self._sessions.items() if not value.in_use and not value.lock.locked()),
+                    None,
+                )
+                if idle_id is None:
+                    return None
+                evicted.append(self._pop(idle_id))
+            entry = _PooledSession()
+            self._sessions[binding_id] = entry
+        for old in evicted:
+            if old.lock.acquire(blocking=False):
+                try:
+                    self._discard_client(old)
+                finally:
+                    old.lock.release()
+        return entry
+
+    def _pop(self, binding_id: int) -> Optional[_PooledSession]:
+        """从池中移除条目，调用方须持有 self._lock"""
+        entry = self._sessions.pop(binding_id, None)
+        if entry is not None:
+            entry.removed = True
+        return entry
+
+    def _ensure_client(self, entry: _PooledSession, email_binding) -> imapclient.IMAPClient:
+        """返回可用的会话，必要时重新登录"""
+        credentials = _credentials(email_binding)
+        if entry.client is not None and entry.credentials != credentials:
+            self._discard_client(entry)
+
+        if entry.client is not None and time.monotonic() - entry.last_checked > self.health_check_interval:
+            try:
+                entry.client.noop()
+                entry.last_checked = time.monotonic()
+            except Exception as e:
+                logger.info(f"IMAP session for binding {email_binding.id} failed health check: {e}")
+                self._discard_client(entry)
+
+        if entry.client is None:
+            entry.client = self._connect(email_binding)
+            entry.credentials = credentials
+            entry.last_checked = time.monotonic()
+        return entry.client
+
+    def _discard_client(self, entry: _PooledSession) -> None:
+        client, entry.client, entry.credentials = entry.client, None, None
+        if client is not None:
+            close_client(client)
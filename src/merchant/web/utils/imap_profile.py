@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional, Tuple
+import logging
+import os
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 服务器信息的缓存时间（秒），同一服务器的能力很少变化
+IMAP_PROFILE_TTL = float(os.getenv("IMAP_PROFILE_TTL", "86400"))
+
+# 要求登录后先发送 ID 命令才能选择文件夹的服务商（网易邮箱会返回 Unsafe Login）
+ID_REQUIRED_DOMAINS = tuple(
+    domain.strip().lower()
+    for domain in os.getenv("IMAP_ID_REQUIRED_DOMAINS", "163.com,126.com,yeah.net,188.com").split(",")
+    if domain.strip()
+)
+
+# RFC 6154 定义的特殊用途文件夹标记
+SPECIAL_USE_FLAGS = ("\\Sent", "\\Drafts", "\\Trash", "\\Junk", "\\Archive", "\\All", "\\Flagged")
+
+
+def _to_str(value) -> str:
+    return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else str(value)
+
+
+def requires_id(host: str) -> bool:
+    """服务器是否要求发送 ID 命令"""
+    host = host.lower()
+    return any(host == domain or host.endswith("." + domain) for domain in ID_REQUIRED_DOMAINS)
+
+
+@dataclass(frozen=True)
+class ServerProfile:
+    """一个 IMAP 服务器的能力和文件夹布局"""
+    host: str
+    capabilities: FrozenSet[str]
+    inbox: str = "INBOX"
+    special_folders: Dict[str, str] = field(default_factory=dict)  # 标记 -> 文件夹名，例如 "\\Sent" -> "已发送"
+    requires_id: bool = False
+
+    def supports(self, capability: str) -> bool:
+        return capability.upper() in self.capabilities
+
+    @property
+    def condstore(self) -> bool:
+        return self.supports("CONDSTORE")
+
+    @property
+    def idle(self) -> bool:
+        return self.supports("IDLE")
+
+    @property
+    def sort(self) -> bool:
+        return self.supports("SORT")
+
+
+def discover_profile(client) -> ServerProfile:
+    """用 CAPABILITY 和 LIST 获取服务器信息，需要已登录的客户端"""
+    capabilities = frozenset(_to_str(capability).upper() for capability in client.capabilities())
+    inbox = "INBOX"
+    special_folders = {}
+    for flags, _, name in client.list_folders():
+        name = _to_str(name)
+        if name.upper() == "INBOX":
+            inbox = name
+        for flag in flags:
+            flag = _to_str(flag)
+            for special in SPECIAL_USE_FLAGS:
+                if flag.lower() == special.lower():
+                    special_folders.setdefault(special, name)
+    return ServerProfile(
+        host=client.host,
+        capabilities=capabilities,
+        inbox=inbox,
+        special_folders=special_folders,
+        requires_id=requires_id(client.host),
+    )
+
+
+class ServerProfileCache:
+    """按 (服务器, 端口) 缓存 ServerProfile
+
+    每个服务器只在第一次连接或缓存过期后查询一次，之后的请求不再发送
+    CAPABILITY 和 LIST，直接按缓存的能力选择命令。
+    """
+
+    def __init__(self, ttl: float = IMAP_PROFILE_TTL):
+        self._cache: TTLCache[ServerProfile] = TTLCache(ttl=ttl, max_size=4096)
+
+    def get(self, host: str, port: int) -> Optional[ServerProfile]:
+        return self._cache.get(self._key(host, port))
+
+    def load(self, client) -> ServerProfile:
+        """返回客户端所连服务器的信息，未缓存时用这个客户端查询"""
+        key = self._key(client.host, client.port)
+        profile = self._cache.get(key)
+        if profile is None:
+            profile = discover_profile(client)
+            logger.debug(f"Discovered IMAP profile for {client.host}: {sorted(profile.capabilities)}")
+            self._cache.set(key, profile)
+        return profile
+
+    def invalidate(self, host: str, port: int) -> None:
+        self._cache.delete(self._key(host, port))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+    @staticmethod
+    def _key(host: str, port: int) -> Tuple[str, int]:
+        return host.lower(), port
+
+
+server_profiles = ServerProfileCache()
@@ -0,0 +1,163 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, func
+from sqlalchemy.dialects.sqlite import insert
+
+from ..models.base import engine
+from ..models.login_throttle import LoginBucket
+
+# 每个 IP 和每个账号允许连续尝试的次数，以及每分钟恢复的次数
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+LOGIN_ACCOUNT_BURST = int(os.getenv("LOGIN_ACCOUNT_BURST", "10"))
+LOGIN_ACCOUNT_PER_MINUTE = float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", "10"))
+# 设为 1 时令牌桶保存在数据库中，多个工作进程共用同一个限额
+LOGIN_THROTTLE_SHARED = os.getenv("LOGIN_THROTTLE_SHARED", "0") == "1"
+
+
+class MemoryBucketStore:
+    """进程内的令牌桶，超过 max_keys 时淘汰最久未使用的桶"""
+
+    name = "memory"
+    # 只操作内存，可以直接在事件循环中调用
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        """取一个令牌，成功时返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """保存在数据库中的令牌桶
+
+    补充和扣减在一条 INSERT ... ON CONFLICT 语句中完成，多个进程同时
+    登录时由 SQLite 的写锁保证不会多扣或少扣。
+    """
+
+    name = "sqlite"
+    # 每次都是一个写事务，等待写锁时最多阻塞 busy_timeout
+    blocking = True
+
+    def __init__(self, engine, prune_every: int = 1000):
+        self.engine = engine
+        self.prune_every = prune_every
+        self._calls = 0
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        stmt = insert(LoginBucket).values(key=key, tokens=capacity - 1, updated_at=now, allowed=True)
+        refilled = func.min(capacity, LoginBucket.tokens + (stmt.excluded.updated_at - LoginBucket.updated_at) * rate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LoginBucket.key],
+            set_={
+                "tokens": case((refilled >= 1, refilled - 1), else_=refilled),
+                "allowed": refilled >= 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(LoginBucket.tokens, LoginBucket.allowed)
+        with self.engine.begin() as connection:
+            tokens, allowed = connection.execute(stmt).one()
+            self._calls += 1
+            if self._calls % self.prune_every == 0:
+                # 已经补满的桶和不存在的桶等价，定期删除
+                connection.execute(delete(LoginBucket).where(LoginBucket.updated_at < now - capacity / rate))
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(LoginBucket))
+
+
+class LoginThrottle:
+    """按 IP 和账号限制登录尝试的频率
+
+    在查询数据库和验证密码之前调用，超过限额的请求直接拒绝，暴力破解
+    不会再消耗 bcrypt 的 CPU 时间。先检查 IP，IP 超限时不扣账号的令牌。
+    """
+
+    def __init__(
+        self,
+        store=None,
+        ip_burst: int = LOGIN_IP_BURST,
+        ip_per_minute: float = LOGIN_IP_PER_MINUTE,
+        account_burst: int = LOGIN_ACCOUNT_BURST,
+        account_per_minute: float = LOGIN_ACCOUNT_PER_MINUTE,
+        clock=time.time,
+    ):
+        self.store = store if store is not None else MemoryBucketStore()
+        self.ip_burst = ip_burst
+        self.ip_rate = ip_per_minute / 60
+        self.account_burst = account_burst
+        self.account_rate = account_per_minute / 60
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._rejected_ip = 0
+        self._rejected_account = 0
+
+    def check(self, ip: Optional[str], account: str) -> int:
+        """登录前调用，允许时返回 0，否则返回建议的 Retry-After 秒数"""
+        now = self.clock()
+        wait = self.store.take(f"ip:{ip or 'unknown'}", self.ip_burst, self.ip_rate, now)
+        if wait:
+            return self._reject("ip", wait)
+        wait = self.store.take(f"account:{account.strip().lower()}", self.account_burst, self.account_rate, now)
+        if wait:
+            return self._reject("account", wait)
+        with self._lock:
+            self._processed += 1
+        return 0
+
+    async def check_async(self, ip: Optional[str], account: str) -> int:
+        """在异步路由中调用的 check，需要访问数据库的令牌桶放到线程中执行，不阻塞事件循环"""
+        if self.store.blocking:
+            return await asyncio.to_thread(self.check, ip, account)
+        return self.check(ip, account)
+
+    def reset(self) -> None:
+        self.store.clear()
+        with self._lock:
+            self._processed = self._rejected_ip = self._rejected_account = 0
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "store": self.store.name,
+                "processed": self._processed,
+                "rejected": self._rejected_ip + self._rejected_account,
+                "rejected_ip": self._rejected_ip,
+                "rejected_account": self._rejected_account,
+            }
+
+    def _reject(self, scope: str, wait: float) -> int:
+        with self._lock:
+            if scope == "ip":
+                self._rejected_ip += 1
+            else:
+                self._rejected_account += 1
+        return max(1, math.ceil(wait))
+
+
+login_throttle = LoginThrottle(SQLiteBucketStore(engine) if LOGIN_THROTTLE_SHARED else MemoryBucketStore())
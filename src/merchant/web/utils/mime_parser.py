@@ -0,0 +1,166 @@
+import asyncio
+import email
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .email import collect_message_parts, decode_mime_header, format_header_addresses
+
+logger = logging.getLogger(__name__)
+
+# 预览文字长度，以及保存的正文文字上限（用于搜索）
+PREVIEW_LENGTH = 200
+BODY_TEXT_LIMIT = int(os.getenv("EMAIL_BODY_TEXT_LIMIT", "20000"))
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """提取 HTML 中的可见文字"""
+
+    SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in ("br", "p", "div", "tr", "li"):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """把 HTML 正文转成纯文本"""
+    extractor = _HTMLTextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        # 格式错误的 HTML 尽量保留已经解析出的文字
+        pass
+    return "".join(extractor.parts)
+
+
+def _parse_date(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        date = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is not None:
+        # 与 IMAPClient 返回的 INTERNALDATE 一致，使用本地时间
+        date = date.astimezone(tz=None).replace(tzinfo=None)
+    return date
+
+
+def parse_message_record(uid: int, raw_message: bytes) -> Dict:
+    """把原始邮件解析成入库用的精简记录
+
+    Args:
+        uid: 邮件 UID
+        raw_message: 完整的 RFC822 邮件内容
+
+    Returns:
+        Dict: 解码后的主题、发件人、日期、附件信息、预览和正文文字
+    """
+    message = email.message_from_bytes(raw_message)
+    text_parts, html_body, attachments = collect_message_parts(message)
+    text = "\n".join(text_parts) if text_parts else html_to_text(html_body or "")
+    text = text[:BODY_TEXT_LIMIT]
+
+    from_addrs = format_header_addresses(message.get_all("from", []))
+    return {
+        "uid": uid,
+        "message_id": str(message.get("message-id", "")).strip() or None,
+        "subject": decode_mime_header(message.get("subject")),
+        "from_addr": from_addrs[0] if from_addrs else "",
+        "date": _parse_date(message.get("date")),
+        "has_attachments": bool(attachments),
+        "attachments": [
+            {"filename": a["filename"], "content_type": a["content_type"], "size": a["size"]}
+            for a in attachments
+        ],
+        "preview": re.sub(r"\s+", " ", text[:PREVIEW_LENGTH * 4]).strip()[:PREVIEW_LENGTH],
+        "body_text": text,
+    }
+
+
+def parse_message_chunk(messages: List[Tuple[int, bytes]]) -> List[Dict]:
+    """解析一批邮件，单封邮件解析失败时返回只有 uid 和 error 的记录"""
+    records = []
+    for uid, raw_message in messages:
+        try:
+            records.append(parse_message_record(uid, raw_message))
+        except Exception as e:
+            logger.warning(f"Failed to parse message {uid}: {e}")
+            records.append({"uid": uid, "error": str(e)})
+    return records
+
+
+class MIMEParserPool:
+    """在进程池中批量解析邮件
+
+    邮件按 chunk_size 分批发送给工作进程，减少进程间通信的次数；
+    邮件数不足一批或 workers 不大于 1 时直接在当前线程解析。
+    工作进程用 spawn 方式启动，不继承应用中的线程和连接。
+    """
+
+    def __init__(self, workers: int = 2, chunk_size: int = 25):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def parse_many(self, messages: List[Tuple[int, bytes]]) -> List[Dict]:
+        """解析多封邮件，返回顺序与输入一致"""
+        if self.workers <= 1 or len(messages) <= self.chunk_size:
+            return parse_message_chunk(messages)
+
+        chunks = [messages[i:i + self.chunk_size] for i in range(0, len(messages), self.chunk_size)]
+        records = []
+        for chunk_records in self._get_executor().map(parse_message_chunk, chunks):
+            records.extend(chunk_records)
+        return records
+
+    async def parse_many_async(self, messages: List[Tuple[int, bytes]]) -> List[Dict]:
+        """在默认线程池中等待解析结果，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.parse_many, messages)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+
+mime_parser = MIMEParserPool(
+    workers=int(os.getenv("MIME_PARSER_WORKERS", str(os.cpu_count() or 1))),
+    chunk_size=int(os.getenv("MIME_PARSER_CHUNK_SIZE", "25")),
+)
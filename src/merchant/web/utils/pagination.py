@@ -0,0 +1,44 @@
+import base64
+import binascii
+import json
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析"""
+
+
+def encode_cursor(*values: Any) -> str:
+    """把排序键编码成不透明的游标字符串
+
+    Args:
+        values: 上一页最后一行的排序键，必须能被 JSON 序列化
+
+    Returns:
+        str: URL 安全的 base64 字符串
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析 encode_cursor 生成的游标
+
+    Args:
+        cursor: 游标字符串
+        size: 排序键的个数
+
+    Returns:
+        List[Any]: 排序键
+
+    Raises:
+        InvalidCursor: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
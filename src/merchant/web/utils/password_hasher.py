@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """排队的哈希任务已达上限"""
+
+
+class PasswordHasher:
+    """在专用线程池中执行 bcrypt 哈希和验证
+
+    bcrypt 每次要占用一两百毫秒 CPU，直接在 async 接口中调用会阻塞整个
+    事件循环。bcrypt 计算时会释放 GIL，放到线程池后其他请求可以继续处理。
+    排队的任务数有上限，登录洪峰时直接拒绝，而不是让排队时间无限增长。
+    """
+
+    def __init__(self, context, max_workers: int = 2, max_pending: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """验证密码；哈希使用的参数已过时（例如调高了轮数）时同时返回新哈希"""
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def stats(self) -> Dict[str, float]:
+        """工作线程数、正在执行和排队的任务数以及平均排队和执行时间"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds / self._completed * 1000, 2) if self._completed else 0.0,
+                "avg_run_ms": round(self._run_seconds / self._completed * 1000, 2) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy("Too many pending password hashes")
+            self._pending += 1
+            self._max_queued = max(self._max_queued, self._pending - self._running)
+        submitted = time.perf_counter()
+
+        def _call():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._wait_seconds += started - submitted
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._completed += 1
+                    self._run_seconds += time.perf_counter() - started
+
+        try:
+            future = self._executor.submit(_call)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        def _cancelled(done):
+            # 请求在排队时被取消，任务不会再执行
+            if done.cancelled():
+                with self._lock:
+                    self._pending -= 1
+
+        future.add_done_callback(_cancelled)
+        return await asyncio.wrap_future(future)
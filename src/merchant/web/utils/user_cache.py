@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from ..models.cache_version import bump_version, read_version
+from ..models.user import User
+from .ttl_cache import TTLCache
+
+# 缓存的用户信息的有效期（秒）和最多缓存的用户数
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+# 多久检查一次数据库中的版本号，也就是其他工作进程修改用户后本进程最长的延迟
+USER_CACHE_VERSION_INTERVAL = float(os.getenv("USER_CACHE_VERSION_INTERVAL", "1"))
+
+VERSION_NAME = "users"
+
+
+class UserCache:
+    """按令牌中的邮箱缓存已认证的用户
+
+    每个请求都要根据令牌查一次 users 表，缓存后大多数请求不再访问数据库。
+    通过 ORM 修改或删除用户时在同一事务中把 cache_versions 中的版本号加 1，
+    本进程提交后立即清空缓存，其他工作进程最多 version_interval 秒后发现
+    版本号变化并清空自己的缓存。
+    """
+
+    def __init__(
+        self,
+        ttl: float = USER_CACHE_TTL,
+        max_size: int = USER_CACHE_MAX_SIZE,
+        version_interval: float = USER_CACHE_VERSION_INTERVAL,
+    ):
+        self.version_interval = version_interval
+        self._cache: TTLCache[dict] = TTLCache(ttl, max_size)
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self.invalidations = 0
+
+    def get(self, db: Session, subject: str) -> Optional[User]:
+        """返回缓存的用户（已脱离会话，只能读取列属性），没有时返回 None"""
+        self._check_version(db)
+        snapshot = self._cache.get(subject)
+        if snapshot is None:
+            return None
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, subject: str, user: User) -> None:
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._cache.set(subject, snapshot)
+
+    def invalidate(self, subject: str) -> None:
+        self._cache.delete(subject)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._cache.stats(), "version": self._version or 0, "invalidations": self.invalidations}
+
+    def _check_version(self, db: Session) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.version_interval:
+                return
+            self._checked_at = now
+        version = read_version(db.connection(), VERSION_NAME)
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._cache.clear()
+                self._version = version
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_users_version(session, flush_context):
+    """修改或删除了用户时在同一事务中更新版本号"""
+    if any(isinstance(obj, User) for obj in (*session.dirty, *session.deleted)):
+        bump_version(session.connection(), VERSION_NAME)
+        session.info["user_cache_stale"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session):
+    if session.info.pop("user_cache_stale", False):
+        user_cache.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("user_cache_stale", None)
@@ -8,6 +8,10 @@ from sqlalchemy.pool import StaticPool
 
 # 设置测试环境变量
 os.environ["TESTING"] = "1"
+# 测试中用最低的 bcrypt 轮数，避免每次哈希都要几百毫秒
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# 测试直接修改数据库中的用户，每个请求都检查用户缓存的版本号
+os.environ.setdefault("USER_CACHE_VERSION_INTERVAL", "0")
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -155,4 +159,57 @@ def test_db():
 
 @pytest.fixture(scope="session")
 def test_engine():
-    return engine 
\ No newline at end of file
+    return engine 
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """每个测试重建的数据库和模拟服务器不同，清空进程内的缓存"""
+    from src.merchant.web.services.customer_linker import customer_index
+    from src.merchant.web.utils.imap_profile import server_profiles
+    from merchant.web.services.customer_linker import customer_index as app_customer_index
+    from merchant.web.utils.imap_profile import server_profiles as app_server_profiles
+    from src.merchant.web.utils.user_cache import user_cache
+    from merchant.web.utils.user_cache import user_cache as app_user_cache
+    from src.merchant.web.utils.login_throttle import login_throttle
+    from merchant.web.utils.login_throttle import login_throttle as app_login_throttle
+    for cache in (customer_index, app_customer_index):
+        cache.invalidate()
+    for cache in (server_profiles, app_server_profiles, user_cache, app_user_cache):
+        cache.clear()
+    for throttle in (login_throttle, app_login_throttle):
+        throttle.reset()
+    yield
+
+@pytest.fixture(scope="session")
+def imap_test_server():
+    """整个测试会话共用的本地 IMAP 服务器"""
+    from imap_server import IMAPTestServer
+    with IMAPTestServer(messages=30, attachment_ratio=0.3, attachment_size=20_000) as server:
+        yield server
+
+@pytest.fixture
+def imap_server(imap_test_server, monkeypatch):
+    """本地 IMAP 服务器，客户端信任它的自签名证书，测试结束后关闭连接池中的连接"""
+    from src.merchant.web.utils import email as email_utils
+    from merchant.web.utils import email as app_email_utils
+    context = imap_test_server.client_ssl_context()
+    for module in (email_utils, app_email_utils):
+        monkeypatch.setattr(module, "imap_ssl_context", context)
+    yield imap_test_server
+    for module in (email_utils, app_email_utils):
+        module.imap_pool.close_all()
+
+@pytest.fixture
+def local_email_binding(db, test_user, imap_server):
+    """指向本地 IMAP 服务器的邮箱绑定"""
+    binding = EmailBinding(
+        user_id=test_user.id,
+        email="buyer@example.org",
+        password="secret",
+        imap_server=imap_server.host,
+        imap_port=imap_server.port
+    )
+    db.add(binding)
+    db.commit()
+    db.refresh(binding)
+    return binding
@@ -0,0 +1,115 @@
+import base64
+import quopri
+
+import pytest
+from imapclient.response_parser import parse_fetch_response
+
+from src.merchant.web.routes import email as email_routes
+from src.merchant.web.models.user import User
+from src.merchant.web.utils.attachments import AttachmentCache, iter_attachment, transfer_decoder
+from src.merchant.web.utils.auth import create_access_token
+from src.merchant.web.utils.email import imap_pool
+
+PAYLOAD = bytes(range(256)) * 40
+
+
+class FakePartClient:
+    """只实现附件下载所需命令的模拟 IMAP 客户端"""
+
+    def __init__(self):
+        self.encoded = base64.encodebytes(PAYLOAD)
+        self.chunk_fetches = 0
+
+    def select_folder(self, folder, readonly=False):
+        return {b'UIDVALIDITY': 7}
+
+    def fetch(self, uids, items):
+        uid = uids[0]
+        if items == ['BODYSTRUCTURE']:
+            line = (
+                b'1 (UID %d BODYSTRUCTURE (("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 5 1 NIL NIL NIL NIL)'
+                b'("application" "pdf" ("name" "report.pdf") NIL NIL "base64" %d NIL '
+                b'("attachment" ("filename" "report.pdf")) NIL NIL) "mixed" ("boundary" "x") NIL NIL NIL))'
+                % (uid, len(self.encoded))
+            )
+            return parse_fetch_response([line], True, True)
+        section, partial = items[0][len('BODY.PEEK['):].split(']')
+        offset, size = (int(value) for value in partial.strip('<>').split('.'))
+        self.chunk_fetches += 1
+        return {uid: {b'BODY[%s]<%d>' % (section.encode(), offset): self.encoded[offset:offset + size]}}
+
+
+@pytest.fixture
+def part_client(monkeypatch):
+    client = FakePartClient()
+    monkeypatch.setattr(imap_pool, "run", lambda binding, operation: operation(client))
+    return client
+
+
+@pytest.mark.parametrize("encoding,encode", [
+    ("base64", base64.encodebytes),
+    ("quoted-printable", quopri.encodestring),
+])
+def test_transfer_decoder_handles_split_input(encoding, encode):
+    """测试分段解码的结果与一次性解码相同，与切分位置无关"""
+    encoded = encode(PAYLOAD)
+    for step in (1, 3, 77, 1000):
+        decoder = transfer_decoder(encoding)
+        decoded = b"".join(decoder.feed(encoded[i:i + step]) for i in range(0, len(encoded), step))
+        assert decoded + decoder.flush() == PAYLOAD
+
+
+async def test_iter_attachment_fetches_in_chunks(test_email_binding, part_client):
+    """测试按块读取并解码附件"""
+    info = {"part": "2", "encoding": "base64", "uidvalidity": 7}
+    chunks = [chunk async for chunk in iter_attachment(test_email_binding, "INBOX", 5, info, chunk_size=1000)]
+
+    assert b"".join(chunks) == PAYLOAD
+    assert part_client.chunk_fetches == len(part_client.encoded) // 1000 + 1
+    assert max(len(chunk) for chunk in chunks) <= 1000
+
+
+def test_download_endpoint_uses_cache(client, db, test_email_binding, part_client, monkeypatch, tmp_path):
+    """测试下载接口返回解码后的附件，再次下载时从磁盘缓存读取"""
+    monkeypatch.setattr(email_routes, "attachment_cache", AttachmentCache(str(tmp_path)))
+    user = db.query(User).get(test_email_binding.user_id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+    url = f"/api/email/{test_email_binding.id}/messages/5/attachments/2"
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.content == PAYLOAD
+    assert response.headers["content-type"] == "application/pdf"
+    assert "report.pdf" in response.headers["content-disposition"]
+
+    fetches = part_client.chunk_fetches
+    response = client.get(url, headers=headers)
+    assert response.content == PAYLOAD
+    assert part_client.chunk_fetches == fetches
+
+    assert client.get(f"/api/email/{test_email_binding.id}/messages/5/attachments/9", headers=headers).status_code == 404
+    assert client.get(f"/api/email/{test_email_binding.id}/messages/5/attachments/x", headers=headers).status_code == 422
+
+
+def test_cache_prunes_only_when_over_limit(tmp_path, monkeypatch):
+    """测试只在累计大小超过上限时扫描目录并删除最久未使用的文件"""
+    cache = AttachmentCache(str(tmp_path), max_bytes=250)
+    scans = []
+    prune = cache._prune
+    monkeypatch.setattr(cache, "_prune", lambda: scans.append(1) or prune())
+
+    def store(name, data):
+        writer = cache.writer(name)
+        writer.write(data)
+        writer.commit()
+
+    store("a", b"a" * 100)
+    store("b", b"b" * 100)
+    store("b-copy", b"b" * 100)
+    assert len(scans) == 1
+    assert cache.lookup("a") and cache.lookup("b-copy")
+
+    store("c", b"c" * 100)
+    assert len(scans) == 2
+    assert cache.lookup("a") is None
+    assert cache.lookup("b") and cache.lookup("c")
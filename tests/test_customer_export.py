@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from src.merchant.web.models.customer import Customer, CustomerInteraction
+from src.merchant.web.models.user import User
+from src.merchant.web.services.customer_export import (
+    CSVEncoder, ParquetEncoder, RowEncoder, customer_export_query, encode_stream, iter_batches
+)
+from src.merchant.web.utils.auth import create_access_token
+
+
+def auth_header(user):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+
+def add_customers(db, user, count):
+    db.add_all(
+        Customer(full_name=f"客户 {i}", email=f"c{i}@example.com", company="Acme, Inc", position="Buyer",
+                 status="potential", notes="line one\nline two", created_by=user.id)
+        for i in range(count)
+    )
+    db.commit()
+
+
+def test_csv_export(client, db, test_user):
+    add_customers(db, test_user, 5)
+    response = client.get("/api/customers/export", headers=auth_header(test_user))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="customers.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [row["email"] for row in rows] == [f"c{i}@example.com" for i in range(5)]
+    assert rows[0]["company"] == "Acme, Inc" and rows[0]["notes"] == "line one\nline two"
+    assert "T" in rows[0]["created_at"]
+
+
+def test_csv_export_neutralizes_formulas(client, db, test_user):
+    """测试以公式字符开头的文本加上 ' 前缀，其他格式保持原样"""
+    db.add(Customer(full_name="=HYPERLINK(\"http://evil\")", email="f@example.com", company="+Acme", position="-",
+                    phone="+86 138", notes="@SUM(A1)", created_by=test_user.id))
+    db.commit()
+    response = client.get("/api/customers/export", headers=auth_header(test_user))
+    [row] = csv.DictReader(io.StringIO(response.content.decode("utf-8-sig")))
+    assert row["full_name"] == "'=HYPERLINK(\"http://evil\")"
+    assert (row["company"], row["position"], row["phone"], row["notes"]) == ("'+Acme", "'-", "'+86 138", "'@SUM(A1)")
+    assert row["email"] == "f@example.com"
+
+    response = client.get("/api/customers/export", params={"format": "ndjson"}, headers=auth_header(test_user))
+    assert json.loads(response.content)["company"] == "+Acme"
+
+
+def test_ndjson_export_is_scoped_and_filtered(client, db, test_user, superuser_token):
+    add_customers(db, test_user, 3)
+    db.query(Customer).filter(Customer.email == "c0@example.com").update({"status": "active"})
+    db.commit()
+
+    response = client.get("/api/customers/export", params={"format": "ndjson"}, headers=auth_header(test_user))
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 3 and records[0]["full_name"] == "客户 0"
+
+    response = client.get(
+        "/api/customers/export", params={"format": "ndjson", "status": "active"},
+        headers={"Authorization": f"Bearer {superuser_token}"}
+    )
+    assert [json.loads(line)["email"] for line in response.text.splitlines()] == ["c0@example.com"]
+
+
+def test_interaction_export(client, db, test_user):
+    add_customers(db, test_user, 1)
+    customer = db.query(Customer).one()
+    db.add_all(
+        CustomerInteraction(customer_id=customer.id, user_id=test_user.id, interaction_type="email", content=f"#{i}")
+        for i in range(3)
+    )
+    db.commit()
+    response = client.get(
+        f"/api/customers/{customer.id}/interactions/export", params={"format": "ndjson"}, headers=auth_header(test_user)
+    )
+    assert [json.loads(line)["content"] for line in response.text.splitlines()] == ["#0", "#1", "#2"]
+    assert client.get("/api/customers/999/interactions/export", headers=auth_header(test_user)).status_code == 404
+
+
+def test_interaction_export_is_scoped_to_owner(client, db, test_user, superuser_token):
+    other = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other)
+    db.commit()
+    add_customers(db, other, 1)
+    customer = db.query(Customer).one()
+    path = f"/api/customers/{customer.id}/interactions/export"
+
+    assert client.get(path, headers=auth_header(test_user)).status_code == 403
+    assert client.get(path, headers={"Authorization": f"Bearer {superuser_token}"}).status_code == 200
+
+
+def test_parquet_export(client, db, test_user):
+    pq = pytest.importorskip("pyarrow.parquet")
+    add_customers(db, test_user, 3)
+    response = client.get("/api/customers/export", params={"format": "parquet"}, headers=auth_header(test_user))
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("email").to_pylist() == [f"c{i}@example.com" for i in range(3)]
+
+
+def test_parquet_export_spans_batches(db, test_user, test_engine):
+    """测试多个 row group，且第一批中全为空的列在之后的批次中有值"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    add_customers(db, test_user, 5)
+    db.query(Customer).filter(Customer.id <= 2).update({"notes": None, "phone": None})
+    db.query(Customer).filter(Customer.id > 2).update({"phone": "+86 138"})
+    db.commit()
+
+    stmt = customer_export_query()
+    data = b"".join(encode_stream(ParquetEncoder(stmt.selected_columns), iter_batches(test_engine, stmt, 2)))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("phone").to_pylist() == [None, None, "+86 138", "+86 138", "+86 138"]
+    assert str(table.schema.field("id").type) == "int64"
+    assert str(table.schema.field("created_at").type) == "timestamp[us]"
+
+
+def test_parquet_export_without_rows(client, test_user):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/customers/export", params={"format": "parquet"}, headers=auth_header(test_user))
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 0 and "email" in table.column_names
+
+
+def test_encoder_must_implement_encode():
+    class Incomplete(RowEncoder):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(customer_export_query().selected_columns)
+
+
+def test_export_memory_is_bounded_by_batch_size(db, test_user, test_engine):
+    """测试导出占用的内存只和每批的行数有关，和总行数无关"""
+    add_customers(db, test_user, 3000)
+    stmt = customer_export_query()
+
+    def peak(batch_size):
+        tracemalloc.start()
+        size = sum(len(chunk) for chunk in encode_stream(CSVEncoder(stmt.selected_columns), iter_batches(test_engine, stmt, batch_size)))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, peak
+
+    peak(100)  # 预热语句缓存
+    total, small = peak(100)
+    _, large = peak(3000)
+    assert total > 300_000
+    assert small * 4 < large
@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from src.merchant.web.models.customer import Customer, CustomerHistorySummary, CustomerInteraction
+from src.merchant.web.services import customer_history
+from src.merchant.web.services.agent_service import AgentService
+from src.merchant.web.services.customer_history import (
+    estimate_tokens, load_customer_history, load_recent_interactions, truncate_to_tokens
+)
+
+
+def add_customer(db, user):
+    customer = Customer(email="a@example.com", full_name="Alice", company="Acme", position="Buyer",
+                        status="active", created_by=user.id)
+    db.add(customer)
+    db.commit()
+    return customer
+
+
+def add_interactions(db, customer, count, start=0, content="call #{i}"):
+    base = datetime(2024, 1, 1)
+    db.add_all(
+        CustomerInteraction(customer_id=customer.id, interaction_type="call" if i % 3 else "email",
+                            content=content.format(i=i), created_at=base + timedelta(hours=i))
+        for i in range(start, start + count)
+    )
+    db.commit()
+
+
+def test_estimate_and_truncate_tokens():
+    assert estimate_tokens("季度报告") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    truncated = truncate_to_tokens("word " * 100, 10)
+    assert truncated.endswith("…") and estimate_tokens(truncated) <= 11
+
+
+def test_recent_window_is_bounded_by_count_and_budget(db, test_user):
+    customer = add_customer(db, test_user)
+    add_interactions(db, customer, 30)
+
+    items, boundary = load_recent_interactions(db, customer.id, window=5, token_budget=1000)
+    assert [item["content"] for item in items] == ["call #29", "call #28", "call #27", "call #26", "call #25"]
+    assert boundary[1] == 26  # 第 26 条记录的 id
+
+    items, _ = load_recent_interactions(db, customer.id, window=5, token_budget=40)
+    assert len(items) == 2
+
+    add_interactions(db, customer, 1, start=30, content="x" * 4000)
+    items, _ = load_recent_interactions(db, customer.id, window=5, token_budget=100)
+    assert len(items) == 1 and items[0]["content"].endswith("…")
+
+
+def test_summary_is_updated_incrementally(db, test_user, test_engine, monkeypatch):
+    customer = add_customer(db, test_user)
+    add_interactions(db, customer, 25)
+
+    history = load_customer_history(db, customer.id, window=10, token_budget=1000)
+    assert len(history["recent"]) == 10
+    assert history["summary"].startswith("较早的 15 条互动（2024-01-01 至 2024-01-01）")
+    assert "call #14" in history["summary"] and "call #9" not in history["summary"]
+    stored = db.get(CustomerHistorySummary, customer.id)
+    assert json.loads(stored.state)["count"] == 15 and stored.through_id == 15
+
+    # 之后每次只读取新移出窗口的记录
+    add_interactions(db, customer, 3, start=25)
+    folded = []
+    monkeypatch.setattr(customer_history, "fold_summary", lambda state, rows: folded.append(len(rows)) or state)
+    load_customer_history(db, customer.id, window=10, token_budget=1000)
+    assert folded == [3]
+
+
+def test_history_query_uses_customer_index(db, test_user):
+    customer = add_customer(db, test_user)
+    add_interactions(db, customer, 3)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM customer_interactions" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.get_bind(), "before_cursor_execute", capture)
+    try:
+        load_customer_history(db, customer.id)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", capture)
+    assert statements
+    for statement, parameters in statements:
+        plan = " ".join(row[-1] for row in db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+        assert "ix_customer_interactions_customer_id_created_at" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_agent_service_returns_summary_and_recent(db, test_user):
+    customer = add_customer(db, test_user)
+    add_interactions(db, customer, 3)
+    history = AgentService(db)._get_customer_history(customer.id)
+    assert history["summary"] is None
+    assert [item["content"] for item in history["recent"]] == ["call #2", "call #1", "call #0"]
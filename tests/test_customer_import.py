@@ -0,0 +1,108 @@
+import json
+
+from src.merchant.web.models.base import SyncSessionAdapter
+from src.merchant.web.models.customer import Customer
+from src.merchant.web.services.customer_import import CustomerImporter
+from src.merchant.web.utils.auth import create_access_token
+
+
+def auth_header(user, content_type):
+    return {
+        "Authorization": f"Bearer {create_access_token(data={'sub': user.email})}",
+        "Content-Type": content_type,
+    }
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_csv_import_reports_bad_rows(client, db, test_user):
+    db.add(Customer(email="taken@example.com", full_name="Taken", company="Acme", position="CEO", created_by=test_user.id))
+    db.commit()
+    body = (
+        "\ufeffemail,full_name,company,position,notes\r\n"
+        "a@example.com,Alice,Acme,Buyer,\"line one\nline two\"\r\n"
+        "not-an-email,Bob,Acme,Buyer,\r\n"
+        "c@example.com,Carol,,Buyer,\r\n"
+        "a@example.com,Alice Again,Acme,Buyer,\r\n"
+        "taken@example.com,Taken,Acme,CEO,\r\n"
+        "d@example.com,Dave,Acme\r\n"
+        "e@example.com,Eve,Globex,CTO,\r\n"
+    )
+    response = client.post("/api/customers/bulk", content=body.encode(), headers=auth_header(test_user, "text/csv"))
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (7, 2, 5)
+    assert {error["row"]: error["error"].split(":")[0] for error in report["errors"]} == {
+        2: "email", 3: "company", 4: "Duplicate of row 1", 5: "Email already registered", 6: "Expected 5 columns, got 3",
+    }
+    alice = db.query(Customer).filter(Customer.email == "a@example.com").one()
+    assert alice.notes == "line one\nline two"
+    assert alice.status == "potential" and alice.created_by == test_user.id
+
+
+def test_ndjson_import(client, db, test_user):
+    lines = [
+        json.dumps({"email": "a@example.com", "full_name": "Alice", "company": "Acme", "position": "Buyer"}),
+        "{not json",
+        "[1, 2]",
+        "",
+        json.dumps({"email": "b@example.com", "full_name": "Bob", "company": "Acme", "position": "Buyer"}),
+    ]
+    response = client.post(
+        "/api/customers/bulk", content="\n".join(lines).encode(), headers=auth_header(test_user, "application/x-ndjson")
+    )
+    report = response.json()
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+    assert db.query(Customer).count() == 2
+
+
+def test_unsupported_content_type(client, test_user):
+    response = client.post("/api/customers/bulk", content=b"{}", headers=auth_header(test_user, "application/json"))
+    assert response.status_code == 415
+
+
+async def test_chunks_split_across_reads(db, test_user):
+    """测试读取边界落在多字节字符和引号字段中间时仍然正确解析，并按批次写入"""
+    rows = "".join(f"c{i}@example.com,客户 {i},\"Acme, Inc\",Buyer\n" for i in range(25))
+    data = ("email,full_name,company,position\n" + rows).encode()
+    importer = CustomerImporter(test_user.id, chunk_size=4)
+    report = await importer.run(SyncSessionAdapter(db), chunked(data, 7), "csv")
+    assert (report["processed"], report["inserted"], report["failed"]) == (25, 25, 0)
+    assert db.query(Customer).filter(Customer.company == "Acme, Inc").count() == 25
+    assert db.query(Customer).filter(Customer.full_name == "客户 24").count() == 1
+
+
+def test_retry_reports_existing_emails_once(db, test_user):
+    """并发插入导致重试时，已存在的邮箱只记一次错误；邮箱比较不区分大小写"""
+    class RacingImporter(CustomerImporter):
+        raced = False
+
+        def _insert(self, db, valid):
+            if not self.raced:
+                # 模拟另一个请求在查询已存在邮箱之后抢先写入
+                self.raced = True
+                db.add(Customer(email="race@example.com", full_name="Race", created_by=test_user.id))
+                db.commit()
+            return super()._insert(db, valid)
+
+    db.add(Customer(email="taken@example.com", full_name="Taken", created_by=test_user.id))
+    db.commit()
+    importer = RacingImporter(test_user.id)
+    chunk = [
+        (1, {"email": "TAKEN@example.com", "full_name": "A", "company": "Acme", "position": "Buyer"}),
+        (2, {"email": "race@example.com", "full_name": "B", "company": "Acme", "position": "Buyer"}),
+        (3, {"email": "new@example.com", "full_name": "C", "company": "Acme", "position": "Buyer"}),
+        (4, {"email": "New@example.com", "full_name": "D", "company": "Acme", "position": "Buyer"}),
+    ]
+    assert importer.import_chunk(db, chunk) == 1
+    assert importer.report()["errors"] == [
+        {"row": 4, "email": "New@example.com", "error": "Duplicate of row 3"},
+        {"row": 1, "email": "TAKEN@example.com", "error": "Email already registered"},
+        {"row": 2, "email": "race@example.com", "error": "Email already registered"},
+    ]
+    assert importer.error_count == 3
+    assert db.query(Customer).count() == 3
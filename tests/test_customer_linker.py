@@ -0,0 +1,110 @@
+from datetime import datetime
+
+from src.merchant.web.models.customer import Customer, CustomerEmailLink, CustomerInteraction
+from src.merchant.web.models.email import EmailBinding, EmailMessage
+from src.merchant.web.models.user import User
+from src.merchant.web.services.customer_linker import CustomerLinker, normalize_addresses
+from src.merchant.web.services.email_sync import EmailSyncService
+
+from test_email_sync import fake_client  # noqa: F401
+
+
+def add_customer(db, email, owner):
+    customer = Customer(
+        email=email, full_name=email.split("@")[0], company="Acme", position="Buyer", status="potential", created_by=owner.id
+    )
+    db.add(customer)
+    db.commit()
+    return customer
+
+
+def add_message(db, binding, uid, from_addr, to_addrs, message_id=None):
+    message = EmailMessage(
+        binding_id=binding.id,
+        uid=uid,
+        message_id=message_id or f"<{uid}@example.com>",
+        subject=f"subject {uid}",
+        from_addr=from_addr,
+        to_addrs=to_addrs,
+        date=datetime(2024, 7, uid),
+    )
+    db.add(message)
+    db.commit()
+    return message
+
+
+def test_normalize_addresses():
+    """测试提取地址时去掉显示名、统一小写并去重"""
+    assert normalize_addresses('"Li, Lei" <Li.Lei@Acme.CN>', "bob@example.org\nli.lei@acme.cn") == [
+        "li.lei@acme.cn", "bob@example.org"
+    ]
+
+
+def test_link_matches_addresses_and_company_domains(db, test_user, test_email_binding):
+    """测试地址完全匹配优先，其次按公司域名匹配，公共邮箱不按域名匹配"""
+    buyer = add_customer(db, "Buyer@Acme.cn", test_user)
+    colleague = add_customer(db, "sales@acme.cn", test_user)
+    add_customer(db, "someone@gmail.com", test_user)
+    messages = [
+        add_message(db, test_email_binding, 1, "Buyer <buyer@acme.cn>", "test@example.com"),
+        add_message(db, test_email_binding, 2, "test@example.com", "ceo@acme.cn"),
+        add_message(db, test_email_binding, 3, "other@gmail.com", "test@example.com"),
+    ]
+
+    assert CustomerLinker(db).link(test_email_binding.id, messages) == 3
+
+    interactions = db.query(CustomerInteraction).order_by(CustomerInteraction.customer_id, CustomerInteraction.id).all()
+    assert [(i.customer_id, i.content) for i in interactions] == [
+        (buyer.id, "收到邮件：subject 1"),
+        (buyer.id, "发出邮件：subject 2"),
+        (colleague.id, "发出邮件：subject 2"),
+    ]
+    assert all(i.interaction_type == "email" and i.user_id == test_email_binding.user_id for i in interactions)
+
+
+def test_link_deduplicates_on_message_id(db, test_user, test_email_binding):
+    """测试同一封邮件在多个邮箱中出现或重复关联时只记录一次"""
+    add_customer(db, "buyer@acme.cn", test_user)
+    second = EmailBinding(user_id=test_user.id, email="second@example.com", password="x")
+    db.add(second)
+    db.commit()
+    first_copy = add_message(db, test_email_binding, 1, "buyer@acme.cn", "test@example.com", "<shared@acme.cn>")
+    second_copy = add_message(db, second, 1, "buyer@acme.cn", "second@example.com", "<shared@acme.cn>")
+
+    linker = CustomerLinker(db)
+    assert linker.link(test_email_binding.id, [first_copy]) == 1
+    assert linker.link(second.id, [second_copy]) == 0
+    assert linker.link_cached(test_email_binding.id) == 0
+    assert db.query(CustomerEmailLink).count() == 1
+
+
+async def test_sync_links_new_messages(db, test_user, test_email_binding, fake_client):  # noqa: F811
+    """测试同步新邮件时自动写入客户互动"""
+    customer = add_customer(db, "alice@example.com", test_user)
+    fake_client.add(1, "询价")
+    fake_client.add(2, "报价单")
+
+    await EmailSyncService(db).sync_folder(test_email_binding)
+
+    contents = [i.content for i in db.query(CustomerInteraction).filter_by(customer_id=customer.id).order_by(CustomerInteraction.created_at)]
+    assert contents == ["收到邮件：询价", "收到邮件：报价单"]
+
+
+def test_link_only_matches_binding_owners_customers(db, test_user, test_email_binding):
+    """测试邮件只关联到绑定所属用户的客户，其他用户相同地址或域名的客户不受影响"""
+    other = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other)
+    db.commit()
+    own = add_customer(db, "buyer@acme.cn", test_user)
+    add_customer(db, "buyer@acme.cn".upper(), other)
+    add_customer(db, "sales@acme.cn", other)
+    messages = [
+        add_message(db, test_email_binding, 1, "buyer@acme.cn", "test@example.com"),
+        add_message(db, test_email_binding, 2, "ceo@acme.cn", "test@example.com"),
+    ]
+
+    assert CustomerLinker(db).link(test_email_binding.id, messages) == 2
+    assert [(i.customer_id, i.content) for i in db.query(CustomerInteraction).order_by(CustomerInteraction.id)] == [
+        (own.id, "收到邮件：subject 1"),
+        (own.id, "收到邮件：subject 2"),
+    ]
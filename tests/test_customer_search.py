@@ -0,0 +1,110 @@
+import pytest
+
+from src.merchant.web.models.customer import Customer
+from src.merchant.web.models.customer_search import search_terms
+from src.merchant.web.models.user import User
+from src.merchant.web.services import customer_search
+from src.merchant.web.services.customer_search import build_fuzzy_query, search_customers
+from src.merchant.web.utils.auth import create_access_token
+
+
+def add_customer(db, user, email, full_name, company, position="Buyer", notes=None):
+    customer = Customer(email=email, full_name=full_name, company=company, position=position,
+                        notes=notes, status="potential", created_by=user.id)
+    db.add(customer)
+    db.commit()
+    return customer
+
+
+def names(hits):
+    return [(customer.full_name, match) for customer, match in hits]
+
+
+def test_fuzzy_query_replaces_words_with_known_terms(db, test_user):
+    add_customer(db, test_user, "a@example.com", "Jonathan Smith", "Acme Trading")
+    assert build_fuzzy_query(db, "Jonatan tradng 华为") == '("Jonatan"* OR "jonathan") AND ("tradng"* OR "trading") AND "华为"'
+    assert build_fuzzy_query(db, "smith") == ""
+
+
+def test_prefix_search_and_ranking(db, test_user):
+    """测试词前缀匹配、中文子串匹配，以及姓名命中排在备注命中之前"""
+    add_customer(db, test_user, "a@example.com", "Alice Walker", "Globex", notes="met at the walkthrough")
+    add_customer(db, test_user, "b@example.com", "Bob Stone", "Initech", notes="referred by Alice")
+    add_customer(db, test_user, "c@example.com", "张伟", "华为技术有限公司", position="采购经理")
+
+    assert names(search_customers(db, "ali")) == [("Alice Walker", "prefix"), ("Bob Stone", "prefix")]
+    assert names(search_customers(db, "walk")) == [("Alice Walker", "prefix")]
+    assert names(search_customers(db, "华为技术")) == [("张伟", "prefix")]
+    assert names(search_customers(db, "采购")) == [("张伟", "prefix")]
+
+
+def test_rank_limit_counts_only_own_customers(db, test_user, monkeypatch):
+    """测试其他用户的大量匹配不会让当前用户的结果退回按 id 倒序"""
+    monkeypatch.setattr(customer_search, "RANK_LIMIT", 2)
+    other = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other)
+    db.commit()
+    add_customer(db, test_user, "a@example.com", "Alice Walker", "Globex")
+    add_customer(db, test_user, "b@example.com", "Bob Stone", "Initech", notes="referred by Alice")
+    for i in range(3):
+        add_customer(db, other, f"o{i}@example.com", f"Alice {i}", "Umbrella")
+
+    hits = search_customers(db, "alice", owner_id=test_user.id)
+    assert names(hits) == [("Alice Walker", "prefix"), ("Bob Stone", "prefix")]
+
+
+def test_fuzzy_search_tolerates_typos(db, test_user):
+    add_customer(db, test_user, "a@example.com", "Jonathan Smith", "Acme Trading")
+    add_customer(db, test_user, "b@example.com", "Maria Garcia", "Umbrella Corp")
+
+    assert names(search_customers(db, "Jonatan")) == [("Jonathan Smith", "fuzzy")]
+    assert names(search_customers(db, "umbrela")) == [("Maria Garcia", "fuzzy")]
+    assert search_customers(db, "zzzzzz") == []
+
+
+def test_index_follows_updates_and_deletes(db, test_user):
+    customer = add_customer(db, test_user, "a@example.com", "Alice Walker", "Globex")
+    customer.company = "Hooli"
+    db.commit()
+    assert search_customers(db, "globex") == []
+    assert names(search_customers(db, "hooli")) == [("Alice Walker", "prefix")]
+
+    db.delete(customer)
+    db.commit()
+    assert search_customers(db, "hooli") == []
+    assert search_customers(db, "hooly") == []
+
+
+def test_search_route_scopes_to_owner(client, db, test_user, superuser_token):
+    other = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other)
+    db.commit()
+    add_customer(db, test_user, "a@example.com", "Alice Walker", "Globex")
+    add_customer(db, other, "b@example.com", "Alice Cooper", "Globex")
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': test_user.email})}"}
+
+    response = client.get("/api/customers/search", params={"q": "alice"}, headers=headers)
+    assert response.status_code == 200
+    assert [(hit["full_name"], hit["match"]) for hit in response.json()["results"]] == [("Alice Walker", "prefix")]
+
+    response = client.get("/api/customers/search", params={"q": "alice", "created_by": other.id}, headers=headers)
+    assert response.status_code == 403
+
+    response = client.get(
+        "/api/customers/search", params={"q": "globx"}, headers={"Authorization": f"Bearer {superuser_token}"}
+    )
+    assert sorted(hit["full_name"] for hit in response.json()["results"]) == ["Alice Cooper", "Alice Walker"]
+
+
+async def test_search_terms_registered_for_aiosqlite(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    try:
+        async with engine.connect() as connection:
+            value = await connection.scalar(text("SELECT search_terms('Acme Trading', 'Buyer')"))
+            assert value == search_terms("Acme Trading", "Buyer")
+    finally:
+        await engine.dispose()
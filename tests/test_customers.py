@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from src.merchant.web.models.customer import Customer
+from src.merchant.web.services.customer_listing import build_customer_page_query
+from src.merchant.web.utils.auth import create_access_token
+
+
+def auth_header(user):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+
+def add_customers(db, user, count, start=0, **fields):
+    for i in range(start, start + count):
+        db.add(Customer(
+            full_name=f"Customer {i}", email=f"c{i}@example.com", company=fields.get("company", "Acme"),
+            position="Buyer", status=fields.get("status", "potential"), created_by=user.id,
+            last_contact=fields.get("last_contact"),
+        ))
+    db.commit()
+
+
+def fetch_all(client, headers, limit, cursor=None, **params):
+    ids = []
+    while True:
+        page_params = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/customers/", params=page_params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        ids += [customer["id"] for customer in body["customers"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_pages_are_complete_and_newest_first(client, db, test_user):
+    """测试同一秒创建的客户按 id 区分，翻页不重复也不遗漏"""
+    add_customers(db, test_user, 25)
+    ids = fetch_all(client, auth_header(test_user), limit=7)
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == len(set(ids)) == 25
+
+
+def test_pages_stable_while_inserting(client, db, test_user):
+    add_customers(db, test_user, 10)
+    headers = auth_header(test_user)
+    first = client.get("/api/customers/", params={"limit": 5}, headers=headers).json()
+    add_customers(db, test_user, 5, start=100)
+    rest = fetch_all(client, headers, limit=5, cursor=first["next_cursor"])
+    seen = [c["id"] for c in first["customers"]] + rest
+    assert len(seen) == len(set(seen)) == 10
+
+
+def test_filters(client, db, test_user):
+    now = datetime(2026, 1, 10)
+    add_customers(db, test_user, 3, status="active", company="Globex", last_contact=now)
+    add_customers(db, test_user, 2, start=10, last_contact=now - timedelta(days=30))
+    headers = auth_header(test_user)
+
+    def count(**params):
+        return len(client.get("/api/customers/", params=params, headers=headers).json()["customers"])
+
+    assert count(status="active") == 3
+    assert count(company="Acme") == 2
+    assert count(last_contact_from=(now - timedelta(days=1)).isoformat()) == 3
+    assert count(last_contact_to=(now - timedelta(days=1)).isoformat()) == 2
+
+
+def test_users_only_list_own_customers(client, db, test_user, superuser_token):
+    add_customers(db, test_user, 2)
+    other = {"Authorization": f"Bearer {superuser_token}"}
+    assert len(client.get("/api/customers/", headers=other).json()["customers"]) == 2
+    response = client.get("/api/customers/", params={"created_by": test_user.id + 100}, headers=auth_header(test_user))
+    assert response.status_code == 403
+
+
+def test_invalid_cursor(client, test_user):
+    response = client.get("/api/customers/", params={"cursor": "not-a-cursor"}, headers=auth_header(test_user))
+    assert response.status_code == 400
+
+
+def test_page_query_uses_composite_index(db):
+    stmt = build_customer_page_query(50, cursor="WyIyMDI2LTAxLTAxIDAwOjAwOjAwIiwxMF0", created_by=1)
+    compiled = stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_customers_created_by_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
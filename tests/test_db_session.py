@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+
+from src.merchant.web.main import app
+from src.merchant.web.models.base import Base, SyncSessionAdapter, get_session, to_async_url
+from src.merchant.web.models.customer import Customer
+from src.merchant.web.models.email import EmailBinding, EmailMessage
+from src.merchant.web.models.user import User
+
+
+def test_to_async_url():
+    assert to_async_url("sqlite:///./merchant.db") == "sqlite+aiosqlite:///./merchant.db"
+    assert to_async_url("postgresql://crm:pw@db/crm") == "postgresql+asyncpg://crm:pw@db/crm"
+    with pytest.raises(ValueError):
+        to_async_url("mssql://db/crm")
+
+
+async def test_sync_adapter_matches_async_session_interface(db, test_user):
+    session = SyncSessionAdapter(db)
+    customer = Customer(full_name="Acme", email="buyer@acme.com", created_by=test_user.id)
+    session.add(customer)
+    await session.commit()
+    await session.refresh(customer)
+
+    assert await session.get(Customer, customer.id) is customer
+    assert (await session.scalars(select(Customer.email))).all() == ["buyer@acme.com"]
+    assert await session.run_sync(lambda s, cid: s.get(Customer, cid).full_name, customer.id) == "Acme"
+    await session.delete(customer)
+    await session.commit()
+    assert await session.scalar(select(Customer)) is None
+
+
+@pytest.fixture
+def async_client(tmp_path):
+    """安装了 aiosqlite 时返回使用真正 AsyncSession 的客户端和同一数据库的同步会话"""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session
+
+    path = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_session():
+        async with factory() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    try:
+        with TestClient(app) as client, Session(engine) as db:
+            yield client, db
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+        engine.dispose()
+
+
+def register(client, email="async@example.com"):
+    token = client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "secret", "full_name": "Async"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_routes_with_async_session(async_client):
+    """用真正的 AsyncSession 跑一遍注册、登录和客户接口"""
+    client, _ = async_client
+    headers = register(client)
+    assert client.post("/api/auth/token", data={"username": "async@example.com", "password": "secret"}).status_code == 200
+    response = client.post("/api/customers/", json={"full_name": "Acme", "email": "buyer@acme.com", "company": "Acme", "position": "Buyer"}, headers=headers)
+    assert response.status_code == 200
+    assert [c["email"] for c in client.get("/api/customers/", headers=headers).json()["customers"]] == ["buyer@acme.com"]
+    assert [c["email"] for c in client.get("/api/customers/search", params={"q": "acme"}, headers=headers).json()["results"]] == ["buyer@acme.com"]
+
+
+def test_unbind_email_with_async_session(async_client):
+    """异步会话下解绑邮箱会清理邮件和搜索索引"""
+    client, db = async_client
+    headers = register(client)
+    user = db.scalar(select(User))
+    binding = EmailBinding(user_id=user.id, email="async@example.com", password="x", imap_server="imap.example.com", imap_port=993)
+    db.add(binding)
+    db.commit()
+    db.add(EmailMessage(binding_id=binding.id, folder="INBOX", uid=1, subject="报价单", from_addr="a@example.com"))
+    db.commit()
+
+    assert client.delete(f"/api/email/{binding.id}", headers=headers).status_code == 200
+    db.expire_all()
+    assert db.scalar(select(EmailBinding)) is None
+    assert db.scalar(select(EmailMessage)) is None
+    assert db.scalar(text("SELECT count(*) FROM email_messages_fts")) == 0
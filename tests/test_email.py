@@ -3,11 +3,21 @@ from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 import imaplib
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from imapclient.datetime_util import parse_to_datetime
+from imapclient.response_parser import parse_fetch_response
 
 from src.merchant.web.main import app
 from src.merchant.web.models.email import EmailBinding
 from src.merchant.web.models.user import User
-from src.merchant.web.utils.email import verify_imap_connection
+from src.merchant.web.utils.email import (
+    verify_imap_connection,
+    fetch_inbox_emails,
+    parse_email_detail,
+    LIST_FETCH_ITEMS,
+)
 from src.merchant.web.utils.auth import create_access_token
 
 client = TestClient(app)
@@ -161,4 +171,64 @@ def test_unbind_email_not_found(client: TestClient, test_user: User):
         headers={"Authorization": get_test_token(test_user)}
     )
 
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404
+
+# 带一个 PDF 附件的邮件的 FETCH 响应（只有信封和结构，没有邮件体）
+HEADER_FETCH_RESPONSE = (
+    b'1 (UID 42 FLAGS (\\Seen) INTERNALDATE "17-Jul-2024 02:44:25 +0800" RFC822.SIZE 52430 '
+    b'ENVELOPE ("Wed, 17 Jul 2024 02:44:25 +0800" "=?utf-8?B?5rWL6K+V?=" (("Alice" NIL "alice" "example.com")) '
+    b'NIL NIL (("Bob" NIL "bob" "example.org")) NIL NIL NIL "<m1@example.com>") '
+    b'BODYSTRUCTURE (("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 12 1 NIL NIL NIL NIL)'
+    b'("application" "pdf" ("name" "report.pdf") NIL NIL "base64" 50000 NIL '
+    b'("attachment" ("filename" "report.pdf")) NIL NIL) "mixed" ("boundary" "xyz") NIL NIL NIL))'
+)
+
+def test_fetch_inbox_emails_headers_only():
+    """测试收件箱列表只获取信封和结构信息"""
+    with patch('imapclient.IMAPClient') as mock_client_cls:
+        mock_client = MagicMock()
+        mock_client_cls.return_value = mock_client
+        mock_client.list_folders.return_value = [((), b'/', 'INBOX')]
+        mock_client.search.return_value = [42]
+        mock_client.fetch.return_value = parse_fetch_response([HEADER_FETCH_RESPONSE], True, True)
+
+        emails = fetch_inbox_emails(MagicMock(email="a@example.com", password="pw", imap_server="imap.example.com", imap_port=993))
+
+        fetch_items = mock_client.fetch.call_args[0][1]
+        assert fetch_items == LIST_FETCH_ITEMS
+        assert not any('RFC822' == item or 'BODY[]' in item for item in fetch_items)
+        assert emails == [{
+            "id": "42",
+            "subject": "测试",
+            "from_addr": "Alice <alice@example.com>",
+            # INTERNALDATE 按本地时区转换，和解析 FETCH 响应时的规则一致
+            "date": parse_to_datetime(b"17-Jul-2024 02:44:25 +0800").isoformat(),
+            "has_attachments": True,
+        }]
+
+def test_parse_email_detail():
+    """测试解析完整邮件内容和附件"""
+    message = MIMEMultipart()
+    message["Subject"] = "季度报告"
+    message["From"] = "Alice <alice@example.com>"
+    message["To"] = "bob@example.org"
+    message.attach(MIMEText("请查收附件", "plain", "utf-8"))
+    attachment = MIMEApplication(b"%PDF-1.4 test", _subtype="pdf")
+    attachment.add_header("Content-Disposition", "attachment", filename="report.pdf")
+    message.attach(attachment)
+
+    detail = parse_email_detail(7, message.as_bytes())
+
+    assert detail["id"] == "7"
+    assert detail["subject"] == "季度报告"
+    assert detail["from_addr"] == "Alice <alice@example.com>"
+    assert detail["to_addrs"] == ["bob@example.org"]
+    assert detail["text_body"] == "请查收附件"
+    assert detail["has_attachments"] is True
+    assert detail["attachments"] == [{
+        "part": "2",
+        "filename": "report.pdf",
+        "content_type": "application/pdf",
+        "size": len(b"%PDF-1.4 test"),
+    }]
+
@@ -0,0 +1,152 @@
+import threading
+from unittest.mock import Mock
+
+import imapclient
+import pytest
+
+from src.merchant.web.models.email import EmailBinding
+from src.merchant.web.models.user import User
+from src.merchant.web.utils import email as email_utils
+from src.merchant.web.utils.auth import create_access_token
+from src.merchant.web.utils.email import imap_pool, verify_failures
+
+
+class FakeLoginClient:
+    """记录连接参数的模拟 IMAPClient，密码为 secret 时登录成功"""
+
+    connections = []
+    lock = threading.Lock()
+
+    def __init__(self, host, port=None, use_uid=True, ssl=True, ssl_context=None, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.logged_out = False
+        with self.lock:
+            self.connections.append(self)
+
+    def socket(self):
+        return Mock()
+
+    def login(self, username, password):
+        if password != "secret":
+            raise imapclient.exceptions.LoginError("Invalid credentials")
+
+    def id_(self, info):
+        pass
+
+    def capabilities(self):
+        return (b'IMAP4REV1', b'IDLE')
+
+    def list_folders(self):
+        return [((b'\\HasNoChildren',), b'/', 'INBOX')]
+
+    def noop(self):
+        pass
+
+    def logout(self):
+        self.logged_out = True
+
+    def shutdown(self):
+        self.logged_out = True
+
+
+@pytest.fixture
+def fake_login(monkeypatch):
+    FakeLoginClient.connections = []
+    monkeypatch.setattr(imapclient, "IMAPClient", FakeLoginClient)
+    verify_failures.clear()
+    yield FakeLoginClient
+    verify_failures.clear()
+
+
+def auth_headers(db, user_id):
+    user = db.query(User).get(user_id)
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+
+def test_verify_imap_login_caches_failures(fake_login):
+    """测试登录失败的结果在有效期内直接返回，换了密码可以立即重试"""
+    first = email_utils.verify_imap_login("a@example.com", "wrong", "imap.example.com", 993)
+    second = email_utils.verify_imap_login("a@example.com", "wrong", "imap.example.com", 993)
+    assert first[0] is False and second[:2] == first[:2]
+    assert len(fake_login.connections) == 1
+    assert fake_login.connections[0].logged_out
+
+    success, _, client = email_utils.verify_imap_login("a@example.com", "secret", "imap.example.com", 993)
+    assert success and not client.logged_out
+    assert client.timeout.connect == email_utils.IMAP_CONNECT_TIMEOUT
+    assert client.timeout.read == email_utils.IMAP_TIMEOUT
+
+
+def test_bulk_bind(client, db, test_email_binding, fake_login):
+    """测试批量绑定返回每个邮箱的结果，并把验证时的会话放入连接池"""
+    accounts = [
+        {"email": "one@example.com", "password": "secret", "imap_server": "imap.example.com"},
+        {"email": "two@example.com", "password": "wrong", "imap_server": "imap.example.com"},
+        {"email": test_email_binding.email, "password": "secret", "imap_server": "imap.example.com"},
+        {"email": "three@example.net", "password": "secret", "imap_server": "imap.example.net"},
+    ]
+    response = client.post("/api/email/bind/bulk", json={"accounts": accounts}, headers=auth_headers(db, test_email_binding.user_id))
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert [r["success"] for r in results] == [True, False, False, True]
+    assert results[1]["error"] == "IMAP error: Invalid credentials"
+    assert results[2]["error"] == "Email already bound"
+    assert results[0]["binding"]["email"] == "one@example.com"
+    assert db.query(EmailBinding).count() == 3
+
+    # 已验证的会话直接用于后续操作，不再重新登录
+    binding = db.query(EmailBinding).filter(EmailBinding.email == "one@example.com").one()
+    try:
+        connections = len(fake_login.connections)
+        assert imap_pool.run(binding, lambda session: session) in fake_login.connections
+        assert len(fake_login.connections) == connections
+    finally:
+        for bound in db.query(EmailBinding).all():
+            imap_pool.evict(bound.id)
+
+
+@pytest.fixture
+def bind_race(monkeypatch, db, test_user):
+    """验证登录期间另一个请求抢先绑定 race@example.com"""
+    from src.merchant.web.routes import email as email_routes
+
+    verify = email_routes.verify_accounts
+
+    async def racing_verify(accounts):
+        results = await verify(accounts)
+        db.add(EmailBinding(user_id=test_user.id, email="race@example.com", password="x", imap_server="imap.example.com"))
+        db.commit()
+        return results
+
+    monkeypatch.setattr(email_routes, "verify_accounts", racing_verify)
+
+
+def test_bind_reports_concurrent_binding(client, db, test_user, fake_login, bind_race):
+    """测试验证期间邮箱被其他请求绑定时返回 400，并登出验证时的会话"""
+    account = {"email": "race@example.com", "password": "secret", "imap_server": "imap.example.com"}
+    response = client.post("/api/email/bind", json=account, headers=auth_headers(db, test_user.id))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already bound"
+    assert [c.logged_out for c in fake_login.connections] == [True]
+    assert db.query(EmailBinding).count() == 1
+
+
+def test_bulk_bind_skips_concurrent_binding(client, db, test_user, fake_login, bind_race):
+    """测试批量绑定中一个邮箱冲突时其他邮箱照常绑定"""
+    accounts = [
+        {"email": "race@example.com", "password": "secret", "imap_server": "imap.example.com"},
+        {"email": "one@example.com", "password": "secret", "imap_server": "imap.example.com"},
+    ]
+    response = client.post("/api/email/bind/bulk", json={"accounts": accounts}, headers=auth_headers(db, test_user.id))
+    assert response.status_code == 200
+    results = response.json()["results"]
+    try:
+        assert [(r["success"], r["error"]) for r in results] == [(False, "Email already bound"), (True, None)]
+        assert sorted(c.logged_out for c in fake_login.connections) == [False, True]
+        assert db.query(EmailBinding).count() == 2
+    finally:
+        for bound in db.query(EmailBinding).all():
+            imap_pool.evict(bound.id)
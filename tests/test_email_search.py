@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import pytest
+
+from src.merchant.web.models.email import EmailBinding, EmailMessage
+from src.merchant.web.models.email_search import cjk_bigrams
+from src.merchant.web.models.user import User
+from src.merchant.web.services import email_search
+from src.merchant.web.services.email_search import build_match_query, search_messages
+from src.merchant.web.utils.auth import create_access_token
+
+
+def add_message(db, binding, uid, subject, from_addr="Alice <alice@example.com>", body=None, date=None):
+    message = EmailMessage(
+        binding_id=binding.id,
+        folder="INBOX",
+        uid=uid,
+        subject=subject,
+        from_addr=from_addr,
+        to_addrs="bob@example.org",
+        body_text=body,
+        date=date or datetime(2024, 7, 17),
+    )
+    db.add(message)
+    db.commit()
+    return message
+
+
+def subjects(results):
+    return [r["subject"] for r in results]
+
+
+def test_build_match_query():
+    """测试中文拆成二字短语，单字和英文按前缀匹配"""
+    assert build_match_query('季度报告 repo') == '"季度 度报 报告" "repo"*'
+    assert build_match_query('Q3报价 单 "x"') == '"Q3"* "报价" "单"* "x"*'
+
+
+def test_search_matches_chinese_substrings_and_prefixes(db, test_email_binding):
+    """测试中文子串、英文前缀匹配和按主题优先排序"""
+    add_message(db, test_email_binding, 1, "第三季度报告", body="请查收")
+    add_message(db, test_email_binding, 2, "会议纪要", body="讨论了季度报告的修改意见")
+    add_message(db, test_email_binding, 3, "Quarterly report draft")
+
+    results = search_messages(db, test_email_binding.user_id, "季度报告")
+    assert subjects(results) == ["第三季度报告", "会议纪要"]
+    assert results[0]["subject_highlight"] == "第三<mark>季度报告</mark>"
+    assert results[1]["snippet"] == "讨论了<mark>季度报告</mark>的修改意见"
+
+    assert subjects(search_messages(db, test_email_binding.user_id, "quart")) == ["Quarterly report draft"]
+    assert search_messages(db, test_email_binding.user_id, "报季") == []
+    assert subjects(search_messages(db, test_email_binding.user_id, "纪")) == ["会议纪要"]
+
+
+def test_search_filters_and_index_updates(db, test_email_binding):
+    """测试发件人、日期、用户过滤，以及更新和删除邮件后索引同步"""
+    other_user = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other_user)
+    db.commit()
+    other_binding = EmailBinding(user_id=other_user.id, email="other@example.com", password="x")
+    db.add(other_binding)
+    db.commit()
+
+    add_message(db, test_email_binding, 1, "invoice <b>July</b>", from_addr="Billing <billing@shop.com>")
+    march = add_message(db, test_email_binding, 2, "invoice March", date=datetime(2024, 3, 1))
+    add_message(db, other_binding, 1, "invoice other user")
+    user_id = test_email_binding.user_id
+
+    results = search_messages(db, user_id, "invo", sender="billing@")
+    assert subjects(results) == ["invoice <b>July</b>"]
+    assert results[0]["subject_highlight"] == "<mark>invoice</mark> &lt;b&gt;July&lt;/b&gt;"
+    assert subjects(search_messages(db, user_id, "invoice", date_to=datetime(2024, 6, 1))) == ["invoice March"]
+    assert len(search_messages(db, user_id, "invoice")) == 2
+
+    march.body_text = "付款已完成"
+    db.commit()
+    assert subjects(search_messages(db, user_id, "付款")) == ["invoice March"]
+
+    db.delete(march)
+    db.commit()
+    assert search_messages(db, user_id, "付款") == []
+
+
+def test_rank_limit_counts_only_own_matches(db, test_email_binding, monkeypatch):
+    """测试其他用户的大量匹配不会让当前用户的结果退回按同步顺序排列"""
+    monkeypatch.setattr(email_search, "RANK_LIMIT", 2)
+    other_user = User(email="other@example.com", hashed_password="x", full_name="Other")
+    db.add(other_user)
+    db.commit()
+    other_binding = EmailBinding(user_id=other_user.id, email="other@example.com", password="x")
+    db.add(other_binding)
+    db.commit()
+    for uid in range(1, 4):
+        add_message(db, other_binding, uid, f"invoice {uid}")
+
+    add_message(db, test_email_binding, 1, "invoice", body="invoice invoice")
+    add_message(db, test_email_binding, 2, "meeting notes", body="see the attached invoice and the agenda for next week")
+
+    assert subjects(search_messages(db, test_email_binding.user_id, "invoice")) == ["invoice", "meeting notes"]
+
+
+def test_search_endpoint(client, db, test_email_binding):
+    """测试搜索接口"""
+    add_message(db, test_email_binding, 1, "报价单")
+    user = db.query(User).get(test_email_binding.user_id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+    response = client.get("/api/email/search", params={"q": "报价"}, headers=headers)
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()["results"]] == ["1"]
+
+
+async def test_cjk_bigrams_registered_for_aiosqlite(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    try:
+        async with engine.connect() as connection:
+            assert await connection.scalar(text("SELECT cjk_bigrams('报价单')")) == cjk_bigrams("报价单")
+    finally:
+        await engine.dispose()
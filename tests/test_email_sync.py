@@ -0,0 +1,305 @@
+import asyncio
+import time
+
+import pytest
+from imapclient.response_parser import parse_fetch_response
+
+from src.merchant.web.models.email import EmailBinding, EmailMessage, EmailSyncState
+from src.merchant.web.services import email_sync
+from src.merchant.web.utils.email import imap_pool
+from src.merchant.web.services.email_sync import EmailSyncService, load_unified_inbox
+
+
+class FakeIMAPClient:
+    """只实现同步所需命令的模拟 IMAP 客户端"""
+
+    def __init__(self, condstore=True):
+        self.uidvalidity = 1
+        self.messages = {}  # uid -> {"subject", "flags", "modseq"}
+        self.modseq = 1
+        self.condstore = condstore
+        self.fetch_calls = []
+
+    def add(self, uid, subject, flags=(), day=17):
+        self.modseq += 1
+        self.messages[uid] = {"subject": subject, "flags": list(flags), "modseq": self.modseq, "day": day}
+
+    def set_flags(self, uid, flags):
+        self.modseq += 1
+        self.messages[uid].update(flags=list(flags), modseq=self.modseq)
+
+    def select_folder(self, folder, readonly=False):
+        info = {
+            b'UIDVALIDITY': self.uidvalidity,
+            b'UIDNEXT': max(self.messages, default=0) + 1,
+            b'EXISTS': len(self.messages),
+        }
+        if self.condstore:
+            info[b'HIGHESTMODSEQ'] = self.modseq
+        return info
+
+    host = "imap.example.com"
+    port = 993
+
+    def capabilities(self):
+        return (b'IMAP4REV1', b'CONDSTORE') if self.condstore else (b'IMAP4REV1',)
+
+    def list_folders(self):
+        return [((b'\\HasNoChildren',), b'/', 'INBOX')]
+
+    def _uid_range(self, spec):
+        low, high = spec.split(':')
+        high = max(self.messages, default=0) if high == '*' else int(high)
+        uids = [uid for uid in sorted(self.messages) if int(low) <= uid <= high]
+        # "n:*" 至少返回最后一封邮件
+        if not uids and spec.endswith('*') and self.messages:
+            uids = [max(self.messages)]
+        return uids
+
+    def search(self, criteria):
+        if criteria == ['ALL']:
+            return sorted(self.messages)
+        if criteria[0] == 'MODSEQ':
+            return [uid for uid in sorted(self.messages) if self.messages[uid]["modseq"] >= criteria[1]]
+        return self._uid_range(criteria[1])
+
+    def fetch(self, uids, items, modifiers=None):
+        self.fetch_calls.append((uids, items, modifiers))
+        if isinstance(uids, str):
+            uids = self._uid_range(uids)
+        if 'BODY.PEEK[]' in items:
+            return {
+                uid: {b'BODY[]': b'Subject: %s\r\n\r\nbody of %d' % (self.messages[uid]["subject"].encode(), uid)}
+                for uid in uids if uid in self.messages
+            }
+        if modifiers:
+            since = int(modifiers[0].split()[1])
+            uids = [uid for uid in uids if self.messages[uid]["modseq"] > since]
+        lines = []
+        for seq, uid in enumerate(uids, start=1):
+            message = self.messages[uid]
+            parts = [b'UID %d' % uid, b'FLAGS (%s)' % " ".join(message["flags"]).encode()]
+            if 'MODSEQ' in items or modifiers:
+                parts.append(b'MODSEQ (%d)' % message["modseq"])
+            if 'ENVELOPE' in items:
+                parts.append(
+                    b'INTERNALDATE "%02d-Jul-2024 02:44:25 +0000" RFC822.SIZE 120 '
+                    b'ENVELOPE (NIL "%s" (("Alice" NIL "alice" "example.com")) NIL NIL '
+                    b'(("Bob" NIL "bob" "example.org")) NIL NIL NIL "<%d@example.com>") '
+                    b'BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 12 1 NIL NIL NIL NIL)'
+                    % (message["day"], message["subject"].encode(), uid)
+                )
+            lines.append(b'%d (%s)' % (seq, b' '.join(parts)))
+        return parse_fetch_response(lines, True, True) if lines else {}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """把同步服务的连接池替换成模拟客户端"""
+    client = FakeIMAPClient()
+    monkeypatch.setattr(imap_pool, "run", lambda binding, operation: operation(client))
+    return client
+
+
+def cached_uids(db, binding_id):
+    return [m.uid for m in db.query(EmailMessage).filter(EmailMessage.binding_id == binding_id).order_by(EmailMessage.uid)]
+
+
+async def test_initial_sync_fetches_recent_window(db, test_email_binding, fake_client, monkeypatch):
+    """测试首次同步只获取最近的邮件"""
+    monkeypatch.setattr(email_sync, "INITIAL_SYNC_WINDOW", 3)
+    for uid in range(1, 6):
+        fake_client.add(uid, f"subject {uid}")
+
+    state = await EmailSyncService(db).sync_folder(test_email_binding)
+
+    assert cached_uids(db, test_email_binding.id) == [3, 4, 5]
+    assert state.uidvalidity == 1
+    assert state.highest_uid == 5
+    assert state.message_count == 5
+
+
+async def test_incremental_sync_fetches_only_new_messages(db, test_email_binding, fake_client):
+    """测试增量同步只获取新邮件"""
+    fake_client.add(1, "first")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    fake_client.fetch_calls.clear()
+    await service.sync_folder(test_email_binding)
+    assert fake_client.fetch_calls == []
+
+    fake_client.add(2, "second")
+    await service.sync_folder(test_email_binding)
+    assert fake_client.fetch_calls[0][0] == [2]
+
+    messages = service.list_messages(test_email_binding.id)
+    assert [m.subject for m in messages] == ["second", "first"]
+
+
+async def test_condstore_picks_up_flag_changes(db, test_email_binding, fake_client):
+    """测试 CONDSTORE 下同步标记变化"""
+    fake_client.add(1, "first")
+    fake_client.add(2, "second")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    fake_client.set_flags(1, [r"\Seen"])
+    await service.sync_folder(test_email_binding)
+
+    uids, _, modifiers = fake_client.fetch_calls[-1]
+    assert uids == [1]
+    assert modifiers and modifiers[0].startswith("CHANGEDSINCE")
+    message = db.query(EmailMessage).filter(EmailMessage.uid == 1).one()
+    assert message.flags == r"\Seen"
+
+
+async def test_uidvalidity_change_resets_cache(db, test_email_binding, fake_client):
+    """测试 UIDVALIDITY 变化时重新同步"""
+    fake_client.add(1, "old")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    fake_client.uidvalidity = 2
+    fake_client.messages.clear()
+    fake_client.add(7, "new")
+    state = await service.sync_folder(test_email_binding)
+
+    assert cached_uids(db, test_email_binding.id) == [7]
+    assert state.uidvalidity == 2
+
+
+async def test_expunged_messages_are_removed(db, test_email_binding, fake_client):
+    """测试服务器删除的邮件从缓存中移除"""
+    for uid in (1, 2, 3):
+        fake_client.add(uid, f"subject {uid}")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    del fake_client.messages[2]
+    await service.sync_folder(test_email_binding)
+
+    assert cached_uids(db, test_email_binding.id) == [1, 3]
+
+
+async def test_purge_removes_cache(db, test_email_binding, fake_client):
+    """测试解绑时清理缓存"""
+    fake_client.add(1, "first")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    service.purge(test_email_binding.id)
+    db.commit()
+
+    assert cached_uids(db, test_email_binding.id) == []
+    assert db.query(EmailSyncState).count() == 0
+
+
+async def test_load_page_backfills_only_needed_range(db, test_email_binding, fake_client, monkeypatch):
+    """测试分页时只从服务器补齐当前页需要的邮件"""
+    monkeypatch.setattr(email_sync, "INITIAL_SYNC_WINDOW", 3)
+    for uid in range(1, 8):
+        fake_client.add(uid, f"subject {uid}")
+    service = EmailSyncService(db)
+
+    page, cursor, state = await service.load_page(test_email_binding, limit=2)
+    assert [m.uid for m in page] == [7, 6]
+    assert cursor == "6"
+    assert state.message_count == 7
+
+    fake_client.fetch_calls.clear()
+    page, cursor, _ = await service.load_page(test_email_binding, limit=2, before_uid=int(cursor))
+    assert [m.uid for m in page] == [5, 4]
+    assert cursor == "4"
+    assert [call[0] for call in fake_client.fetch_calls] == [[3, 4]]
+
+    page, cursor, _ = await service.load_page(test_email_binding, limit=2, before_uid=int(cursor))
+    assert [m.uid for m in page] == [3, 2]
+
+    fake_client.fetch_calls.clear()
+    page, cursor, _ = await service.load_page(test_email_binding, limit=2, before_uid=int(cursor))
+    assert [m.uid for m in page] == [1]
+    assert cursor is None
+    assert fake_client.fetch_calls == []
+
+
+async def test_unified_inbox_merges_by_date_and_reports_timeouts(db, test_email_binding, monkeypatch):
+    """测试统一收件箱按日期合并，超时的邮箱返回缓存邮件和错误"""
+    second = EmailBinding(
+        user_id=test_email_binding.user_id,
+        email="second@example.com",
+        password="testpassword",
+        imap_server="imap.example.org",
+        imap_port=993
+    )
+    slow = EmailBinding(
+        user_id=test_email_binding.user_id,
+        email="slow@example.com",
+        password="testpassword",
+        imap_server="imap.slow.example.com",
+        imap_port=993
+    )
+    db.add_all([second, slow])
+    db.commit()
+
+    clients = {test_email_binding.id: FakeIMAPClient(), second.id: FakeIMAPClient(), slow.id: FakeIMAPClient()}
+    clients[test_email_binding.id].add(1, "first a", day=1)
+    clients[test_email_binding.id].add(2, "first b", day=4)
+    clients[second.id].add(1, "second a", day=3)
+    clients[slow.id].add(1, "slow a", day=2)
+
+    in_flight = []
+    # 在线程中读取 ORM 对象的过期属性会和主线程并发使用同一个会话
+    slow_id = slow.id
+
+    def run(binding, operation):
+        if binding.id == slow_id and slow_server:
+            in_flight.append(binding.id)
+            try:
+                time.sleep(0.5)
+                return operation(clients[binding.id])
+            finally:
+                in_flight.remove(binding.id)
+        return operation(clients[binding.id])
+
+    monkeypatch.setattr(imap_pool, "run", run)
+    slow_server = False
+    await EmailSyncService(db).sync_folder(slow)
+
+    slow_server = True
+    clients[slow.id].add(2, "slow b", day=5)
+    emails, errors = await load_unified_inbox(db, [test_email_binding, second, slow], limit=3, timeout=0.2)
+
+    assert [(e["binding_id"], e["subject"]) for e in emails] == [
+        (test_email_binding.id, "first b"),
+        (second.id, "second a"),
+        (slow.id, "slow a"),
+    ]
+    assert errors == [{"binding_id": slow.id, "email": "slow@example.com", "error": "Timed out after 0.2s"}]
+
+    emails, _ = await load_unified_inbox(db, [test_email_binding, second, slow], limit=10, timeout=0.2)
+    assert [e["subject"] for e in emails] == ["first b", "second a", "slow a", "first a"]
+
+    # 超时的操作还在线程中执行，等它们结束，免得写入下一个测试的缓存
+    while in_flight:
+        await asyncio.sleep(0.05)
+
+
+async def test_ingest_bodies_stores_preview(db, test_email_binding, fake_client):
+    """测试批量下载正文后保存预览，已处理的邮件不再下载"""
+    for uid in (1, 2, 3):
+        fake_client.add(uid, f"subject {uid}")
+    service = EmailSyncService(db)
+    await service.sync_folder(test_email_binding)
+
+    del fake_client.messages[2]
+    assert await service.ingest_bodies(test_email_binding) == 2
+
+    messages = {m.uid: m for m in db.query(EmailMessage).all()}
+    assert messages[1].preview == "body of 1"
+    assert messages[3].body_text == "body of 3"
+    assert messages[2].preview is None and messages[2].body_parsed_at is not None
+
+    fake_client.fetch_calls.clear()
+    assert await service.ingest_bodies(test_email_binding) == 0
+    assert fake_client.fetch_calls == []
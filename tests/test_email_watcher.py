@@ -0,0 +1,127 @@
+import asyncio
+import socket
+
+from sqlalchemy.orm import sessionmaker
+
+from src.merchant.web.models.email import EmailBinding, EmailMessage
+from src.merchant.web.services.email_events import EmailEventBroker
+from src.merchant.web.services.email_watcher import EmailWatcher
+from test_email_sync import FakeIMAPClient
+
+
+class FakeIdleClient(FakeIMAPClient):
+    """支持 IDLE 的模拟客户端，用 socketpair 模拟服务器推送"""
+
+    def __init__(self):
+        super().__init__()
+        self.server_side, self.client_side = socket.socketpair()
+        self.client_side.setblocking(False)
+        self.in_idle = False
+
+    def capabilities(self):
+        return (b'IMAP4REV1', b'CONDSTORE', b'IDLE')
+
+    def socket(self):
+        return self.client_side
+
+    def push(self, uid, subject):
+        self.add(uid, subject)
+        self.server_side.send(b'* %d EXISTS\r\n' % len(self.messages))
+
+    def idle(self):
+        self.in_idle = True
+
+    def idle_check(self, timeout=None):
+        responses = []
+        try:
+            data = self.client_side.recv(4096)
+        except BlockingIOError:
+            return responses
+        for line in data.splitlines():
+            _, count, name = line.split()
+            responses.append((int(count), name))
+        return responses
+
+    def idle_done(self):
+        self.in_idle = False
+        return b'Idle terminated', []
+
+    def shutdown(self):
+        self.server_side.close()
+        self.client_side.close()
+
+
+async def wait_until(predicate, timeout=5):
+    for _ in range(int(timeout / 0.02)):
+        if predicate():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met")
+
+
+async def test_watcher_pushes_new_messages(db, test_email_binding):
+    """测试 IDLE 推送的新邮件写入缓存并发送给订阅者"""
+    client = FakeIdleClient()
+    client.add(1, "existing")
+    broker = EmailEventBroker()
+    events = broker.subscribe(test_email_binding.user_id)
+    watcher = EmailWatcher(
+        session_factory=sessionmaker(bind=db.get_bind()),
+        connect=lambda account: client,
+        broker=broker,
+        workers=2,
+    )
+    watcher.start()
+    try:
+        await wait_until(lambda: client.in_idle)
+        assert watcher.stats()["idling"] == 1
+
+        client.push(2, "pushed")
+        event = await asyncio.wait_for(events.get(), 5)
+        assert event["binding_id"] == test_email_binding.id
+        assert [email["subject"] for email in event["emails"]] == ["pushed"]
+
+        await wait_until(lambda: client.in_idle)
+        db.expire_all()
+        uids = [m.uid for m in db.query(EmailMessage).order_by(EmailMessage.uid)]
+        assert uids == [1, 2]
+    finally:
+        watcher.stop()
+
+
+async def test_watcher_respects_connection_budget(db, test_email_binding):
+    """测试同时保持的连接数不超过上限"""
+    db.add(EmailBinding(
+        user_id=test_email_binding.user_id,
+        email="second@example.com",
+        password="testpassword",
+        imap_server="imap.example.org",
+        imap_port=993
+    ))
+    db.commit()
+    clients = []
+
+    def connect(account):
+        clients.append(FakeIdleClient())
+        return clients[-1]
+
+    watcher = EmailWatcher(session_factory=sessionmaker(bind=db.get_bind()), connect=connect, max_connections=1)
+    watcher.start()
+    try:
+        await wait_until(lambda: watcher.stats()["watched"] == 2 and watcher.stats()["idling"] == 1)
+        await asyncio.sleep(0.1)
+        assert watcher.stats()["connected"] == 1
+        assert len(clients) == 1
+
+        # 解绑后空出的名额分配给排队的邮箱
+        watcher.unwatch(next(iter(watcher._watches)))
+        await wait_until(lambda: len(clients) == 2 and watcher.stats()["idling"] == 1)
+        assert watcher.stats()["watched"] == 1
+    finally:
+        watcher.stop()
+
+
+def test_events_stream_requires_valid_token(client):
+    """测试 SSE 接口校验查询参数中的 token"""
+    response = client.get("/api/email/events", params={"token": "invalid"})
+    assert response.status_code == 401
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from src.merchant.web.utils.imap_executor import IMAPExecutor
+
+
+async def test_per_host_limit():
+    """测试同一服务器的并发数不超过限制，其他服务器不受影响"""
+    executor = IMAPExecutor(max_workers=8, per_host_limit=2)
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+
+    def slow(host):
+        with lock:
+            running.append(host)
+        release.wait(5)
+        return host
+
+    slow_tasks = [asyncio.create_task(executor.run("slow.example.com", slow, "slow")) for _ in range(5)]
+    await asyncio.sleep(0.1)
+    assert running.count("slow") == 2
+    assert executor.stats() == {"slow.example.com": 5}
+
+    # 慢服务器占满名额时，其他服务器的操作照常执行
+    assert await executor.run("fast.example.com", lambda: "fast") == "fast"
+
+    release.set()
+    assert await asyncio.gather(*slow_tasks) == ["slow"] * 5
+    assert executor.stats() == {}
+    executor.shutdown()
+
+
+async def test_cancelled_wait_keeps_slot_until_thread_finishes():
+    """测试调用方超时后，名额要等线程中的操作结束才释放"""
+    executor = IMAPExecutor(max_workers=4, per_host_limit=1)
+    release = threading.Event()
+
+    try:
+        await asyncio.wait_for(executor.run("imap.example.com", release.wait, 5), timeout=0.05)
+    except asyncio.TimeoutError:
+        pass
+    assert executor.stats() == {"imap.example.com": 1}
+
+    second = asyncio.create_task(executor.run("imap.example.com", lambda: "done"))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+
+    release.set()
+    assert await second == "done"
+    executor.shutdown()
@@ -0,0 +1,141 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import imapclient
+
+from src.merchant.web.utils.imap_pool import IMAPConnectionPool
+
+
+def make_binding(binding_id=1, email="user@example.com", password="secret"):
+    """创建测试用的邮箱绑定"""
+    return SimpleNamespace(
+        id=binding_id,
+        email=email,
+        password=password,
+        imap_server="imap.example.com",
+        imap_port=993,
+    )
+
+
+@pytest.fixture
+def connect():
+    """每次调用返回一个新的模拟 IMAP 连接"""
+    return MagicMock(side_effect=lambda binding: MagicMock(name=f"client-{binding.id}"))
+
+
+def test_session_is_reused(connect):
+    """测试同一个绑定复用已登录的会话"""
+    pool = IMAPConnectionPool(connect=connect)
+    binding = make_binding()
+
+    with pool.session(binding) as first:
+        pass
+    with pool.session(binding) as second:
+        pass
+
+    assert first is second
+    assert connect.call_count == 1
+
+
+def test_credentials_change_reconnects(connect):
+    """测试绑定的密码变化后重新登录"""
+    pool = IMAPConnectionPool(connect=connect)
+
+    with pool.session(make_binding(password="old")) as first:
+        pass
+    with pool.session(make_binding(password="new")) as second:
+        pass
+
+    assert first is not second
+    first.logout.assert_called_once()
+
+
+def test_idle_sessions_are_evicted(connect):
+    """测试空闲超时的会话被关闭"""
+    pool = IMAPConnectionPool(connect=connect, idle_timeout=0)
+
+    with pool.session(make_binding()) as client:
+        pass
+    pool.evict_idle()
+
+    client.logout.assert_called_once()
+    assert pool.stats()["sessions"] == 0
+
+
+def test_max_sessions_evicts_least_recently_used(connect):
+    """测试达到上限时淘汰最久未使用的会话"""
+    pool = IMAPConnectionPool(connect=connect, max_sessions=2)
+
+    with pool.session(make_binding(1)) as first:
+        pass
+    with pool.session(make_binding(2)):
+        pass
+    with pool.session(make_binding(3)):
+        pass
+
+    first.logout.assert_called_once()
+    assert pool.stats()["sessions"] == 2
+
+
+def test_failed_health_check_reconnects(connect):
+    """测试 NOOP 健康检查失败时重新连接"""
+    pool = IMAPConnectionPool(connect=connect, health_check_interval=0)
+    binding = make_binding()
+
+    with pool.session(binding) as first:
+        first.noop.side_effect = imapclient.exceptions.IMAPClientAbortError("socket closed")
+    with pool.session(binding) as second:
+        pass
+
+    assert first is not second
+    assert connect.call_count == 2
+
+
+def test_run_retries_after_abort(connect):
+    """测试操作过程中连接中断时自动重连并重试"""
+    pool = IMAPConnectionPool(connect=connect)
+    calls = []
+
+    def operation(client):
+        calls.append(client)
+        if len(calls) == 1:
+            raise imapclient.exceptions.IMAPClientAbortError("connection reset")
+        return "ok"
+
+    assert pool.run(make_binding(), operation) == "ok"
+    assert calls[0] is not calls[1]
+    calls[0].logout.assert_called_once()
+
+
+def test_evict_closes_session(connect):
+    """测试解绑时移除会话"""
+    pool = IMAPConnectionPool(connect=connect)
+    binding = make_binding()
+
+    with pool.session(binding) as client:
+        pass
+    pool.evict(binding.id)
+
+    client.logout.assert_called_once()
+    assert pool.stats()["sessions"] == 0
+
+
+def test_evict_during_checkout_closes_orphaned_session(connect):
+    """测试取得条目后、加锁前被淘汰的会话在归还时关闭，不会留在池外"""
+    pool = IMAPConnectionPool(connect=connect)
+    binding = make_binding()
+    checkout = pool._checkout_entry
+
+    def checkout_then_evict(binding_id):
+        entry = checkout(binding_id)
+        # 另一个线程在这个窗口中淘汰了会话
+        pool.evict(binding_id)
+        return entry
+
+    pool._checkout_entry = checkout_then_evict
+    with pool.session(binding) as client:
+        pass
+
+    client.logout.assert_called_once()
+    assert pool.stats()["sessions"] == 0
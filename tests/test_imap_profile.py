@@ -0,0 +1,69 @@
+from unittest.mock import Mock
+
+import imapclient
+import pytest
+
+from src.merchant.web.utils.email import login_imap_client
+from src.merchant.web.utils.imap_profile import discover_profile, server_profiles
+
+
+class CountingClient:
+    """记录发送了哪些命令的模拟 IMAPClient"""
+
+    commands = []
+
+    def __init__(self, host, port=993, use_uid=True, ssl=True, ssl_context=None, timeout=None):
+        self.host = host
+        self.port = port
+
+    def socket(self):
+        return Mock()
+
+    def login(self, username, password):
+        self.commands.append("LOGIN")
+
+    def id_(self, info):
+        self.commands.append("ID")
+
+    def capabilities(self):
+        self.commands.append("CAPABILITY")
+        return (b'IMAP4rev1', b'IDLE', b'SORT', b'CONDSTORE', b'ID', b'SPECIAL-USE')
+
+    def list_folders(self):
+        self.commands.append("LIST")
+        return [
+            ((b'\\HasNoChildren',), b'/', 'Inbox'),
+            ((b'\\HasNoChildren', b'\\Sent'), b'/', '已发送'),
+            ((b'\\HasNoChildren', b'\\Trash'), b'/', '已删除'),
+        ]
+
+
+@pytest.fixture
+def counting_client(monkeypatch):
+    CountingClient.commands = []
+    monkeypatch.setattr(imapclient, "IMAPClient", CountingClient)
+    return CountingClient
+
+
+def test_discover_profile():
+    """测试从 CAPABILITY 和 LIST 中识别能力、收件箱和特殊用途文件夹"""
+    profile = discover_profile(CountingClient("imap.163.com"))
+
+    assert profile.idle and profile.sort and profile.condstore
+    assert not profile.supports("QRESYNC")
+    assert profile.inbox == "Inbox"
+    assert profile.special_folders == {"\\Sent": "已发送", "\\Trash": "已删除"}
+    assert profile.requires_id
+
+
+def test_login_discovers_profile_once_per_host(counting_client):
+    """测试同一服务器只查询一次能力，只有要求 ID 的服务器才发送 ID"""
+    login_imap_client("a@example.com", "pw", "imap.example.com", 993)
+    login_imap_client("b@example.com", "pw", "imap.example.com", 993)
+    assert counting_client.commands == ["LOGIN", "CAPABILITY", "LIST", "LOGIN"]
+
+    counting_client.commands.clear()
+    login_imap_client("a@163.com", "pw", "imap.163.com", 993)
+    login_imap_client("b@163.com", "pw", "imap.163.com", 993)
+    assert counting_client.commands == ["LOGIN", "ID", "CAPABILITY", "LIST", "LOGIN", "ID"]
+    assert server_profiles.get("IMAP.163.com", 993).inbox == "Inbox"
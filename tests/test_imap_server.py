@@ -0,0 +1,72 @@
+import email
+import random
+
+from imap_server import build_message
+
+from src.merchant.web.models.email import EmailMessage
+from src.merchant.web.services.email_sync import EmailSyncService
+from src.merchant.web.utils.attachments import fetch_part_info, iter_attachment
+from src.merchant.web.utils.email import (
+    fetch_email_detail, fetch_inbox_emails, imap_pool, verify_imap_login, verify_failures
+)
+
+
+def test_verify_login_against_local_server(imap_server):
+    ok, _, client = verify_imap_login("buyer@example.org", "secret", imap_server.host, imap_server.port)
+    assert ok
+    client.logout()
+
+    verify_failures.clear()
+    ok, message, client = verify_imap_login("buyer@example.org", "wrong", imap_server.host, imap_server.port)
+    assert not ok and client is None
+    assert "Invalid credentials" in message
+
+
+def test_fetch_inbox_emails_reads_headers_only(imap_server, local_email_binding):
+    imap_server.reset_stats()
+    emails = fetch_inbox_emails(local_email_binding)
+
+    uids = imap_server.mailbox.uids()[-10:]
+    assert [int(item["id"]) for item in emails] == uids
+    for item in emails:
+        message = imap_server.mailbox.messages[int(item["id"])]
+        assert item["subject"].endswith(f"#{message.uid}")
+        assert item["has_attachments"] == (len(message.message.get_payload()) > 1)
+    # 列表只取信封和结构，传输量远小于邮件本身
+    total_size = sum(len(imap_server.mailbox.messages[uid].raw) for uid in uids)
+    assert imap_server.stats()["bytes_sent"] < total_size
+
+
+def test_fetch_email_detail_parses_message(imap_server, local_email_binding):
+    uid = imap_server.mailbox.uids()[0]
+    detail = fetch_email_detail(local_email_binding, uid)
+    assert detail["subject"].endswith(f"#{uid}")
+
+
+async def test_sync_ingest_and_incremental_delivery(db, imap_server, local_email_binding):
+    service = EmailSyncService(db)
+    await service.sync_folder(local_email_binding)
+    cached = db.query(EmailMessage).filter_by(binding_id=local_email_binding.id).count()
+    assert cached == len(imap_server.mailbox.uids())
+
+    assert await service.ingest_bodies(local_email_binding, limit=5) == 5
+
+    uid = imap_server.deliver(build_message(1000, random.Random(1)))
+    first_uid = imap_server.mailbox.uids()[0]
+    imap_server.mailbox.set_flags(first_uid, ["\\Seen"])
+    await service.sync_folder(local_email_binding)
+    assert db.query(EmailMessage).filter_by(binding_id=local_email_binding.id, uid=uid).one()
+    assert db.query(EmailMessage).filter_by(binding_id=local_email_binding.id, uid=first_uid).one().flags == "\\Seen"
+
+
+async def test_attachment_download_matches_source(imap_server, local_email_binding):
+    uid = next(
+        uid for uid, message in imap_server.mailbox.messages.items()
+        if len(message.message.get_payload()) > 1
+    )
+    expected = email.message_from_bytes(imap_server.mailbox.messages[uid].raw).get_payload()[1].get_payload(decode=True)
+
+    info = imap_pool.run(local_email_binding, lambda client: fetch_part_info(client, "INBOX", uid, "2"))
+    assert info["filename"] == f"report-{uid}.pdf"
+    chunks = [chunk async for chunk in iter_attachment(local_email_binding, "INBOX", uid, info, chunk_size=4096)]
+    assert b"".join(chunks) == expected
@@ -0,0 +1,90 @@
+import threading
+
+from sqlalchemy import event
+
+from src.merchant.web.utils.login_throttle import LoginThrottle, MemoryBucketStore, SQLiteBucketStore, login_throttle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_over_time():
+    clock = FakeClock()
+    throttle = LoginThrottle(MemoryBucketStore(), ip_burst=100, account_burst=2, account_per_minute=6, clock=clock)
+    assert throttle.check("1.2.3.4", "a@example.com") == 0
+    assert throttle.check("1.2.3.4", "A@example.com ") == 0
+    assert throttle.check("1.2.3.4", "a@example.com") == 10
+    assert throttle.check("1.2.3.4", "b@example.com") == 0
+
+    clock.now += 10
+    assert throttle.check("1.2.3.4", "a@example.com") == 0
+    assert throttle.stats() == {
+        "store": "memory", "processed": 4, "rejected": 1, "rejected_ip": 0, "rejected_account": 1,
+    }
+
+
+def test_ip_limit_does_not_consume_account_tokens():
+    clock = FakeClock()
+    throttle = LoginThrottle(MemoryBucketStore(), ip_burst=1, account_burst=1, clock=clock)
+    assert throttle.check("1.2.3.4", "a@example.com") == 0
+    assert throttle.check("1.2.3.4", "b@example.com") > 0
+    assert throttle.check("5.6.7.8", "b@example.com") == 0
+    assert throttle.stats()["rejected_ip"] == 1
+
+
+def test_shared_store_is_seen_by_all_workers(db, test_engine):
+    """测试两个进程的限流器共用数据库中的令牌桶"""
+    clock = FakeClock()
+    first = LoginThrottle(SQLiteBucketStore(test_engine), ip_burst=100, account_burst=3, clock=clock)
+    second = LoginThrottle(SQLiteBucketStore(test_engine), ip_burst=100, account_burst=3, clock=clock)
+    assert first.check("1.2.3.4", "a@example.com") == 0
+    assert second.check("1.2.3.4", "a@example.com") == 0
+    assert first.check("1.2.3.4", "a@example.com") == 0
+    assert second.check("1.2.3.4", "a@example.com") > 0
+
+    clock.now += 60
+    assert first.check("1.2.3.4", "a@example.com") == 0
+
+
+async def test_shared_store_runs_off_the_event_loop(db, test_engine):
+    """测试共享令牌桶的数据库写入不在事件循环线程中执行"""
+    threads = []
+
+    class RecordingStore(SQLiteBucketStore):
+        def take(self, *args):
+            threads.append(threading.get_ident())
+            return super().take(*args)
+
+    throttle = LoginThrottle(RecordingStore(test_engine), ip_burst=100, account_burst=3, clock=FakeClock())
+    assert await throttle.check_async("1.2.3.4", "a@example.com") == 0
+    assert threads and threading.get_ident() not in threads
+
+    memory = LoginThrottle(MemoryBucketStore(), clock=FakeClock())
+    assert await memory.check_async("1.2.3.4", "a@example.com") == 0
+
+
+def test_login_rejected_before_database(client, test_user, test_engine, monkeypatch):
+    monkeypatch.setattr(login_throttle, "account_burst", 2)
+    form = {"username": test_user.email, "password": "wrong"}
+    for _ in range(2):
+        assert client.post("/api/auth/token", data=form).status_code == 401
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", count)
+    try:
+        response = client.post("/api/auth/token", data=form)
+    finally:
+        event.remove(test_engine, "before_cursor_execute", count)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert statements == []
+    assert login_throttle.stats()["rejected_account"] == 1
@@ -0,0 +1,60 @@
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from src.merchant.web.utils.mime_parser import MIMEParserPool, parse_message_record
+
+
+def build_message(subject="周报", body="本周进展顺利", html=False, attachment=False):
+    message = MIMEMultipart()
+    message["Subject"] = Header(subject, "gbk").encode()
+    message["From"] = f"{Header('张三', 'gb2312').encode()} <zhangsan@example.com>"
+    message["Date"] = "Wed, 17 Jul 2024 10:44:25 +0800"
+    message["Message-ID"] = "<weekly@example.com>"
+    if html:
+        message.attach(MIMEText(f"<html><style>p{{}}</style><body><p>{body}</p></body></html>", "html", "gbk"))
+    else:
+        message.attach(MIMEText(body, "plain", "gbk"))
+    if attachment:
+        part = MIMEApplication(b"PK\x03\x04 data", _subtype="zip")
+        part.add_header("Content-Disposition", "attachment", filename=("gbk", "", "数据.zip"))
+        message.attach(part)
+    return message.as_bytes()
+
+
+def test_parse_message_record_decodes_charsets():
+    """测试解析 GBK 编码的主题、发件人、正文和附件名"""
+    record = parse_message_record(3, build_message(attachment=True))
+
+    assert record["uid"] == 3
+    assert record["message_id"] == "<weekly@example.com>"
+    assert record["subject"] == "周报"
+    assert record["from_addr"] == "张三 <zhangsan@example.com>"
+    assert record["date"] is not None
+    assert record["preview"] == "本周进展顺利"
+    assert record["has_attachments"] is True
+    assert record["attachments"] == [{"filename": "数据.zip", "content_type": "application/zip", "size": 9}]
+
+
+def test_parse_message_record_uses_html_text_for_preview():
+    """测试只有 HTML 正文时从可见文字生成预览"""
+    record = parse_message_record(1, build_message(body="请  确认\n订单", html=True))
+    assert record["preview"] == "请 确认 订单"
+    assert "p{}" not in record["body_text"]
+
+
+def test_parser_pool_preserves_order():
+    """测试进程池分批解析后按输入顺序返回，单封失败不影响其他邮件"""
+    messages = [(uid, build_message(subject=f"邮件 {uid}")) for uid in range(1, 8)]
+    messages.insert(3, (99, None))
+    pool = MIMEParserPool(workers=2, chunk_size=2)
+    try:
+        records = pool.parse_many(messages)
+    finally:
+        pool.shutdown()
+
+    assert [record["uid"] for record in records] == [1, 2, 3, 99, 4, 5, 6, 7]
+    assert "error" in records[3]
+    assert records[0]["subject"] == "邮件 1"
+    assert records[-1]["subject"] == "邮件 7"
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+
+from src.merchant.web.models.base import SyncSessionAdapter
+from src.merchant.web.models.user import User
+from src.merchant.web.utils.auth import authenticate_user, create_access_token
+from src.merchant.web.utils.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+class BlockingContext:
+    """verify_and_update 会一直等到 release 被设置的模拟 CryptContext"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def verify_and_update(self, password, hashed):
+        self.release.wait(5)
+        return password == hashed, None
+
+
+async def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"], bcrypt__rounds=4), max_workers=1)
+    hashed = await hasher.hash("secret")
+    assert await hasher.verify_and_update("secret", hashed) == (True, None)
+    assert (await hasher.verify_and_update("wrong", hashed))[0] is False
+    assert hasher.stats()["completed"] == 3
+    hasher.shutdown()
+
+
+async def test_verification_does_not_block_event_loop():
+    """测试哈希在工作线程中执行时事件循环照常运行"""
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1)
+    task = asyncio.create_task(hasher.verify_and_update("a", "a"))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    assert hasher.stats()["running"] == 1
+
+    context.release.set()
+    assert await task == (True, None)
+    hasher.shutdown()
+
+
+async def test_rejects_when_queue_is_full():
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1, max_pending=2)
+    tasks = [asyncio.create_task(hasher.verify_and_update("a", "a")) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    assert hasher.stats()["queued"] == 1
+
+    with pytest.raises(PasswordHasherBusy):
+        await hasher.verify_and_update("a", "a")
+    assert hasher.stats()["rejected"] == 1
+
+    context.release.set()
+    await asyncio.gather(*tasks)
+    assert hasher.stats()["queued"] == 0 and hasher.stats()["running"] == 0
+    hasher.shutdown()
+
+
+async def test_login_rehashes_outdated_cost_factor(db):
+    """测试调高轮数后，用户登录时保存的哈希按新轮数更新"""
+    user = User(
+        email="old@example.com",
+        hashed_password=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret"),
+        full_name="Old Hash"
+    )
+    db.add(user)
+    db.commit()
+
+    from src.merchant.web.utils import auth
+    auth.pwd_context.update(bcrypt__rounds=5)
+    try:
+        assert await authenticate_user(SyncSessionAdapter(db), "old@example.com", "secret") is not None
+        db.refresh(user)
+        assert user.hashed_password.startswith("$2b$05$")
+    finally:
+        auth.pwd_context.update(bcrypt__rounds=auth.BCRYPT_ROUNDS)
+
+
+def test_metrics_requires_superuser(client, test_user, superuser_token):
+    user_token = create_access_token(data={"sub": test_user.email})
+    response = client.get("/api/metrics", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+    response = client.get("/api/metrics", headers={"Authorization": f"Bearer {superuser_token}"})
+    assert response.status_code == 200
+    assert "queued" in response.json()["password_hasher"]
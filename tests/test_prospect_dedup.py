@@ -0,0 +1,93 @@
+from src.merchant.web.models.customer import Customer
+from src.merchant.web.services import prospect_dedup
+from src.merchant.web.services.agent_service import AgentService
+from src.merchant.web.services.prospect_dedup import (
+    ProspectDeduplicator, normalize_company, normalize_email, normalize_name
+)
+
+
+def add_customer(db, user, email, full_name, company, position=None, notes=None):
+    customer = Customer(email=email, full_name=full_name, company=company, position=position,
+                        status="active", notes=notes, created_by=user.id)
+    db.add(customer)
+    db.commit()
+    return customer
+
+
+def test_normalization():
+    assert normalize_email("  John.Smith@Example.COM ") == "john.smith@example.com"
+    assert normalize_email("not an email") is None
+    assert normalize_company("ACME Trading Co., Ltd.") == "acme trading"
+    assert normalize_company("Ａｃｍｅ　Trading") == "acme trading"
+    assert normalize_company("华为技术有限公司") == "华为技术"
+    assert normalize_name("Smith, John") == normalize_name("john smith")
+
+
+def test_split_finds_email_batch_and_fuzzy_duplicates(db, test_user):
+    acme = add_customer(db, test_user, "John@Acme.com", "John Smith", "Acme Trading Ltd")
+    huawei = add_customer(db, test_user, "zhang@huawei.com", "张伟", "华为技术有限公司")
+
+    fresh, duplicates = ProspectDeduplicator(db).split([
+        {"email": "john@acme.com", "name": "John Smith", "company": "Acme"},
+        {"email": "jsmith@acme-trading.com", "name": "Smith John", "company": "ACME Tradng Co."},
+        {"email": "zw@huawei.cn", "name": "张伟", "company": "华为技术"},
+        {"email": "mary@acme.com", "name": "Mary Jones", "company": "Acme Trading"},
+        {"email": "MARY@acme.com", "name": "Mary Jones", "company": "Acme Trading"},
+        {"email": "mary.j@acme.com", "name": "Mary Jones", "company": "Acme Trading Inc"},
+        {"email": "", "name": "Nobody", "company": "Void"},
+        {"email": "new@globex.com", "name": "Hank Scorpio", "company": "Globex"},
+    ])
+
+    assert [p["email"] for p in fresh] == ["mary@acme.com", "new@globex.com"]
+    assert [(d["prospect"]["email"], d["reason"], d["customer_id"]) for d in duplicates] == [
+        ("MARY@acme.com", "duplicate_in_batch", None),
+        ("", "invalid_email", None),
+        ("john@acme.com", "email", acme.id),
+        ("jsmith@acme-trading.com", "fuzzy", acme.id),
+        ("zw@huawei.cn", "fuzzy", huawei.id),
+        ("mary.j@acme.com", "duplicate_in_batch", None),
+    ]
+
+
+def test_merge_fills_empty_fields_only(db, test_user):
+    customer = add_customer(db, test_user, "john@acme.com", "John Smith", "Acme")
+    dedup = ProspectDeduplicator(db)
+    _, duplicates = dedup.split([{"email": "john@acme.com", "name": "Johnny", "company": "Acme", "position": "CTO"}])
+    assert dedup.merge(duplicates) == 1
+    db.commit()
+    db.refresh(customer)
+    assert (customer.full_name, customer.position) == ("John Smith", "CTO")
+
+
+def test_known_companies(db, test_user):
+    notes = "Auto-generated by Agent. Industry: textiles, Region: Vietnam"
+    add_customer(db, test_user, "a@a.com", "A", "Saigon Textiles", notes=notes)
+    add_customer(db, test_user, "b@b.com", "B", "Hanoi Mills", notes=notes)
+    add_customer(db, test_user, "c@c.com", "C", "Other Co", notes="Auto-generated by Agent. Industry: textiles, Region: Vietnam North")
+    assert ProspectDeduplicator(db).known_companies("textiles", "Vietnam") == ["Hanoi Mills", "Saigon Textiles"]
+
+
+async def test_prospecting_skips_existing_customers(db):
+    service = AgentService(db)
+    created = await service.prospect_new_customers("tech", "asia", 1)
+    assert [c.email for c in created] == ["test@example.com"]
+    # 以前这里会因为邮箱唯一约束整批失败
+    assert await service.prospect_new_customers("tech", "asia", 1) == []
+    assert db.query(Customer).count() == 1
+
+
+async def test_prospecting_retries_after_concurrent_insert(db, test_user, monkeypatch):
+    add_customer(db, test_user, "test@example.com", "Test User", "Test Corp")
+    original = prospect_dedup.ProspectDeduplicator.split
+    calls = []
+
+    def stale_split(self, prospects):
+        # 第一次去重时还没看到其他请求刚写入的客户
+        calls.append(1)
+        if len(calls) == 1:
+            return [{**p, "email": p["email"]} for p in prospects], []
+        return original(self, prospects)
+
+    monkeypatch.setattr(prospect_dedup.ProspectDeduplicator, "split", stale_split)
+    assert await AgentService(db).prospect_new_customers("tech", "asia", 1) == []
+    assert len(calls) == 2
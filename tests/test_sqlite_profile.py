@@ -0,0 +1,60 @@
+import threading
+
+from sqlalchemy import text
+
+from src.merchant.web.models.base import create_db_engine
+from src.merchant.web.services.db_maintenance import DatabaseMaintenance
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def count_items(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM items")).scalar()
+
+
+def test_connections_use_tuned_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    assert pragma(engine, "journal_mode") == "wal"
+    assert pragma(engine, "synchronous") == 1  # NORMAL
+    assert pragma(engine, "busy_timeout") == 5000
+    assert pragma(engine, "cache_size") == -65536
+
+    default = create_db_engine(f"sqlite:///{tmp_path / 'default.db'}", tune_sqlite=False)
+    assert pragma(default, "journal_mode") == "delete"
+
+
+def test_reader_not_blocked_by_open_write_transaction(tmp_path):
+    """测试 WAL 模式下写事务未提交时其他连接仍然可以读"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO items VALUES (1)"))
+
+    writer = engine.connect()
+    writer.execute(text("INSERT INTO items VALUES (2)"))
+    counts = []
+    reader = threading.Thread(target=lambda: counts.append(count_items(engine)))
+    reader.start()
+    reader.join(2)
+    writer.commit()
+    writer.close()
+    assert counts == [1]
+
+
+def test_maintenance_checkpoints_wal(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'maint.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, body TEXT)"))
+        for i in range(100):
+            connection.execute(text("INSERT INTO items (body) VALUES (:body)"), {"body": "x" * 1000})
+
+    maintenance = DatabaseMaintenance(engine, interval=3600)
+    assert maintenance.enabled
+    checkpoint = maintenance.run_once()
+    assert checkpoint["busy"] == 0
+    assert (tmp_path / "maint.db-wal").stat().st_size == 0
+    assert maintenance.stats()["runs"] == 1
@@ -0,0 +1,63 @@
+from sqlalchemy import event
+
+from src.merchant.web.models.user import User
+from src.merchant.web.utils.auth import create_access_token
+from src.merchant.web.utils.user_cache import UserCache, user_cache
+
+
+def auth_header(user):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+
+def test_cached_user_skips_database(client, test_user, test_engine, monkeypatch):
+    """测试缓存命中且版本号无需检查时不执行任何 SQL"""
+    monkeypatch.setattr(user_cache, "version_interval", 3600)
+    assert client.get("/api/auth/me", headers=auth_header(test_user)).status_code == 200
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/api/auth/me", headers=auth_header(test_user))
+    finally:
+        event.remove(test_engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    assert response.json()["email"] == test_user.email
+    assert statements == []
+
+
+def test_deactivation_invalidates_cache(client, db, test_user, monkeypatch):
+    """测试本进程修改用户后立即生效，不等版本号检查"""
+    monkeypatch.setattr(user_cache, "version_interval", 3600)
+    assert client.get("/api/auth/me", headers=auth_header(test_user)).json()["is_active"] is True
+
+    test_user.is_active = False
+    db.commit()
+    assert client.get("/api/auth/me", headers=auth_header(test_user)).json()["is_active"] is False
+
+
+def test_deleted_user_is_rejected(client, db, test_user):
+    headers = auth_header(test_user)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    db.delete(test_user)
+    db.commit()
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_other_worker_sees_version_change(db, test_user):
+    """测试其他进程的缓存通过版本号发现用户被修改"""
+    other = UserCache(version_interval=0)
+    other.get(db, test_user.email)
+    other.set(test_user.email, test_user)
+    cached = other.get(db, test_user.email)
+    assert cached.id == test_user.id and cached.is_active
+
+    test_user.full_name = "Renamed"
+    db.commit()
+    assert other.get(db, test_user.email) is None
+    assert other.stats()["invalidations"] == 1
+    assert db.query(User).count() == 1